@@ -0,0 +1,110 @@
+import atexit
+import queue
+import threading
+import pandas as pd
+
+class AsyncWriter:
+    """
+    Background writer for file outputs (e.g. TabulaCopula and CleanData intermediate outputs).
+    Each submitted DataFrame is snapshotted and written by a worker thread, while the pipeline continues. With pandas copy-on-write (pd.options.mode.copy_on_write), the snapshot is a shallow copy (the data is only copied if the DataFrame is modified before it is written); otherwise it is a deep copy, as the DataFrame could be modified in place while it is written. The queue is bounded, so that at most max_queue snapshots are held in memory (submit() waits when the queue is full).
+    Files are written in the order of submission. Write errors are collected, and raised by flush().
+    The worker is a daemon thread: pending writes are flushed at interpreter exit (atexit), so that no queued write is lost if flush() or close() is not called.
+
+    Inputs:
+        max_queue (int): maximum no. of pending writes. Default is 4.
+
+        debug (bool): Flag to print debugging lines. Default is `False`.
+    """
+
+    def __init__(self,
+        max_queue=4,
+        debug=False
+    ):
+
+        self.debug = debug
+        self.max_queue = max_queue
+
+        self.queue = None #queue of pending writes (write function, snapshot, args, kwargs)
+        self.thread = None #worker thread (started on first submit)
+        self.errors = [] #list of (filename, exception) of failed writes
+
+    def submit(self, write_fn, df, filename, *args, **kwargs):
+        """
+        Queue a write: write_fn(snapshot of df, filename, *args, **kwargs) is called by the worker thread.
+        Args:
+            write_fn (function): function writing a DataFrame to file, e.g. ut_.save_df_as_csv.
+            df (pd.DataFrame): DataFrame to write (snapshotted before queuing).
+            filename (str): name of the output file.
+        Returns:
+            None
+        """
+
+        if self.thread is None or not self.thread.is_alive():
+            self._start()
+
+        snapshot = df.copy(deep=pd.options.mode.copy_on_write is not True)
+        self.queue.put((write_fn, snapshot, filename, args, kwargs))
+
+        if (self.debug):
+            print(f"Queued write: {filename} ({self.queue.qsize()} pending)")
+
+    def flush(self):
+        """
+        Wait for all queued writes to complete. Raises RuntimeError (from the first error) if any write failed since the last flush.
+        """
+
+        if self.queue is not None:
+            self.queue.join()
+
+        if len(self.errors) > 0:
+            errors, self.errors = self.errors, []
+            filenames = [filename for (filename, e) in errors]
+            raise RuntimeError(f"Writing {len(errors)} file(s) failed: {filenames}. First error: {errors[0][1]}") from errors[0][1]
+
+        return True
+
+    def close(self):
+        """Flush the pending writes and stop the worker thread."""
+
+        try:
+            self.flush()
+        finally:
+            if self.thread is not None and self.thread.is_alive():
+                self.queue.put(None)
+                self.thread.join()
+            self.thread = None
+            self.queue = None
+            atexit.unregister(self.close)
+
+    def _start(self):
+
+        self.queue = queue.Queue(maxsize=self.max_queue)
+        self.thread = threading.Thread(target=self._worker, args=(self.queue,), daemon=True)
+        self.thread.start()
+        atexit.register(self.close) # (write the pending files before the daemon thread is stopped at exit)
+
+    def _worker(self, write_queue):
+
+        while True:
+            item = write_queue.get()
+            if item is None:
+                write_queue.task_done()
+                break
+
+            write_fn, snapshot, filename, args, kwargs = item
+            try:
+                write_fn(snapshot, filename, *args, **kwargs)
+                if (self.debug):
+                    print(f"Written: {filename}")
+            except Exception as e:
+                self.errors.append((filename, e))
+            finally:
+                write_queue.task_done()
+
+    def __getstate__(self):
+        # the queue and thread are not saved (e.g. when pickling a TabulaCopula instance), pending writes should be flushed first
+        state = self.__dict__.copy()
+        state['queue'] = None
+        state['thread'] = None
+        state['errors'] = []
+        return state
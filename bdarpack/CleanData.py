@@ -1,4 +1,5 @@
 from bdarpack import utils_ as ut_
+from bdarpack.AsyncWriter import AsyncWriter
 import pandas as pd
 import numpy as np
 import pprint
@@ -13,6 +14,7 @@ class CleanData:
     Class for cleaning data
     Inputs:
         definitions (loaded global definitions)
+        async_write (bool): Whether to write the data, dictionary and report files in a background thread (ref. AsyncWriter). Call flush() at the end of the cleaning steps to wait for the writes; write errors are raised by flush(). Default is False.
 
     Change Log:
         (MZ): 17-08-2023: added generation of initial report (modified options in Dictionary)
@@ -20,10 +22,12 @@ class CleanData:
 
     def __init__(self,
         definitions=None,
+        async_write=False,
         debug=True
     ):
         
         self.debug = debug
+        self.writer = AsyncWriter(debug=debug) if async_write else None # background writer of the file outputs
 
         self.nanList = ["","#N/A","#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null "] #(MZ): 28-02-2024
 
@@ -31,6 +35,7 @@ class CleanData:
         self.folder_rawData = "rawData"
         self.folder_trainData = "trainData"
         self.read_na = False #(MZ): 28-02-2024
+        self.compact_dtypes = False # read the raw data with compact dtypes chosen from the data dictionary (True, 'float32')
 
         self.output_type_data = 'csv'
         self.output_type_dict = 'xlsx'
@@ -88,12 +93,12 @@ class CleanData:
         self.definitions = definitions
         self._load_definitions()
 
+        # LOAD DATA DICTIONARY (read first, for the dtypes of the input data with COMPACT_DTYPES)
+        self.read_inputDict(sheetname=self.definitions.RAWDICTXLSX_SHEETNAME)
+
         # LOAD INPUT DATA
         self.read_inputData(sheetname=self.definitions.RAWXLSX_SHEETNAME)
 
-        # LOAD DATA DICTIONARY
-        self.read_inputDict(sheetname=self.definitions.RAWDICTXLSX_SHEETNAME)
-
         # CHECK IF THE VARIABLES IN INPUT DATA MATCHES THE DATA DICTIONARY
         no_mismatch = self._check_variable_match_dict_data(strip_empty_spaces=self.var_name_stripemptyspaces)
         if not no_mismatch:
@@ -160,6 +165,7 @@ class CleanData:
         self._update_defaults(var_to_update="folder_rawData", new_value="RAW_PATH")
         self._update_defaults(var_to_update="folder_trainData", new_value="TRAIN_PATH")
         self._update_defaults(var_to_update="read_na", new_value="READ_NA") #(MZ): 28-02-2024
+        self._update_defaults(var_to_update="compact_dtypes", new_value="COMPACT_DTYPES")
         self._update_defaults(var_to_update="dict_var_varname", new_value="DICT_VAR_VARNAME")
         self._update_defaults(var_to_update="dict_var_varcategory", new_value="DICT_VAR_VARCATEGORY") #(MZ): 12-04-2024
         self._update_defaults(var_to_update="dict_var_varsecondary", new_value="DICT_VAR_VARSECONDARY")
@@ -356,6 +362,8 @@ class CleanData:
         ----------
         sheetname : string, optional
             Name of the sheet in the excel file. If not specified, the first sheet will be read.
+
+        With COMPACT_DTYPES, the 'string' variables of the data dictionary are read as Arrow strings instead of python objects (if pyarrow is installed, ref. ut_.get_compact_dtypes), and the numerical columns read as integers (and as floats, if COMPACT_DTYPES is 'float32') are downcast (ref. ut_.downcast_numeric).
         
         Returns
         -------
@@ -414,21 +422,26 @@ class CleanData:
             if file_type=='excel':
                 # Read file and output as dataframe
                 with open(self.raw_data_filename, "rb") as f:
-                    self.raw_df = pd.read_excel(f, sheet_name=sheetname)
+                    self.raw_df = pd.read_excel(f, sheet_name=sheetname, dtype=self._get_read_dtypes())
                 # self.raw_df = pd.read_excel(self.raw_data_filename,
                 #     sheet_name=sheetname
                 # )
             elif file_type=='csv':
                 # Read file and output as dataframe
                 if self.read_na:
-                    self.raw_df = pd.read_csv(self.raw_data_filename, na_values=None, keep_default_na=False) #(MZ): 27022024: switch to preserve user defined 'na'
+                    self.raw_df = pd.read_csv(self.raw_data_filename, na_values=None, keep_default_na=False, dtype=self._get_read_dtypes()) #(MZ): 27022024: switch to preserve user defined 'na'
                 else:
-                    self.raw_df = pd.read_csv(self.raw_data_filename)
+                    self.raw_df = pd.read_csv(self.raw_data_filename, dtype=self._get_read_dtypes())
                 
         except ValueError as e:
             if self.logging:
                 self.logger.error('Could not read sheet in excel file: ' + str(e))
             raise ValueError('Could not read sheet in excel file: ' + str(e)) from None
+
+        # Downcast the numerical columns (columns with str-type 'nan' are left as they are)
+        if self.compact_dtypes:
+            var_names = [row[self.dict_var_varname] for index, row in self.dict_df.iterrows() if str(row[self.dict_var_type]).strip().lower() in ['numeric', 'numerical']]
+            self.raw_df = ut_.downcast_numeric(self.raw_df, columns=var_names, float_dtype='float32' if self.compact_dtypes == 'float32' else None)
         
         if (self.debug):
             print(f"Input data loaded.")
@@ -437,6 +450,19 @@ class CleanData:
 
         return self.raw_df
 
+    def _get_read_dtypes(self):
+        """Compact dtypes of the 'string' variables to read the raw data with (ref. ut_.get_compact_dtypes), None if COMPACT_DTYPES is not set. Variables with codings are read as the other strings (not 'category'), as their values are updated by the cleaning steps."""
+
+        if not self.compact_dtypes:
+            return None
+
+        return ut_.get_compact_dtypes(self.dict_df,
+            varname_col=self.dict_var_varname,
+            vartype_col=self.dict_var_type,
+            codings_col=self.dict_var_codings,
+            coded_string_dtype=None
+        )
+
     def read_inputDict(self, sheetname=None):
         """This function reads a raw data dictionary (currently only supports .xlsx files) and returns it as a dataframe. 
         If no sheetname is given the first sheet of the file is assumed.
@@ -578,7 +604,7 @@ class CleanData:
         numerical_type_list = ["numeric", "Numeric", "Numerical", "numerical"]
         for i in numerical_type_list:
             report_df.loc[(report_df['data_type_in_dict'] == i) & 
-                (report_df['data_type'].isin(['int32', 'Int32', 'int64', 'Int64', 'float64', 'Float64', 'timedelta[ns]'])),'data_type_mismatch'] = 'Matched'
+                (report_df['data_type'].isin(['Int8', 'Int16', 'int32', 'Int32', 'int64', 'Int64', 'float32', 'float64', 'Float64', 'timedelta[ns]'])),'data_type_mismatch'] = 'Matched'
         
         string_type_list = ["string", "String"]
         for i in string_type_list:
@@ -610,7 +636,7 @@ class CleanData:
             else:
                 return np.nan
         # for i in numerical_type_list:
-        f = lambda row: f_range(row.name) if (row['data_type'] in (['Int32', 'Int64', 'Float64', 'int32', 'int64','float64'])) else np.nan
+        f = lambda row: f_range(row.name) if (row['data_type'] in (['Int8', 'Int16', 'Int32', 'Int64', 'Float64', 'int32', 'int64', 'float32', 'float64'])) else np.nan
         report_df['numeric_range'] = report_df.apply(f, axis=1)
 
         # Populate data list for objects
@@ -819,11 +845,10 @@ class CleanData:
         file_ext = ut_.get_extension(filename)
 
         if (file_ext=='csv'):
-            ut_.save_df_as_csv(df, filename, index=index)
+            self._write(ut_.save_df_as_csv, df, filename, index=index)
 
         elif (file_ext=='xlsx'):
-            ut_.save_df_as_excel(df, 
-                excel_file_name = filename, 
+            self._write(ut_.save_df_as_excel, df, filename,
                 sheet_name = sheetname,
                 index = index # saving the index or not
             )
@@ -846,11 +871,10 @@ class CleanData:
         file_ext = ut_.get_extension(self.data_latest_filename)
 
         if (file_ext=='csv'):
-            ut_.save_df_as_csv(self.clean_df, self.data_latest_filename, index=False)
+            self._write(ut_.save_df_as_csv, self.clean_df, self.data_latest_filename, index=False)
 
         elif (file_ext=='xlsx'):
-            ut_.save_df_as_excel(self.clean_df, 
-                excel_file_name = self.data_latest_filename, 
+            self._write(ut_.save_df_as_excel, self.clean_df, self.data_latest_filename,
                 sheet_name = self.raw_data_sheetname,
                 index = False # not saving the index
             )
@@ -866,11 +890,10 @@ class CleanData:
         file_ext = ut_.get_extension(self.dict_latest_filename)
 
         if (file_ext=='csv'):
-            ut_.save_df_as_csv(self.clean_dict_df, self.dict_latest_filename, index=False)
+            self._write(ut_.save_df_as_csv, self.clean_dict_df, self.dict_latest_filename, index=False)
         
         elif (file_ext=='xlsx'):
-            ut_.save_df_as_excel(self.clean_dict_df,
-                excel_file_name = self.dict_latest_filename,
+            self._write(ut_.save_df_as_excel, self.clean_dict_df, self.dict_latest_filename,
                 sheet_name = self.raw_data_dict_sheetname,
                 index = False # not saving the index
             )
@@ -880,6 +903,27 @@ class CleanData:
                 self.logger.error(f"Not able to save dictionary to file for extension type: {file_ext}")
             raise ValueError(f"Not able to save dictionary to file for extension type: {file_ext}")
         
+    def _write(self, write_fn, df, filename, **kwargs):
+        """Call write_fn(df, filename, **kwargs), or queue it in the background writer (ref. async_write)."""
+
+        if self.writer is not None:
+            self.writer.submit(write_fn, df, filename, **kwargs)
+        else:
+            write_fn(df, filename, **kwargs)
+
+    def flush(self):
+        """Wait for the queued writes of the background writer (ref. async_write) to complete. Raises RuntimeError if any write failed."""
+
+        if self.writer is not None:
+            try:
+                return self.writer.flush()
+            except RuntimeError as e:
+                if self.logging:
+                    self.logger.error(str(e))
+                raise
+
+        return True
+
     def update_data(self, new_df, filename_suffix=""):
         """
         Update the input data in the CleanData class with new input data and overwrite the previous version.
@@ -1380,6 +1424,7 @@ class CleanData:
             split_merged_filename = self.latest_filename_split_merged
         else:
             split_merged_filename = file_to_split
+        self.flush() # (file may be queued in the background writer)
         split_merged_df = pd.read_csv(split_merged_filename, na_values=None, keep_default_na=False)
 
         longitudinal_marker_dict = {}
@@ -0,0 +1,213 @@
+import itertools
+import operator
+import re
+import numpy as np
+import pandas as pd
+
+RANGE_OPERATORS = {
+    '<=': operator.le,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '>': operator.gt,
+}
+RANGE_PATTERN = re.compile(r'^\s*(<=|>=|==|!=|<|>)\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*$')
+
+class ConditionEngine:
+    """
+    Compiled parent conditions of a conditional set (ref. TabulaCopula conditionalSettings_dict).
+    Each parent column is encoded once (codes of the categories, argmax of the One-Hot fields, or the value), and each set_index of the parent is matched on the encoded column. The permutations (e.g. "1-2") are then evaluated as integer group labels in a single pass.
+    'range' expressions (e.g. ">=18") are parsed into (operator, value), instead of being evaluated as strings.
+
+    Inputs:
+        parent_conditions (dict): dictionary of parent conditions, e.g.
+            {
+                "SurveyYr": {"condition": "set", "condition_value": {1: ["2009_10"], 2: ["2011_12"]}},
+                "Age": {"condition": "range", "condition_value": {1: [">=3", "<80"], 2: ["<3"], 3: [">=80"]}}
+            }
+
+        debug (bool): Flag to print debugging lines. Default is `False`.
+    """
+
+    def __init__(self,
+        parent_conditions,
+        debug=False
+    ):
+
+        self.debug = debug
+        self.parent_conditions = parent_conditions
+        self.parentVar_list = list(parent_conditions.keys()) #list of parent variables
+        self.set_keys = {} #list of set_index keys, for each parent variable
+        self.compiled = {} #compiled conditions (list of values or list of (operator, value)), for each parent variable and set_index
+
+        for parentVar, parentVarBody in parent_conditions.items():
+            self.set_keys[parentVar] = list(parentVarBody['condition_value'].keys())
+            self.compiled[parentVar] = []
+            for set_key in self.set_keys[parentVar]:
+                set_values = parentVarBody['condition_value'][set_key]
+                if parentVarBody['condition'] == 'set':
+                    self.compiled[parentVar].append(list(set_values))
+                elif parentVarBody['condition'] == 'range':
+                    self.compiled[parentVar].append([self.parse_range(set_value) for set_value in set_values])
+                else:
+                    raise ValueError(f"Unknown condition for {parentVar}: {parentVarBody['condition']}. Options include 'set', 'range'.")
+
+        # permutations, e.g. ['1-1', '1-2', ..] (same order as TabulaCopula._conditional_makeSetIndex)
+        self.set_index_list = []
+        if len(self.parentVar_list) > 0:
+            for keys in itertools.product(*[self.set_keys[parentVar] for parentVar in self.parentVar_list]):
+                self.set_index_list.append("-".join(str(key) for key in keys))
+
+    @staticmethod
+    def parse_range(expression):
+        """Parse a range expression, e.g. ">=18", into (operator function, value). Raises ValueError if the expression is not of the form <operator><number>."""
+
+        match = RANGE_PATTERN.match(str(expression))
+        if match is None:
+            raise ValueError(f"Invalid range condition: {expression}. Expected an operator (<, <=, >, >=, ==, !=) followed by a number, e.g. '>=18'.")
+
+        return RANGE_OPERATORS[match.group(1)], float(match.group(2))
+
+    def evaluate(self, data, transformer_meta_dict=None):
+        """
+        Find the rows of data that satisfy each permutation of the parent conditions.
+        Args:
+            data (pd.DataFrame): raw data (e.g. training data), or transformed data (e.g. synthetic samples) if transformer_meta_dict is given.
+            transformer_meta_dict (dict): transformer_meta_dict of the transformer used for data. Default is None (raw data).
+        Returns:
+            groups (dict): {set_index: np.array of row positions}, for each permutation in set_index_list.
+        """
+
+        membership = [self._membership(data, parentVar, transformer_meta_dict) for parentVar in self.parentVar_list]
+        n_rows = len(data)
+
+        if all((m.sum(axis=1) <= 1).all() for m in membership):
+            # set_index of each parent are mutually exclusive: one integer label per row
+            labels = self._labels_from_membership(membership, n_rows)
+            order = np.argsort(labels, kind='stable')
+            bounds = np.searchsorted(labels[order], np.arange(-1, len(self.set_index_list)+1))
+            groups = {
+                set_index: order[bounds[k+1]:bounds[k+2]]
+                for k, set_index in enumerate(self.set_index_list)
+            }
+        else:
+            # overlapping conditions: a row may belong to several permutations
+            groups = {}
+            for k, set_index in enumerate(self.set_index_list):
+                positions = np.unravel_index(k, [len(self.set_keys[p]) for p in self.parentVar_list])
+                mask = np.ones(n_rows, dtype=bool)
+                for m, pos in zip(membership, positions):
+                    mask &= m[:, pos]
+                groups[set_index] = np.flatnonzero(mask)
+
+        return groups
+
+    def labels(self, data, transformer_meta_dict=None):
+        """
+        Integer group label of each row of data (position of the permutation in set_index_list, -1 if none). Raises ValueError if the conditions of a parent overlap.
+        """
+
+        membership = [self._membership(data, parentVar, transformer_meta_dict) for parentVar in self.parentVar_list]
+        if not all((m.sum(axis=1) <= 1).all() for m in membership):
+            raise ValueError("Parent conditions overlap, rows cannot be given a single label. Use evaluate().")
+
+        return self._labels_from_membership(membership, len(data))
+
+    def _labels_from_membership(self, membership, n_rows):
+
+        labels = np.zeros(n_rows, dtype=np.int64)
+        valid = np.ones(n_rows, dtype=bool)
+        for m in membership:
+            code = np.argmax(m, axis=1)
+            valid &= m.any(axis=1)
+            labels = labels * m.shape[1] + code
+        labels[~valid] = -1
+
+        return labels
+
+    def _membership(self, data, parentVar, transformer_meta_dict=None):
+        """Boolean array (no. of rows, no. of set_index) of the rows matching each set_index of parentVar."""
+
+        condition = self.parent_conditions[parentVar]['condition']
+        compiled = self.compiled[parentVar]
+
+        if transformer_meta_dict is None:
+            if condition == 'set':
+                # encode parent column once, then match the (few) unique values
+                codes, uniques = pd.factorize(data[parentVar].astype('object').apply(str).str.upper(), use_na_sentinel=False)
+                uniques = np.asarray(uniques, dtype=object)
+                table = np.column_stack([np.isin(uniques, [str(v).upper() for v in set_values]) for set_values in compiled])
+                return table[codes].reshape(len(data), len(compiled))
+            else:
+                values = data[parentVar].astype('float').to_numpy()
+                return self._range_membership(values, compiled)
+
+        parentVar_meta = transformer_meta_dict[parentVar]
+        output_fields = list(parentVar_meta['output_fields'].keys())
+
+        if condition == 'range':
+            values = data[output_fields[0]].to_numpy(dtype=float)
+            return self._range_membership(values, compiled)
+
+        transformer_type = parentVar_meta['transformer_type']
+        if transformer_type == 'One-Hot':
+            # position of the hot column of each row
+            params_dict = parentVar_meta['params_dict']
+            codes = np.argmax(data[output_fields].to_numpy(dtype=float), axis=1)
+            table = np.zeros((len(output_fields), len(compiled)), dtype=bool)
+            for j, set_values in enumerate(compiled):
+                for set_value in set_values:
+                    key = self._match_key(params_dict, set_value)
+                    if key is not None and params_dict[key] in output_fields:
+                        table[output_fields.index(params_dict[key]), j] = True
+            return table[codes]
+
+        elif transformer_type == 'LabelEncoding':
+            params_dict = parentVar_meta['params_dict']
+            codes = np.round(data[output_fields[0]].to_numpy(dtype=float))
+            membership = np.zeros((len(data), len(compiled)), dtype=bool)
+            for j, set_values in enumerate(compiled):
+                labels = [params_dict[key] for key in (self._match_key(params_dict, v) for v in set_values) if key is not None]
+                membership[:, j] = np.isin(codes, labels)
+            return membership
+
+        elif transformer_type in ('Cat1', 'Cat1Fuzzy'):
+            # decode the category of each row (searchsorted on interval upper bounds)
+            intervals = parentVar_meta['intervals']
+            categories = list(intervals.keys())
+            upper_bounds = parentVar_meta['upper_bounds'] if 'upper_bounds' in parentVar_meta else np.array([upper for (lower, upper) in intervals.values()], dtype=float)
+            values = np.clip(data[output_fields[0]].to_numpy(dtype=float), 0, 1)
+            codes = np.minimum(np.searchsorted(upper_bounds, values, side='left'), len(categories)-1)
+            table = np.column_stack([np.isin(np.array(categories, dtype=object), list(set_values)) for set_values in compiled])
+            membership = table[codes].reshape(len(data), len(compiled))
+            membership[np.isnan(values)] = False
+            return membership
+
+        else:
+            raise TypeError(f"Transformer Type {transformer_type} of parent variable {parentVar} is not supported for 'set' conditions.")
+
+    def _range_membership(self, values, compiled):
+
+        membership = np.zeros((len(values), len(compiled)), dtype=bool)
+        for j, bounds in enumerate(compiled):
+            mask = np.ones(len(values), dtype=bool)
+            for op, value in bounds:
+                with np.errstate(invalid='ignore'):
+                    mask &= op(values, value)
+            membership[:, j] = mask
+
+        return membership
+
+    def _match_key(self, params_dict, set_value):
+        """Find the key of params_dict for set_value (exact match first, then case-insensitive, as for the training data)."""
+
+        if set_value in params_dict:
+            return set_value
+        if str(set_value) in params_dict:
+            return str(set_value)
+        for key in params_dict:
+            if str(key).upper() == str(set_value).upper():
+                return key
+
+        return None
@@ -3,11 +3,33 @@ from bdarpack import utils_ as ut_
 import pandas as pd
 import numpy as np
 from scipy import stats
+from scipy.stats import qmc
+from scipy.special import ndtri
+import warnings
+from concurrent.futures import ThreadPoolExecutor
 
 EPSILON = np.finfo(np.float32).eps
 
 class GaussianCopula:
     """
+    Inputs:
+        debug (bool): Flag to print debugging lines. Default is `False`.
+
+        correlation_method (str): Method for computing the correlation matrix. Options include 'kendall' (default), 'spearman', 'pearson'.
+
+        block_diagonal (bool): If True, variables are clustered into groups that are (nearly) uncorrelated with each other, and a block-diagonal correlation matrix is fitted. Each block gets its own Cholesky factor and is sampled independently. Default is `False`.
+
+        block_threshold (float): Absolute correlation above which two variables are linked into the same block. Default is 0.1.
+
+        block_screen (str): Correlation method used for a cheap screen to form the blocks (e.g. 'pearson'). The full correlation (correlation_method) is then only computed within each block. If None, the blocks are formed from the full correlation matrix. Default is None.
+
+        block_screen_size (int): Maximum number of rows used for the correlation screen. Default is 2000.
+
+        n_jobs (int): Number of threads used to sample the blocks in parallel. Default is None (serial).
+
+        pd_tol (float): Stopping tolerance of the nearest-correlation projection (ref. utils_.nearest_correlation_matrix), used if the fitted correlation matrix is not positive definite. Default is 1e-8.
+
+        pd_max_iterations (int): Maximum number of iterations of the nearest-correlation projection. Default is 100.
 
     Change Log: (MZ): 13-07-2023: Added print_copula_params()
     (MZ): 14-07-2023: Added conditions for self.fitted boolean in self.fit()
@@ -15,7 +37,14 @@ class GaussianCopula:
 
     def __init__(self,
         debug=False,
-        correlation_method="kendall"
+        correlation_method="kendall",
+        block_diagonal=False,
+        block_threshold=0.1,
+        block_screen=None,
+        block_screen_size=2000,
+        n_jobs=None,
+        pd_tol=1e-8,
+        pd_max_iterations=100
     ):
         
         self.debug = debug
@@ -24,6 +53,19 @@ class GaussianCopula:
         self.correlation= None #correlation matrix
         self.correlation_method = correlation_method #method for computing correlation
         self.fitted = False
+
+        self.block_diagonal = block_diagonal #whether to fit a block-diagonal correlation matrix
+        self.block_threshold = block_threshold #absolute correlation threshold for linking variables into a block
+        self.block_screen = block_screen #correlation method for the (cheap) block screen
+        self.block_screen_size = block_screen_size #max. no. of rows used for the block screen
+        self.n_jobs = n_jobs #no. of threads for sampling blocks
+        self.blocks = None #list of blocks (list of variable names), only used if block_diagonal
+        self.block_cholesky = None #list of Cholesky factors, one for each block
+        self.pd_tol = pd_tol #tolerance of nearest-correlation projection
+        self.pd_max_iterations = pd_max_iterations #max. iterations of nearest-correlation projection
+        self.cholesky = None #Cholesky factor of the correlation matrix
+        self.pd_info = None #info returned by the nearest-correlation projection (iterations, time, converged, correction)
+        self.sobol_engines = {} #scrambled Sobol engines (one per dimension), used if sample(method='sobol')
     
     def print_copula_params(self):
 
@@ -32,7 +74,7 @@ class GaussianCopula:
             var_univariate = self.univariates[var_name]
             print(f"Learned marginal distribution for {var_name}: {var_univariate.fitted_marginal_dist}")
 
-    def compute_correlation(self, data, method='kendall', transform_to_normal=False):
+    def compute_correlation(self, data, method='kendall', transform_to_normal=False, warm_start=None):
         """
         
             Computes the (pairwise) correlation matrix for a given set of data. 
@@ -42,6 +84,9 @@ class GaussianCopula:
             data (dataframe): training data
             method (str): The method used to compute the correlation. Available  options are 'kendall' (default), 'spearman', and 'pearson'.
             transform_to_normal (bool): If True, the data is first transformed to a normal distribution before computing the correlation.
+            warm_start (dict): info dictionary of a previous nearest-correlation projection (e.g. pd_info of a similar copula), used to warm start the projection. Default is None.
+
+            The Cholesky factor of the (positive definite) correlation matrix is stored in self.cholesky, and the projection details in self.pd_info.
 
             Returns:
             corr_matrix_df (pd.DataFrame): A square DataFrame with the variable names as indexes and columns, and the correlations as values. 
@@ -89,20 +134,110 @@ class GaussianCopula:
             corr_matrix_df = data_df.corr(method='pearson') #data_df is DataFrame
             corr_matrix_np = np.nan_to_num(corr_matrix_df.to_numpy(), nan=0.0)
 
-        # If correlation matrix is not positive definite, make it so
-        corr_matrix_np = ut_.makePD(corr_matrix_np)
-        corr_matrix_df = pd.DataFrame(corr_matrix_np, index=self.var_names, columns=self.var_names)
+        # If correlation matrix is not positive definite, make it so (keep the Cholesky factor for sampling)
+        corr_matrix_np, self.cholesky, self.pd_info = ut_.makePD(corr_matrix_np,
+            return_details=True,
+            tol=self.pd_tol,
+            max_iterations=self.pd_max_iterations,
+            warm_start=warm_start
+        )
+        if (self.debug):
+            print(f"Nearest-correlation projection: {self.pd_info['iterations']} iterations, {self.pd_info['time']:.4f}s, converged={self.pd_info['converged']}")
+        corr_matrix_df = pd.DataFrame(corr_matrix_np, index=list(data_df.columns), columns=list(data_df.columns))
+
+        return corr_matrix_df
+
+    def compute_block_correlation(self, data, method='kendall', random_state=None):
+        """
+            Computes a block-diagonal correlation matrix. The variables are clustered into blocks (connected components of the graph linking variables with absolute correlation >= self.block_threshold), and all correlations between blocks are set to zero.
+
+            If self.block_screen is given, the blocks are formed from a cheap correlation screen (self.block_screen method on at most self.block_screen_size rows), and the full correlation (method) is only computed within each block.
+
+            Args:
+            data (dataframe): training data
+            method (str): The method used to compute the correlation within each block. Available options are 'kendall' (default), 'spearman', and 'pearson'.
+            random_state (np.random.Generator): generator of the rows of the block screen. Default is None (np.random).
+
+            Returns:
+            corr_matrix_df (pd.DataFrame): A square (block-diagonal) DataFrame with the variable names as indexes and columns.
+        """
+
+        var_names = list(data.columns)
+
+        if self.block_screen is None:
+            full_corr_df = self.compute_correlation(data, method=method)
+            block_index_list = ut_.find_correlation_blocks(full_corr_df.to_numpy(), threshold=self.block_threshold)
+        else:
+            if len(data) > self.block_screen_size:
+                s = (np.random if random_state is None else random_state).choice(len(data), self.block_screen_size, replace=False)
+                screen_df = data.iloc[np.sort(s)]
+            else:
+                screen_df = data
+            screen_corr_np = np.nan_to_num(screen_df.corr(method=self.block_screen).to_numpy(), nan=0.0)
+            block_index_list = ut_.find_correlation_blocks(screen_corr_np, threshold=self.block_threshold)
+
+        # Assemble block-diagonal correlation matrix
+        corr_matrix_np = np.eye(len(var_names))
+        for block_index in block_index_list:
+            if len(block_index) == 1:
+                continue
+            if self.block_screen is None:
+                block_corr_np = full_corr_df.to_numpy()[np.ix_(block_index, block_index)]
+            else:
+                block_names = [var_names[i] for i in block_index]
+                block_corr_np = self.compute_correlation(data[block_names], method=method).to_numpy()
+            corr_matrix_np[np.ix_(block_index, block_index)] = block_corr_np
+
+        self.blocks = [[var_names[i] for i in block_index] for block_index in block_index_list]
+
+        if (self.debug):
+            print(f"No. of correlation blocks: {len(self.blocks)}, largest block: {max(len(b) for b in self.blocks)} variables")
+
+        corr_matrix_df = pd.DataFrame(corr_matrix_np, index=var_names, columns=var_names)
 
         return corr_matrix_df
 
+    def _build_block_factors(self):
+        """Compute the Cholesky factor of each block of the correlation matrix."""
+
+        if self.blocks is None: # correlation matrix was preset, find blocks from it
+            block_index_list = ut_.find_correlation_blocks(self.correlation.to_numpy(), threshold=self.block_threshold)
+            self.blocks = [[self.var_names[i] for i in block_index] for block_index in block_index_list]
+
+        self.block_cholesky = [
+            self._cov_factor(self.correlation.loc[block, block].to_numpy()) for block in self.blocks
+        ]
+
+    def _build_cholesky(self):
+        """Compute (once) the Cholesky factor of the correlation matrix, projecting it to the nearest correlation matrix if needed."""
+
+        corr_matrix_np, self.cholesky, self.pd_info = ut_.makePD(self.correlation.to_numpy(),
+            return_details=True,
+            tol=getattr(self, 'pd_tol', 1e-8),
+            max_iterations=getattr(self, 'pd_max_iterations', 100)
+        )
+        if self.pd_info['iterations'] > 0:
+            self.correlation = pd.DataFrame(corr_matrix_np, index=self.correlation.index, columns=self.correlation.columns)
+
+    def _cov_factor(self, cov):
+        """Return a matrix L such that L @ L.T = cov (Cholesky factor, or symmetric square root if cov is only semi-definite)."""
+
+        try:
+            return np.linalg.cholesky(cov)
+        except np.linalg.LinAlgError:
+            eigValue, eigVector = np.linalg.eigh(cov)
+            return eigVector * np.sqrt(np.clip(eigValue, 0, None))
+
 
-    def fit(self, data, marginal_dist_dict=None):
+    def fit(self, data, marginal_dist_dict=None, pd_warm_start=None, random_state=None):
         """
         Compute the distribution for each variable and then its covariance matrix
 
         Args:
-            data (dataframe): training data
+            data (dataframe): training data (sparse columns, e.g. compact 'One-Hot' fields, are densified one at a time)
             marginal_dist_dict (dict, optional): A dictionary where keys are variable names and values are lists of candidate marginal distributions. Defaults to None.
+            pd_warm_start (dict, optional): pd_info of a previously fitted copula on the same variables, used to warm start the nearest-correlation projection. Defaults to None.
+            random_state (np.random.Generator, optional): generator of the random draws of the fit (block screen), e.g. to fit in a thread without the global np.random state. Defaults to None (np.random).
 
         Returns:
             None
@@ -121,6 +256,8 @@ class GaussianCopula:
             if (self.debug):
                 print(f"Fitting var: {var_name}")
             univariate = MarginalDist(debug=self.debug)
+            if isinstance(var.dtype, pd.SparseDtype): # (compact 'One-Hot' fields, ref. Transformer onehot_dtype)
+                var = var.sparse.to_dense()
 
             # Get candidates for Marginal Distributions
             if var_name in marginal_dist_dict:
@@ -143,16 +280,28 @@ class GaussianCopula:
 
         # Compute correlation matrix
         if (self.correlation is None):
-            self.correlation = self.compute_correlation(data, method=self.correlation_method)
+            if self.block_diagonal:
+                self.correlation = self.compute_block_correlation(data, method=self.correlation_method, random_state=random_state)
+            else:
+                self.correlation = self.compute_correlation(data, method=self.correlation_method, warm_start=pd_warm_start)
 
+        if self.block_diagonal:
+            self.cholesky = None
+            self._build_block_factors()
+        elif self.cholesky is None: # correlation matrix was preset
+            self._build_cholesky()
         
 
-    def conditional_Gaussian(self, conditions):
+    def conditional_Gaussian(self, conditions, var_names=None):
         """Compute the parameters (mean, covariance) of a conditional multivariate normal distribution.
-        Takes in a pd.series variable: conditions"""
+        Takes in a pd.series variable: conditions.
+        var_names (list, optional): restrict the computation to this subset of variables (e.g. a block). Default is None (all variables)."""
 
         columns2 = conditions.index
-        columns1 = self.correlation.columns.difference(columns2)
+        if var_names is None:
+            columns1 = self.correlation.columns.difference(columns2)
+        else:
+            columns1 = pd.Index([v for v in var_names if v not in columns2])
 
         sigma11 = self.correlation.loc[columns1, columns1].to_numpy()
         sigma12 = self.correlation.loc[columns1, columns2].to_numpy()
@@ -169,13 +318,40 @@ class GaussianCopula:
 
         return mu_bar, sigma_bar, columns1
 
-    def sample(self, size=1, conditions=None):
+    def reset_sequence(self):
+        """Discard the Sobol engines, so that the next call to sample(method='sobol') starts a new (freshly scrambled) sequence."""
+        self.sobol_engines = {}
+
+    def _standard_normal(self, size, dim, method='random'):
+        """Draw a (size, dim) array of independent standard normal values.
+
+        Args:
+            method (str): 'random' (pseudo-random numbers from np.random) or 'sobol' (scrambled Sobol points mapped through the inverse normal cdf). The Sobol engine of each dimension is kept, so consecutive calls continue the same sequence.
+        """
+
+        if method == 'random':
+            return np.random.standard_normal(size=(size, dim))
+        elif method == 'sobol':
+            if getattr(self, 'sobol_engines', None) is None: # (instances pickled before sobol_engines was added)
+                self.sobol_engines = {}
+            if dim not in self.sobol_engines:
+                self.sobol_engines[dim] = qmc.Sobol(d=dim, scramble=True, seed=np.random.randint(2**32, dtype=np.uint64))
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", UserWarning) # chunks need not be powers of 2
+                U = self.sobol_engines[dim].random(size)
+            return ndtri(U.clip(EPSILON, 1-EPSILON))
+        else:
+            raise ValueError(f"Unknown sampling method: {method}. Options include 'random', 'sobol'.")
+
+    def sample(self, size=1, conditions=None, var_list=None, method='random'):
         """
         Generates synthetic data from a fitted Gaussian Copula Model.
         Args:
             size (int): The number of synthetic samples to generate.
             conditions (dict): A dictionary containing values for conditional variables in the form of {variable_name: value}. 
             If no conditions are specified, the full joint Gaussian distribution will be used.
+            var_list (list): List of variables to output. If the copula is block-diagonal, only the blocks containing these variables are sampled. Default is None (all variables).
+            method (str): 'random' (default) for pseudo-random draws, or 'sobol' for scrambled Sobol (quasi-Monte Carlo) points, which match the marginal and pairwise statistics with fewer rows. Consecutive calls continue the Sobol sequence (chunked generation); use reset_sequence() to restart it.
         Returns:
             syn_samples_df (pd.DataFrame): A dataframe containing the synthetic samples.
         Raises:
@@ -185,14 +361,15 @@ class GaussianCopula:
         # check fit
         if not self.fitted:
             raise Error('Model must be fitted before sampling.')
+
+        if var_list is None:
+            output_var_names = self.var_names
+        else:
+            output_var_names = [var_name for var_name in self.var_names if var_name in var_list]
         
         # Generate a multivariate random number vector (X_1, \dots, X_m) in an arbitrary domain following the Gaussian joint distribution \Phi(0,P) [P=correlation matrix]
-        if conditions is None:
-            # means = np.zero(len(self.var_names))
-            means = None
-            correlation_matrix = self.correlation
-            sampled_var_names = self.var_names
-        else: # generate conditional Gaussian distribution
+        conditions_norm_pdseries = None
+        if conditions is not None:
             norm_conv_dict={}
             for var_name in conditions: # convert to normal distribution using marginal probability integral transform
                 
@@ -201,18 +378,31 @@ class GaussianCopula:
                     temp_U = univariate.cdf_wrapper(data=conditions[var_name]).clip(EPSILON, 1-EPSILON)
                     norm_conv_dict[var_name] = stats.norm.ppf(temp_U)
             conditions_norm_pdseries = pd.Series(norm_conv_dict)
-            means, correlation_matrix, sampled_var_names = self.conditional_Gaussian(conditions_norm_pdseries)
-
 
-        norm_samples_np = stats.multivariate_normal.rvs(mean=means, cov=correlation_matrix, size=size)
-        if (size==1):
-            norm_samples_np = norm_samples_np.reshape(1,-1)
-        norm_samples_df = pd.DataFrame(norm_samples_np, columns=sampled_var_names)
+        if getattr(self, 'block_diagonal', False): # (getattr: instances pickled before block_diagonal was added)
+            norm_samples_df = self._sample_blocks(size, conditions_norm_pdseries, output_var_names, method=method)
+        else:
+            if conditions is None:
+                # means = np.zero(len(self.var_names))
+                means = None
+                if getattr(self, 'cholesky', None) is None: # (instances pickled before the Cholesky factor was stored)
+                    self._build_cholesky()
+                factor = self.cholesky
+                sampled_var_names = self.var_names
+            else: # generate conditional Gaussian distribution
+                means, correlation_matrix, sampled_var_names = self.conditional_Gaussian(conditions_norm_pdseries)
+                factor = self._cov_factor(correlation_matrix)
+
+            # X = mu + L Z, with Z standard normal and L L^T = P (no refactorisation of P for each call)
+            norm_samples_np = self._standard_normal(size, len(sampled_var_names), method=method) @ factor.T
+            if means is not None:
+                norm_samples_np = norm_samples_np + means
+            norm_samples_df = pd.DataFrame(norm_samples_np, columns=sampled_var_names)
 
         # Transform (X_1, \dots, X_m) to (U_1, \dots, U_m) \in [0,1] where U_j = \phi(X_j) [\phi is the standard Gaussian distribution]
         # Compute synthetic data D_j = F^{-1}_j(U_j)
         output = {}
-        for var_name in self.var_names:
+        for var_name in output_var_names:
             univariate = self.univariates[var_name]
             if conditions is None:
                 U_j = stats.norm.cdf(norm_samples_df[var_name])
@@ -229,6 +419,93 @@ class GaussianCopula:
 
         return syn_samples_df
 
+    def sample_normal(self, size=1, method='random'):
+        """
+        Generates (unconditional) samples of the copula in the normal domain, i.e. before the marginal transformation.
+        Args:
+            size (int): The number of samples to generate.
+            method (str): 'random' (default) or 'sobol' (ref. sample()).
+        Returns:
+            norm_samples_np (np.array): array of shape (size, no. of variables), with columns in the order of self.var_names.
+        """
+
+        # check fit
+        if not self.fitted:
+            raise Error('Model must be fitted before sampling.')
+
+        if getattr(self, 'block_diagonal', False):
+            norm_samples_np, columns = self._sample_blocks_np(size, None, self.var_names, method=method)
+            if columns != self.var_names:
+                col_index = {var_name: i for i, var_name in enumerate(columns)}
+                norm_samples_np = norm_samples_np[:, [col_index[var_name] for var_name in self.var_names]]
+        else:
+            if getattr(self, 'cholesky', None) is None:
+                self._build_cholesky()
+            norm_samples_np = self._standard_normal(size, len(self.var_names), method=method) @ self.cholesky.T
+
+        return norm_samples_np
+
+    def _sample_blocks(self, size, conditions_norm=None, var_list=None, method='random'):
+        """Sample (standard normal) values from a block-diagonal copula. Only the blocks containing variables in var_list are sampled; conditions only affect the blocks they belong to.
+        
+        Returns:
+            norm_samples_df (pd.DataFrame): samples in the normal domain for all non-conditioned variables in the sampled blocks.
+        """
+
+        norm_samples_np, columns = self._sample_blocks_np(size, conditions_norm, var_list, method=method)
+        if len(columns) == 0:
+            return pd.DataFrame(index=range(size))
+        norm_samples_df = pd.DataFrame(norm_samples_np, columns=columns)
+
+        return norm_samples_df
+
+    def _sample_blocks_np(self, size, conditions_norm=None, var_list=None, method='random'):
+        """Same as _sample_blocks(), returning (norm_samples_np, columns)."""
+
+        if var_list is None:
+            var_list = self.var_names
+
+        # Select blocks to sample, and draw all the standard normals at once (keeps the random stream deterministic)
+        sel_blocks = [i for i, block in enumerate(self.blocks) if any(v in var_list for v in block)]
+        block_params = []
+        for i in sel_blocks:
+            block = self.blocks[i]
+            if conditions_norm is not None and any(v in conditions_norm.index for v in block):
+                block_conditions = conditions_norm[[v for v in block if v in conditions_norm.index]]
+                means, cov, sampled_var_names = self.conditional_Gaussian(block_conditions, var_names=block)
+                if len(sampled_var_names) == 0:
+                    continue
+                factor = self._cov_factor(cov)
+            else:
+                means = None
+                factor = self.block_cholesky[i]
+                sampled_var_names = block
+            block_params.append((list(sampled_var_names), means, factor))
+
+        dim = sum(len(p[0]) for p in block_params)
+        std_samples_np = self._standard_normal(size, dim, method=method)
+
+        def sample_block(params, z):
+            sampled_var_names, means, factor = params
+            x = z @ factor.T
+            if means is not None:
+                x = x + means
+            return x
+
+        offsets = np.cumsum([0] + [len(p[0]) for p in block_params])
+        z_list = [std_samples_np[:, offsets[i]:offsets[i+1]] for i in range(len(block_params))]
+        if self.n_jobs is not None and self.n_jobs > 1 and len(block_params) > 1:
+            with ThreadPoolExecutor(max_workers=self.n_jobs) as executor:
+                x_list = list(executor.map(sample_block, block_params, z_list))
+        else:
+            x_list = [sample_block(params, z) for params, z in zip(block_params, z_list)]
+
+        columns = [v for p in block_params for v in p[0]]
+        if len(x_list) == 0:
+            return np.empty((size, 0)), columns
+
+        return np.hstack(x_list), columns
+
 
 
 class Error(Exception):
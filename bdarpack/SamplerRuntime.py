@@ -0,0 +1,140 @@
+import os
+import json
+import numpy as np
+
+class SamplerRuntime:
+    """
+    Numpy-only sampler, loading an artifact exported by SamplingPlan.export() (or TabulaCopula.export_sampler()).
+    Only depends on numpy (pandas is imported only if a DataFrame is requested, or to decode datetime fields with ut_.decode_datetime), and memory-maps the exported arrays, so that serving processes start quickly.
+
+    Inputs:
+        path (str): directory of the exported artifact (meta.json and .npy files).
+
+        mmap (bool): Whether to memory-map the .npy files (read-only). Default is `True`.
+
+        debug (bool): Flag to print debugging lines. Default is `False`.
+    """
+
+    def __init__(self,
+        path,
+        mmap=True,
+        debug=False
+    ):
+
+        self.debug = debug
+        self.path = path
+
+        with open(os.path.join(path, 'meta.json'), 'r') as fl:
+            meta = json.load(fl)
+
+        if meta.get('format_version') != 1:
+            raise ValueError(f"Unknown sampler format version: {meta.get('format_version')}")
+
+        mmap_mode = 'r' if mmap else None
+        self.var_names = meta['var_names'] #list of copula variables
+        self.cholesky = np.load(os.path.join(path, meta['files']['cholesky']), mmap_mode=mmap_mode) #Cholesky factor of the correlation matrix
+        self.z_grid = np.load(os.path.join(path, meta['files']['z_grid']), mmap_mode=mmap_mode) #grid of z-values of the lookup tables
+        self.x_table = np.load(os.path.join(path, meta['files']['x_table']), mmap_mode=mmap_mode) #lookup tables z -> x, one row for each copula variable
+        self.decoders = meta['decoders'] #list of dict, one for each reversed field
+
+        for decoder in self.decoders:
+            if 'categories' in decoder:
+                decoder['categories'] = np.array([np.nan if cat is None else cat for cat in decoder['categories']], dtype=object)
+            if 'upper_bounds' in decoder:
+                decoder['upper_bounds'] = np.array(decoder['upper_bounds'], dtype=float)
+            if isinstance(decoder['index'], list):
+                decoder['index'] = np.array(decoder['index'])
+
+        if (self.debug):
+            print(f"Sampler loaded from {path}: {len(self.var_names)} variables, {len(self.decoders)} fields.")
+
+    def sample(self, size=1, seed=None, as_frame=False):
+        """
+        Generates reverse-transformed synthetic data.
+        Args:
+            size (int): The number of synthetic samples to generate.
+            seed (int, np.random.Generator): seed of the random generator. Default is None.
+            as_frame (bool): If True, return a pandas DataFrame. Default is False (dict of numpy arrays).
+        Returns:
+            output (dict or pd.DataFrame): synthetic samples, keyed by field.
+        """
+
+        rng = np.random.default_rng(seed)
+        norm_samples_np = rng.standard_normal(size=(size, len(self.var_names))) @ self.cholesky.T
+
+        return self.decode_normal(norm_samples_np, as_frame=as_frame, rng=rng)
+
+    def decode_normal(self, norm_samples_np, as_frame=False, rng=None):
+        """Take samples in the normal domain (columns in order of var_names) through the tabulated marginals and decode them."""
+
+        X = np.empty(norm_samples_np.shape)
+        for j in range(len(self.var_names)):
+            X[:, j] = np.interp(norm_samples_np[:, j], self.z_grid, self.x_table[j])
+
+        return self.decode(X, as_frame=as_frame, rng=rng)
+
+    def decode(self, X, as_frame=False, rng=None):
+        """Reverse the transformation of an array of transformed values (columns in order of var_names). rng draws the nulls of the fields restored at random (no null indicator field)."""
+
+        rng = rng if rng is not None else np.random.default_rng()
+        output = {}
+        for decoder in self.decoders:
+            output[decoder['field']] = self._decode_field(X, decoder, rng)
+
+        if as_frame:
+            import pandas as pd
+            output = pd.DataFrame({
+                field: pd.arrays.BooleanArray(*values) if isinstance(values, tuple) else values
+                for field, values in output.items()
+            })
+
+        return output
+
+    def _decode_field(self, X, decoder, rng):
+        """Decode a single field (ref. SamplingPlan._decode_field). Booleans are returned as (values, null mask)."""
+
+        original_dtype = decoder['original_dtype']
+
+        # IF STRING
+        if original_dtype == 'string':
+            if decoder['transformer_type'] == 'One-Hot':
+                pos = np.argmax(X[:, decoder['index']], axis=1)
+                return decoder['categories'][pos]
+
+            x = X[:, decoder['index']]
+            valid = ~np.isnan(x)
+            values = np.full(len(x), np.nan, dtype=object)
+            if decoder['transformer_type'] == 'LabelEncoding':
+                code = np.round(np.clip(x[valid], decoder['min'], decoder['max'])).astype(int)
+                values[valid] = decoder['categories'][code - decoder['min']]
+            else: # Cat1, Cat1Fuzzy
+                pos = np.searchsorted(decoder['upper_bounds'], np.clip(x[valid], 0, 1), side='left')
+                values[valid] = decoder['categories'][np.minimum(pos, len(decoder['categories'])-1)]
+            return values
+
+        x = X[:, decoder['index']]
+        isnull = np.isnan(x)
+        if decoder['null_index'] is not None:
+            isnull = isnull | (X[:, decoder['null_index']] > 0.5)
+        elif decoder.get('null_threshold') is not None:
+            isnull = isnull | (x < decoder['null_threshold'])
+        elif decoder.get('null_rate') is not None:
+            isnull = isnull | (rng.random(len(x)) < decoder['null_rate'])
+
+        # IF BOOLEAN
+        if original_dtype == 'boolean':
+            values = np.nan_to_num(np.round(x).clip(0, 1)).astype(bool)
+            return (values, isnull)
+        # IF FLOAT
+        elif original_dtype == 'Float64':
+            return np.where(isnull, np.nan, x)
+        # IF INT
+        elif original_dtype == 'Int64':
+            return np.where(isnull, np.nan, np.round(x))
+        # IF DATETIME
+        elif 'datetime' in original_dtype:
+            from bdarpack import utils_ as ut_ # (same decoding as SamplingPlan)
+            t = np.where(isnull, np.nan, x * decoder['common_divider'])
+            return ut_.decode_datetime(t, decoder['datetime_format'], base_unit=decoder['base_unit'])
+        else:
+            return x
@@ -0,0 +1,271 @@
+import pandas as pd
+import numpy as np
+import os
+import json
+from scipy.special import ndtr, ndtri
+
+from bdarpack import utils_ as ut_
+
+class SamplingPlan:
+    """
+    Compiled sampling plan: takes the normal draws of a fitted GaussianCopula straight to the final (reverse-transformed) columns, in one pass over numpy arrays.
+    Equivalent to Transformer.reverse(GaussianCopula.sample()), without building the intermediate DataFrames (samples, per-row decoding of the categories and datetimes).
+
+    Inputs:
+        copula (GaussianCopula): fitted Gaussian copula, whose variables are the output fields of the transformer.
+
+        transformer (Transformer): transformer used to build the training data of the copula (i.e. with transformer_meta_dict).
+
+        debug (bool): Flag to print debugging lines. Default is `False`.
+    """
+
+    def __init__(self,
+        copula,
+        transformer,
+        debug=False
+    ):
+
+        self.debug = debug
+        self.copula = copula
+        self.transformer = transformer
+
+        self.var_names = None #list of copula variables (columns of the normal draws)
+        self.univariates = None #list of MarginalDist, one for each copula variable
+        self.decoders = None #list of dict, one for each reversed field (in order of transformer_meta_dict)
+
+        self.compile()
+
+    def compile(self):
+        """Build the decoders (column positions and lookup arrays) from the transformer_meta_dict."""
+
+        self.var_names = list(self.copula.var_names)
+        self.univariates = [self.copula.univariates[var_name] for var_name in self.var_names]
+        col_index = {var_name: i for i, var_name in enumerate(self.var_names)}
+
+        decoders = []
+        for field, field_meta in self.transformer.transformer_meta_dict.items():
+
+            output_fields = list(field_meta['output_fields'].keys())
+            missing = [f for f in output_fields if f not in col_index]
+            if len(missing) > 0:
+                raise ValueError(f"Output fields {missing} of {field} are not variables of the copula.")
+
+            decoder = {
+                'field': field,
+                'original_dtype': field_meta['original_dtype'],
+                'transformer_type': field_meta.get('transformer_type'),
+                'null_index': None,
+            }
+            value_field = f"{field}.value"
+
+            if field_meta['original_dtype'] == 'string':
+                if decoder['transformer_type'] == 'One-Hot':
+                    # fitted categories of the output fields, then the null field (ref. Transformer._reverse_onehot)
+                    levels = field_meta.get('levels', [f[len(field)+1:] for f in output_fields if f != f"{field}.is_null"])
+                    decoder['index'] = np.array([col_index[f] for f in output_fields])
+                    decoder['categories'] = np.array(list(levels) + [np.nan] * (len(output_fields) - len(levels)), dtype=object)
+                elif decoder['transformer_type'] == 'LabelEncoding':
+                    inv_dic = field_meta['inv_params_dict']
+                    decoder['index'] = col_index[value_field]
+                    decoder['min'] = min(inv_dic)
+                    decoder['max'] = max(inv_dic)
+                    lookup = np.full(decoder['max'] - decoder['min'] + 1, np.nan, dtype=object)
+                    for code, cat in inv_dic.items():
+                        lookup[code - decoder['min']] = np.nan if cat == 'IS_NULL' else cat
+                    decoder['categories'] = lookup
+                elif decoder['transformer_type'] in ('Cat1', 'Cat1Fuzzy'):
+                    intervals = field_meta['intervals']
+                    decoder['index'] = col_index[value_field]
+                    decoder['upper_bounds'] = field_meta['upper_bounds'] if 'upper_bounds' in field_meta else np.array([upper for (lower, upper) in intervals.values()], dtype=float)
+                    decoder['categories'] = np.array([np.nan if cat == 'IS_NULL' else cat for cat in intervals], dtype=object)
+                else:
+                    raise TypeError('Transformer Type is not recognised.')
+            else:
+                decoder['index'] = col_index[value_field]
+                if 'datetime' in field_meta['original_dtype']:
+                    decoder['common_divider'] = field_meta['common_divider']
+                    decoder['datetime_format'] = field_meta['datetime_format']
+                    decoder['datetime_unit'] = ut_.datetime_format_resolution(field_meta['datetime_format'])
+                    decoder['base_unit'] = 's' if field_meta['original_dtype'] == 'datetime64[s]' else 'ns'
+                if field_meta['null']['fix_null']:
+                    null_field = field_meta['null'].get('null_field', f"{field}.is_null")
+                    if null_field is not None:
+                        decoder['null_index'] = col_index[null_field]
+                    elif field_meta['null'].get('sentinel_threshold') is not None:
+                        decoder['null_threshold'] = field_meta['null']['sentinel_threshold']
+                    else:
+                        decoder['null_rate'] = field_meta['null'].get('null_rate', 0)
+
+            decoders.append(decoder)
+
+        self.decoders = decoders
+
+    def sample(self, size=1, method='random'):
+        """
+        Generates reverse-transformed synthetic data from the copula.
+        Args:
+            size (int): The number of synthetic samples to generate.
+            method (str): 'random' (default) or 'sobol' (ref. GaussianCopula.sample()).
+        Returns:
+            revert_df (pd.DataFrame): synthetic samples, in the original (reverse-transformed) format.
+        """
+
+        norm_samples_np = self.copula.sample_normal(size=size, method=method)
+
+        return self.decode_normal(norm_samples_np)
+
+    def export(self, path, n_grid=4097, z_max=8.0):
+        """
+        Export the plan to a numpy-only artifact (directory with meta.json and .npy files), to be loaded by SamplerRuntime.
+        Each marginal (norm.cdf followed by ppf) is tabulated on a grid of z-values, so that the runtime only needs np.interp.
+        Args:
+            path (str): output directory (created if it does not exist).
+            n_grid (int): no. of grid points, evenly spaced in z and in probability (merged). Default is 4097.
+            z_max (float): the grid covers [-z_max, z_max]. Default is 8.0.
+        Returns:
+            path (str)
+        """
+
+        os.makedirs(path, exist_ok=True)
+
+        # Cholesky factor of the full correlation matrix (block-diagonal if the copula has blocks)
+        if getattr(self.copula, 'block_diagonal', False):
+            cholesky = np.zeros((len(self.var_names), len(self.var_names)))
+            col_index = {var_name: i for i, var_name in enumerate(self.var_names)}
+            for block, factor in zip(self.copula.blocks, self.copula.block_cholesky):
+                index = [col_index[var_name] for var_name in block]
+                cholesky[np.ix_(index, index)] = factor
+        else:
+            if getattr(self.copula, 'cholesky', None) is None:
+                self.copula._build_cholesky()
+            cholesky = self.copula.cholesky
+
+        # Lookup tables z -> x = ppf(norm.cdf(z))
+        u_max = ndtr(z_max)
+        z_grid = np.union1d(
+            np.linspace(-z_max, z_max, n_grid),
+            ndtri(np.linspace(1-u_max, u_max, n_grid))
+        )
+        U = ndtr(z_grid)
+        x_table = np.empty((len(self.var_names), len(z_grid)))
+        for j, univariate in enumerate(self.univariates):
+            x_table[j] = univariate.ppf_wrapper(data=U)
+        x_table = self._fill_nan_table(x_table)
+
+        np.save(os.path.join(path, 'cholesky.npy'), np.ascontiguousarray(cholesky))
+        np.save(os.path.join(path, 'z_grid.npy'), z_grid)
+        np.save(os.path.join(path, 'x_table.npy'), x_table)
+
+        # Decoders (json-serialisable)
+        def to_json(value):
+            if isinstance(value, np.ndarray):
+                return [to_json(v) for v in value.tolist()]
+            if isinstance(value, (list, tuple)):
+                return [to_json(v) for v in value]
+            if isinstance(value, (np.integer,)):
+                return int(value)
+            if isinstance(value, (float, np.floating)):
+                return None if np.isnan(value) else float(value)
+            return value
+
+        meta = {
+            'format_version': 1,
+            'var_names': self.var_names,
+            'decoders': [{k: to_json(v) for k, v in decoder.items()} for decoder in self.decoders],
+            'files': {'cholesky': 'cholesky.npy', 'z_grid': 'z_grid.npy', 'x_table': 'x_table.npy'},
+        }
+        with open(os.path.join(path, 'meta.json'), 'w') as fl:
+            json.dump(meta, fl, indent=1)
+
+        if (self.debug):
+            print(f"Sampler exported to {path}: {len(self.var_names)} variables, grid of {len(z_grid)} points.")
+
+        return path
+
+    def _fill_nan_table(self, x_table):
+        """Replace nan values of the lookup tables (e.g. ppf evaluated at the extremes) by the nearest valid value."""
+
+        for j in range(x_table.shape[0]):
+            valid = ~np.isnan(x_table[j])
+            if valid.all() or not valid.any():
+                continue
+            index = np.arange(x_table.shape[1])
+            x_table[j] = np.interp(index, index[valid], x_table[j][valid])
+
+        return x_table
+
+    def decode_normal(self, norm_samples_np):
+        """Take samples in the normal domain (columns in order of var_names) through the marginals (norm.cdf, ppf) and decode them."""
+
+        U = ndtr(norm_samples_np)
+        X = np.empty_like(U)
+        for j, univariate in enumerate(self.univariates):
+            X[:, j] = univariate.ppf_wrapper(data=U[:, j])
+
+        return self.decode(X)
+
+    def decode(self, X):
+        """
+        Reverse the transformation of an array of transformed values.
+        Args:
+            X (np.array): array of shape (size, no. of variables), with columns in the order of var_names.
+        Returns:
+            revert_df (pd.DataFrame): reverse-transformed data.
+        """
+
+        output = {}
+        for decoder in self.decoders:
+            output[decoder['field']] = self._decode_field(X, decoder)
+
+        return pd.DataFrame(output)
+
+    def _decode_field(self, X, decoder):
+
+        original_dtype = decoder['original_dtype']
+
+        # IF STRING
+        if original_dtype == 'string':
+            if decoder['transformer_type'] == 'One-Hot':
+                # position of the hot field, as codes of the (non-null) categories (ref. Transformer.reverse)
+                pos = np.argmax(X[:, decoder['index']], axis=1)
+                categories = decoder['categories']
+                valid = ~pd.isna(categories)
+                codes = np.where(valid[pos], (np.cumsum(valid) - 1)[pos], -1)
+                return pd.Categorical.from_codes(codes, categories=categories[valid])
+
+            x = X[:, decoder['index']]
+            valid = ~np.isnan(x)
+            values = np.full(len(x), np.nan, dtype=object)
+            if decoder['transformer_type'] == 'LabelEncoding':
+                code = np.round(np.clip(x[valid], decoder['min'], decoder['max'])).astype(int)
+                values[valid] = decoder['categories'][code - decoder['min']]
+            else: # Cat1, Cat1Fuzzy
+                pos = np.searchsorted(decoder['upper_bounds'], np.clip(x[valid], 0, 1), side='left')
+                values[valid] = decoder['categories'][np.minimum(pos, len(decoder['categories'])-1)]
+            return values
+
+        x = X[:, decoder['index']]
+        isnull = np.isnan(x)
+        if decoder['null_index'] is not None:
+            isnull = isnull | (X[:, decoder['null_index']] > 0.5)
+        elif decoder.get('null_threshold') is not None:
+            isnull = isnull | (x < decoder['null_threshold'])
+        elif decoder.get('null_rate') is not None:
+            isnull = isnull | (np.random.random(len(x)) < decoder['null_rate'])
+
+        # IF BOOLEAN
+        if original_dtype == 'boolean':
+            values = np.nan_to_num(np.round(x).clip(0, 1)).astype(bool)
+            return pd.arrays.BooleanArray(values, isnull)
+        # IF FLOAT
+        elif original_dtype == 'Float64':
+            return np.where(isnull, np.nan, x)
+        # IF INT
+        elif original_dtype == 'Int64':
+            return np.where(isnull, np.nan, np.round(x))
+        # IF DATETIME
+        elif 'datetime' in original_dtype:
+            t = np.where(isnull, np.nan, x * decoder['common_divider'])
+            return ut_.decode_datetime(t, decoder['datetime_format'], base_unit=decoder['base_unit'])
+        else:
+            return x
@@ -1,10 +1,20 @@
 from bdarpack import utils_ as ut_
 import pandas as pd
 from copy import deepcopy
+import copy
 import os, sys
 import pickle
+import tempfile
+import threading
+import contextlib
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from bdarpack.Transformer import Transformer
 from bdarpack.GaussianCopula import GaussianCopula
+from bdarpack.SamplingPlan import SamplingPlan
+from bdarpack.ConditionEngine import ConditionEngine
+from bdarpack.AsyncWriter import AsyncWriter
 from pprint import pprint
 
 try:
@@ -13,8 +23,81 @@ try:
 except ImportError:
     HAVE_PM = False
 
-def load_TC(defi):
-    """Function to load saved TC instance from definitions."""
+def _fit_conditional_copula(data_filename, start, stop, columns, dtypes, fit_options, seed=None):
+    """Fit the conditional copula of one permutation, in a worker process (ref. TabulaCopula.fit_gaussian_copula_conditional).
+    The rows [start, stop) of the memory-mapped array in data_filename form the transformed data of the permutation."""
+
+    data_np = np.load(data_filename, mmap_mode='r')
+    data_df = pd.DataFrame(np.array(data_np[start:stop]), columns=columns).astype(dict(zip(columns, dtypes)))
+    del data_np
+
+    if seed is not None:
+        np.random.seed(seed)
+
+    gaussian_copula_conditional = GaussianCopula(debug=fit_options['debug'], correlation_method=fit_options['correlation_method'], **fit_options['copula_options'])
+    gaussian_copula_conditional.fit(data_df, marginal_dist_dict=fit_options['marginal_dist_dict'], pd_warm_start=fit_options['pd_warm_start'])
+
+    return gaussian_copula_conditional
+
+# Outputs of each cached stage of TabulaCopula.syn_generate: (attributes, storage keys)
+STAGE_CACHE = {
+    'transform': (['transformed_df', 'control_df', 'processed_var_list', 'curated_train_df', 'cond_transformed_dfs', 'sparse_set_index_dict', 'width_report'], ['transformer', 'cond_transformer']),
+    'fit': ([], ['copula', 'cond_copula']),
+    'sample': (['syn_samples_df', 'syn_samples_conditional_df'], []),
+}
+
+# Frames no longer needed after each stage of TabulaCopula.syn_generate (spilled to disk in memory_lean mode)
+LEAN_RELEASE = {
+    'transform': ['train_df', 'curated_train_df'],
+    'fit': ['transformed_df', 'control_df'],
+    'sample': [],
+    'reverse': ['syn_samples_df', 'syn_samples_conditional_df', 'transformed_df', 'control_df'], # (transformed and control data reloaded by the reverse transformation of the control data)
+}
+
+# Attributes of TabulaCopula not saved by save_model (data and privacy evaluators, not needed for sampling)
+MODEL_EXCLUDE = [
+    'train_df', 'dict_df', 'transformed_df', 'control_df', 'curated_train_df',
+    'syn_samples_df', 'syn_samples_conditional_df', 'reversed_df', 'reversed_conditional_df', 'reversed_control_df', 'reversed_transformed_df',
+    'cond_transformed_dfs', 'pending_outputs', 'spilled_frames', 'privacyMetricEval', 'privacyMetricEval_cond',
+]
+# Attributes of MarginalDist holding the outputs of the last fit/sample/cdf/ppf (not saved by save_model)
+MODEL_EXCLUDE_MARGINAL = ['sample_cdf', 'sample_pdf', 'samples', 'cdf', 'pdf', 'ppf']
+
+class _ConditionalCopulaThunk:
+    """Deferred fit of a conditional copula (ref. TabulaCopula.fit_gaussian_copula_conditional(lazy=True)).
+    The copula is fitted on the first call to resolve() (or in the background, if prefetched), and cached.
+    The fit draws from its own generator (seeded by seed), not from the global np.random state, so that it does not depend on (or change) the draws of other threads."""
+
+    def __init__(self, data_df, fit_options, name, seed=None):
+        self.data_df = data_df #transformed data of the permutation
+        self.fit_options = fit_options
+        self.name = name #e.g. "set_1-1-2"
+        self.seed = seed #seed of the generator of the fit
+        self.copula = None
+        self.lock = threading.Lock()
+
+    def resolve(self):
+        with self.lock: # (a prefetch in progress is waited for, not repeated)
+            if self.copula is None:
+                gaussian_copula_conditional = GaussianCopula(debug=self.fit_options['debug'], correlation_method=self.fit_options['correlation_method'], **self.fit_options['copula_options'])
+                gaussian_copula_conditional.fit(self.data_df, marginal_dist_dict=self.fit_options['marginal_dist_dict'], pd_warm_start=self.fit_options['pd_warm_start'],
+                    random_state=np.random.default_rng(getattr(self, 'seed', None)))
+                if ( not gaussian_copula_conditional.fitted):
+                    print(f"Building conditional-copulae for {self.name} Failed!")
+                else:
+                    print(f"Building conditional-copulae for {self.name} Completed!")
+                self.copula = gaussian_copula_conditional
+                self.data_df = None
+
+        return self.copula
+
+def load_TC(defi, mode='instance', mmap_mode='r'):
+    """Function to load saved TC instance from definitions.
+    Inputs:
+        defi: definitions of the saved instance.
+        mode (str): 'instance' (default) to load the instance saved by save_instance(), or 'model' to load the model saved by save_model() (ref. load_model).
+        mmap_mode (str): memory-map mode of the arrays of the model (ref. load_model). Default is 'r'.
+    """
 
     # Get filename of spreadsheet of filenames
     t = defi.TRAINXLSX.split('.')[0]
@@ -26,6 +109,14 @@ def load_TC(defi):
         CLOF_df = pd.read_csv(CLOF_filename, na_values=None, keep_default_na=False)  #(MZ): 19042024: switch to preserve user defined 'na'
     elif (defi.OUTPUT_TYPE_DATA=='xlsx'):
         CLOF_df = pd.read_excel(CLOF_filename, sheet_name="SHEET1")
+    elif (defi.OUTPUT_TYPE_DATA in ['parquet', 'feather']):
+        CLOF_df = ut_.read_df_from_file(CLOF_filename)
+
+    if mode == 'model':
+        model_dirname = CLOF_df.loc[CLOF_df['Type'] == 'model', 'Object'].item()
+        return load_model(model_dirname, mmap_mode=mmap_mode)
+    elif mode != 'instance':
+        raise ValueError(f"Unknown mode: {mode}. Options include 'instance', 'model'.")
 
     # Get filename of pickle
     tc_inst_filename = CLOF_df.loc[CLOF_df['Type'] == 'tc-class-instance', 'Object'].item()
@@ -36,6 +127,13 @@ def load_TC(defi):
     
     return tc
 
+def load_model(path, mmap_mode='r'):
+    """Load a TabulaCopula model saved by save_model() from the directory path.
+    The numeric arrays (correlation matrices, Cholesky factors, empirical marginals, ..) are memory-mapped if mmap_mode is 'r' (default): pages are read on first access, and shared between processes loading the same model. Use mmap_mode=None to read them into memory.
+    The model can sample (sample_gaussian_copula, sample_gaussian_copula_conditional, sample_fused) and reverse the transformation, but holds no data (training data, transformed data, samples)."""
+
+    return ut_.load_pickle_npy(os.path.join(path, "model.pkl"), mmap_mode=mmap_mode)
+
 class TabulaCopula:
     """
     Wrapper for performing copula/conditional-copula (Gaussian) for Tabular-type data.
@@ -54,6 +152,16 @@ class TabulaCopula:
         
         sampling (float): Percentage of sample points draw from the transformed dataframe, leaving the rest as control. Default is 1 (use all). Note that the sampling is done after the transformation, not before.
 
+        copula_options (dict): dictionary of inputs for the GaussianCopula class initialisation (ref GaussianCopula), used for both the copula and the conditional-copulae, e.g. {'block_diagonal': True, 'block_threshold': 0.1}. Default is None.
+
+        intermediate_outputs (str): Outputs written to file by the pipeline: 'all' (default), 'final' (only the reversed synthetic samples) or 'none'. Outputs that are not written are kept in memory, and can be written with materialize_outputs().
+
+        async_write (bool): Whether to write the file outputs in a background thread (ref. AsyncWriter), while the pipeline continues. Call flush() to wait for the writes (done at the end of syn_generate and before saving the instance); write errors are raised by flush(). Default is False.
+
+        compact_dtypes (bool or str): Whether to read the training data with compact dtypes, chosen from the data dictionary (ref. read_inputData): 'string' variables with codings as 'category', other 'string' variables as Arrow strings (instead of python objects, if pyarrow is installed), and integer columns as the smallest nullable integer dtype. 'float32' also reads the float columns as float32 (with less precision). Default is False.
+
+        min_rows (int): Minimum no. of rows of a conditional permutation. Permutations with fewer (transformed) rows are not saved or fitted, and their children are sampled from the conditional distribution of the global copula instead. Can be overridden for each set with the key "min_rows" of conditionalSettings_dict. Default is None (fit all permutations).
+
         debug (bool): Flag to print debugging lines. Default is `True`.
 
     Example inputs:
@@ -78,7 +186,8 @@ class TabulaCopula:
                     }
                 },
                 "conditions_var": ["Age"], # the `Y` to keep constant while generating values of `X` in `P(X | Y)`. Can be a float, in which case it is a threshold to fix all variables with pairwise correlation (with X) above then said threshold.
-                "children": ['AgeMonths'] #variable for which to learn the joint conditional distributions on, the `X` in `P(X | Y)`. Can be a string: "allOthers".
+                "children": ['AgeMonths'], #variable for which to learn the joint conditional distributions on, the `X` in `P(X | Y)`. Can be a string: "allOthers".
+                "min_rows": 30 # (optional) minimum no. of rows of a permutation, replaces min_rows for this set.
             }
         }
 
@@ -99,6 +208,13 @@ class TabulaCopula:
         var_list_filter=None,
         removeNull=False,
         sampling = None,
+        copula_options=None,
+        min_rows=None,
+        intermediate_outputs='all',
+        async_write=False,
+        memory_lean=False,
+        chunksize=None,
+        compact_dtypes=False,
         debug=True
     ):
         
@@ -120,6 +236,7 @@ class TabulaCopula:
         self.dict_var_varname = "NAME" # column in data dictionary containing variable names in input data
         self.dict_var_varcategory = "CATEGORY" # column in data dictionary setting the category of the variable name
         self.dict_var_vartype = "TYPE" # column in data dictionary containing variable types in input data
+        self.dict_var_codings = "CODINGS" # column in data dictionary containing the codings of the variables (categories delimited by ';')
 
         self.conditional_set_bool = False # flag set to true when filenames initialised for conditional setup
 
@@ -137,12 +254,29 @@ class TabulaCopula:
             self.sampling = sampling if sampling > 0.01 and sampling <= 1 else 1 # float to decide proportion of transformed samples to use (forced to 1 if invalid)
 
         self.conditionalSettings_dict = conditionalSettings_dict
+        self.copula_options = copula_options if copula_options is not None else {} # inputs to GaussianCopula (other than correlation_method)
+        self.min_rows = min_rows # minimum no. of rows of a conditional permutation (sparser permutations use the global copula)
+        if intermediate_outputs not in ['all', 'final', 'none']:
+            raise ValueError(f"Unknown intermediate_outputs: {intermediate_outputs}. Options include 'all', 'final', 'none'.")
+        self.intermediate_outputs = intermediate_outputs # outputs written to file: 'all', 'final' (reversed samples only), 'none'
+        self.pending_outputs = {} # outputs kept in memory instead of written to file (ref. materialize_outputs), for each filename
+        self.writer = AsyncWriter(debug=self.debug) if async_write else None # background writer of the file outputs
+        self.memory_lean = memory_lean # spill frames to disk once no later stage of syn_generate needs them (ref. LEAN_RELEASE)
+        self.spilled_frames = {} # frames spilled to disk (pickle filename), for each attribute
+        self.stage_memory = {} # rss and peak rss (MB) and time (s) of each stage of syn_generate
+        self.width_report = None # width and memory estimate of the transformed data (ref. Transformer.report_width)
+        self.chunksize = chunksize # no. of rows of the training data read at a time (the training data is streamed, not loaded)
+        self.compact_dtypes = compact_dtypes # read the training data with compact dtypes chosen from the data dictionary (True, 'float32')
 
         # LOAD DATA DICTIONARY
         self.read_inputDict(sheetname=definitions.TRAINDICTXLSX_SHEETNAME)
 
         # LOAD INPUT DATA
-        self.read_inputData(sheetname=definitions.TRAINXLSX_SHEETNAME)
+        if chunksize is not None and ut_.get_extension(self.train_data_filename) == 'csv':
+            # (streamed by transform, only the list of variables is read)
+            self.var_list = list(pd.read_csv(self.train_data_filename, nrows=0, usecols=self._get_read_columns()).columns)
+        else:
+            self.read_inputData(sheetname=definitions.TRAINXLSX_SHEETNAME, columns=self._get_read_columns())
 
         # CREATE REQUIRED FOLDERS
         if not os.path.exists(self.syn_data_path):
@@ -173,6 +307,7 @@ class TabulaCopula:
         self._update_defaults(var_to_update="dict_var_varname", new_value="DICT_VAR_VARNAME", definitions=definitions)
         self._update_defaults(var_to_update="dict_var_varcategory", new_value="DICT_VAR_VARCATEGORY", definitions=definitions)
         self._update_defaults(var_to_update="dict_var_type", new_value="DICT_VAR_TYPE", definitions=definitions)
+        self._update_defaults(var_to_update="dict_var_codings", new_value="DICT_VAR_CODINGS", definitions=definitions)
         
         # Updating defaults for OUTPUT TYPES
         self._update_defaults(var_to_update="output_general_prefix", new_value="OUTPUT_GENERAL_PREFIX", definitions=definitions)
@@ -219,16 +354,22 @@ class TabulaCopula:
         self.privacyMetricResults = {} #initialise privacy metric results dictionary
 
     
-    def read_inputData(self, sheetname=None):
+    def read_inputData(self, sheetname=None, columns=None):
         """Reads training data from input definitions and outputs it as a dataframe.
         Data can be in the following formats:
             a) Excel .xlsx
             b) Text .csv
+            c) Parquet .parquet (requires pyarrow)
+            d) Feather .feather (requires pyarrow)
 
         Parameters
         ----------
         sheetname : string, optional
             Name of the sheet in the excel file. If not specified, the first sheet will be read.
+        columns : list, optional
+            Columns to read (column projection). If not specified, all columns will be read. At initialisation, the variables of var_list_filter (and of the conditional sets) are read (ref. _get_read_columns).
+
+        With compact_dtypes, the 'string' variables of the data dictionary are read with compact dtypes ('category' for variables with codings, Arrow strings otherwise if pyarrow is installed, ref. ut_.get_compact_dtypes), and the integer (and float, if compact_dtypes is 'float32') columns are downcast (ref. ut_.downcast_numeric). With 'float32', the numerical variables of csv files are read as float32 directly (unless they hold non-numeric entries); integer widths are only known from the data, so integers are downcast after reading.
         
         Returns
         -------
@@ -249,6 +390,7 @@ class TabulaCopula:
             print(f"File extension: {extension}")
 
         # Get file_type
+        file_type = None
         try:
             if (extension=='xlsx'):
                 file_type = 'excel'
@@ -263,26 +405,42 @@ class TabulaCopula:
                 self.train_data_sheetname = sheetname
             elif (extension=="csv"):
                 file_type = 'csv'
+            elif (extension in ['parquet', 'feather']):
+                file_type = extension
                         
         except ValueError as e:
             raise ValueError("Error in getting sheetname of file type xlsx: " + str(e)) from None
 
+        if file_type is None:
+            raise ValueError(f"File type {extension} is not supported. Options include 'xlsx', 'csv', 'parquet', 'feather'.")
+
         try:
             if file_type=='excel':
                 # Read file and output as dataframe
                 self.train_df = pd.read_excel(self.train_data_filename,
-                    sheet_name=sheetname
+                    sheet_name=sheetname,
+                    usecols=columns
                 )
             elif file_type=="csv":
                 # Read file and output as dataframe
-                self.train_df = pd.read_csv(self.train_data_filename, na_values=None, keep_default_na=False) #(MZ): 19042024: switch to preserve user defined 'na'
+                read_dtypes = self._get_read_dtypes(numeric=True)
+                try:
+                    self.train_df = pd.read_csv(self.train_data_filename, na_values=None, keep_default_na=False, usecols=columns, dtype=read_dtypes) #(MZ): 19042024: switch to preserve user defined 'na'
+                except ValueError:
+                    if read_dtypes == self._get_read_dtypes():
+                        raise
+                    # numerical variables with non-numeric entries (e.g. missing values, kept as strings): read at full width, downcast below
+                    self.train_df = pd.read_csv(self.train_data_filename, na_values=None, keep_default_na=False, usecols=columns, dtype=self._get_read_dtypes())
+            else:
+                # Read columnar file (dtypes are kept)
+                self.train_df = ut_.read_df_from_file(self.train_data_filename, columns=columns)
 
         except ValueError as e:
             raise ValueError('Could not read sheet in excel file: ' + str(e)) from None
         
         # Convert columns to "string" type based on data dictionary settings
-        var_names = [row[self.dict_var_varname] for index, row in self.dict_df.iterrows() if row[self.dict_var_vartype] == 'string']
-        self.train_df[var_names] = self.train_df[var_names].astype("str")
+        self.train_df = self._convert_string_vars(self.train_df)
+        self.train_df = self._downcast_numeric_vars(self.train_df)
 
         if (self.debug):
             print(f"Input data loaded.")
@@ -295,6 +453,92 @@ class TabulaCopula:
 
         return self.train_df
 
+    def _get_read_columns(self):
+        """Columns of the training data to read at initialisation: the variables of var_list_filter, and the variables of the conditional sets (parents, children, covariates). None (all columns) if var_list_filter is not given."""
+
+        if self.var_list_filter is None:
+            return None
+
+        columns = list(self.var_list_filter)
+        for set_no, conditionalBody in (self.conditionalSettings_dict or {}).items():
+            cond_vars = list(conditionalBody.get("parent_conditions", {}).keys())
+            for key in ["children", "conditions_var"]:
+                if isinstance(conditionalBody.get(key), list):
+                    cond_vars += conditionalBody[key]
+            columns += [var for var in cond_vars if var not in columns]
+
+        return columns
+
+    def _get_read_dtypes(self, numeric=False):
+        """Compact dtypes of the 'string' variables to read the training data with (ref. ut_.get_compact_dtypes), None if compact_dtypes is False.
+        With numeric=True and compact_dtypes 'float32', the numerical variables are read as float32 too."""
+
+        compact_dtypes = getattr(self, 'compact_dtypes', False)
+        if not compact_dtypes:
+            return None
+
+        dtype_dict = ut_.get_compact_dtypes(self.dict_df,
+            varname_col=self.dict_var_varname,
+            vartype_col=self.dict_var_vartype,
+            codings_col=getattr(self, 'dict_var_codings', "CODINGS")
+        )
+        if numeric and compact_dtypes == 'float32':
+            dtype_dict.update({var_name: 'float32' for var_name in self._get_numeric_vars()})
+
+        return dtype_dict
+
+    def _get_numeric_vars(self):
+        """Numerical variables of the data dictionary."""
+
+        return [row[self.dict_var_varname] for index, row in self.dict_df.iterrows() if str(row[self.dict_var_vartype]).strip().lower() in ['numeric', 'numerical']]
+
+    def _convert_string_vars(self, data_df):
+        """Convert columns to "string" type based on data dictionary settings (to their compact dtype with compact_dtypes, unless read as such)."""
+
+        var_names = [row[self.dict_var_varname] for index, row in self.dict_df.iterrows() if str(row[self.dict_var_vartype]).strip().lower() == 'string' and row[self.dict_var_varname] in data_df.columns] # (same normalisation as ut_.get_compact_dtypes)
+        read_dtypes = self._get_read_dtypes()
+        if read_dtypes is None:
+            data_df[var_names] = data_df[var_names].astype("str")
+        else:
+            for var_name in var_names:
+                if data_df[var_name].dtype.name not in ['category', 'string']:
+                    data_df[var_name] = data_df[var_name].astype("str").astype(read_dtypes.get(var_name, "str"))
+
+        return data_df
+
+    def _downcast_numeric_vars(self, data_df):
+        """Downcast the numerical columns to the smallest nullable integer dtype (and float32 if compact_dtypes is 'float32'), with compact_dtypes (ref. ut_.downcast_numeric)."""
+
+        compact_dtypes = getattr(self, 'compact_dtypes', False)
+        if not compact_dtypes:
+            return data_df
+
+        return ut_.downcast_numeric(data_df, columns=self._get_numeric_vars(), float_dtype='float32' if compact_dtypes == 'float32' else None)
+
+    def iter_inputData(self, chunksize, columns=None):
+        """Read the training data in chunks of chunksize rows (same processing as read_inputData).
+        csv files are streamed (the rows are never loaded all at once), other file types are read (if not loaded yet), then split.
+        Inputs:
+            chunksize (int): no. of rows of each chunk.
+            columns (list): columns to read. Default is None (the columns read at initialisation, ref. _get_read_columns).
+        Returns:
+            generator of dataframes (index continued across the chunks, as the index of train_df)
+        """
+
+        if columns is None:
+            columns = self._get_read_columns()
+
+        if ut_.get_extension(self.train_data_filename) == 'csv':
+            reader = pd.read_csv(self.train_data_filename, na_values=None, keep_default_na=False, usecols=columns, chunksize=chunksize, dtype=self._get_read_dtypes()) #(MZ): 19042024: switch to preserve user defined 'na'
+        else:
+            data_df = self.train_df if self.train_df is not None else self.read_inputData(sheetname=getattr(self, 'train_data_sheetname', None), columns=self._get_read_columns())
+            if columns is not None:
+                data_df = data_df[columns]
+            reader = (data_df.iloc[start:start+chunksize] for start in range(0, len(data_df), chunksize))
+
+        for chunk in reader:
+            yield self._downcast_numeric_vars(self._convert_string_vars(chunk))
+
     def read_inputDict(self, sheetname=None):
 
         if (self.debug):
@@ -340,8 +584,13 @@ class TabulaCopula:
 
         return self.dict_df
 
-    def transform(self, metaData=None, var_list=None, default_transformer_type_4_string='One-Hot', default_datetime_format=f"%Y-%m-%d %H:%M:%S"):
+    def transform(self, metaData=None, var_list=None, default_transformer_type_4_string='One-Hot', default_datetime_format=f"%Y-%m-%d %H:%M:%S", chunksize=None, onehot_max_levels=None, onehot_fallback='Cat1', onehot_dtype=None, null_min_rate=0, null_merge=False, null_sentinel=False, n_jobs=None):
         """
+        Transform the training data (ref. Transformer).
+        If chunksize is given (or set at initialisation), the training data is streamed in chunks of chunksize rows (ref. iter_inputData): the transformer is fitted on all chunks (Transformer.partial_fit), then each chunk is transformed. Only the transformed data is held in memory (the curated data is not kept).
+        'One-Hot' variables with more than onehot_max_levels categories are transformed with onehot_fallback, and onehot_dtype ('uint8', 'sparse') sets the storage of the 'One-Hot' fields. null_min_rate, null_merge and null_sentinel reduce the null indicator fields (ref. Transformer). The width and memory estimate of the transformed data (Transformer.report_width) is saved in width_report once the transformer is fitted, before transforming.
+        n_jobs sets the no. of threads of the transformer, used to transform the fields (and reverse them, ref. reverse) in parallel.
+
         Change log:
             -MZ 07-09-2023: add sampling option to transformed data (form disjoint subsets for training and control)
             -MZ 19-04-2024: add options to define default transformer types and datetime format
@@ -360,9 +609,33 @@ class TabulaCopula:
             removeNull = self.removeNull,
             debug = self.debug,
             default_transformer_type_4_string = default_transformer_type_4_string,
-            default_datetime_format = default_datetime_format
+            default_datetime_format = default_datetime_format,
+            onehot_max_levels = onehot_max_levels,
+            onehot_fallback = onehot_fallback,
+            onehot_dtype = onehot_dtype,
+            null_min_rate = null_min_rate,
+            null_merge = null_merge,
+            null_sentinel = null_sentinel,
+            n_jobs = n_jobs
         )
-        self.transformed_df = transformer.transform(self.train_df)
+        chunksize = chunksize if chunksize is not None else getattr(self, 'chunksize', None)
+        if chunksize is None:
+            transformer.fit(self._get_frame('train_df'))
+        else:
+            for chunk in self.iter_inputData(chunksize):
+                transformer.partial_fit(chunk)
+
+        # width and memory estimate of the transformed data
+        self.width_report = transformer.report_width()
+        if (self.debug):
+            n_fields = self.width_report.loc['TOTAL', 'n_fields']
+            print(f"Transformed data: {n_fields} fields, {self.width_report.loc['TOTAL', 'memory_mb']:.1f} MB (correlation matrix: {n_fields**2*8/1e6:.1f} MB)")
+
+        if chunksize is None:
+            self.transformed_df = transformer.transform(self._get_frame('train_df'))
+        else:
+            self.transformed_df = pd.concat([transformer.transform(chunk) for chunk in self.iter_inputData(chunksize)])
+            transformer.data_curated_df = None # (curated data of the last chunk only)
 
         # Sampling subset of transformed data for training, leaving the rest for control (7 Sept 2023-MZ)
         if self.sampling != 1:
@@ -377,21 +650,29 @@ class TabulaCopula:
         self.storage['transformer'] = transformer
 
         # Save transformed data (output to file)
-        self._save_data_to_file(self.transformed_df, self.output_filenames['transformed'])
-        self._save_data_to_file(self.curated_train_df, self.output_filenames['curated'])
+        self._save_output(self.transformed_df, self.output_filenames['transformed'])
+        if self.curated_train_df is not None:
+            self._save_output(self.curated_train_df, self.output_filenames['curated'])
         if self.control_df is not None:
-            self._save_data_to_file(self.control_df, self.output_filenames["control"])
+            self._save_output(self.control_df, self.output_filenames["control"])
+
+        # The curated data is kept by TabulaCopula only (not needed by the transformer to reverse)
+        if getattr(self, 'memory_lean', False):
+            transformer.data_curated_df = None
 
         return self.transformed_df
     
     def transform_conditional(self, metaData=None):
         # Change Log: 05-07-2023
 
-        trainData = self.train_df # initialise data to be transformed
-        transformedData = self.transformed_df # initialise transformed dataframe (FULL)
+        trainData = self._get_frame('train_df') # initialise data to be transformed
+        transformedData = self._get_frame('transformed_df') # initialise transformed dataframe (FULL)
 
         if metaData is None: #not used anymore
             metaData = deepcopy(self.metaData_transformer)
+
+        self.cond_transformed_dfs = {} # conditional transformed data (in memory), for each set_no and merged_set_index
+        self.sparse_set_index_dict = {} # permutations with fewer than min_rows rows, for each set_no
         
         for set_no, conditionalBody in self.conditionalSettings_dict.items():
 
@@ -403,55 +684,29 @@ class TabulaCopula:
                 # Get List of Parents
                 parentVar_list = list(conditionalBody["parent_conditions"].keys())
 
-                # Build Condition Array to Filter Out Irrelevant Rows
-                cond_array = dict() #initialise condition array
-                
-                for merged_set_index in full_list_set_index: # e.g. "1-1-1", "1-2-1"
-                    
-                    cond_array[merged_set_index] = None # initialise condition array dict for each permutation
-                    grp_set_index = str(merged_set_index).split("-")
-
-                    for set_index, parentVar in zip(grp_set_index, parentVar_list):
-
-                        parentVarBody = conditionalBody["parent_conditions"][parentVar] # get corresponding parent body
-                        set_values = parentVarBody["condition_value"][int(set_index)] # get corresponding value from parent body
-                        sub_cond_array = None
-
-                        for set_value in set_values: # build sub-condition array by looping through all values in condition_value[set_index]
-
-                            if (parentVarBody['condition']=="set"):
-
-                                t_trainData_pVar = trainData[parentVar].astype('object').apply(str) # parent data column
-
-                                if (sub_cond_array is None): # first entry
-                                    sub_cond_array = (t_trainData_pVar.str.upper() == str(set_value).upper())
-                                else: # subsequent entries
-                                    sub_cond_array = sub_cond_array | (t_trainData_pVar.str.upper() == str(set_value).upper())
-
-                            elif (parentVarBody['condition']=="range"):
+                # Find Rows of each Permutation (parent columns encoded once, ref. ConditionEngine)
+                condition_engine = self._get_condition_engine(set_no)
+                groups, train_index = self._evaluate_conditions(condition_engine, parentVar_list, trainData)
 
-                                t_trainData_pVar = trainData[parentVar].astype('float')  # parent data column
-
-                                if (sub_cond_array is None): # first entry
-                                    sub_cond_array = eval("t_trainData_pVar" + set_value)
-                                else: # subsequent entries
-                                    sub_cond_array = sub_cond_array & eval("t_trainData_pVar" + set_value)
-
-                        # Add derived sub_cond_array into cond_array, corresponding to current merged_set_index permutation
-                        if cond_array[merged_set_index] is None:
-                            cond_array[merged_set_index] = sub_cond_array
-                        else: # collect all the sub_cond_array(s) using the AND operation
-                            cond_array[merged_set_index] = cond_array[merged_set_index] & sub_cond_array
-
-                        
                 # Define Conditional-Transformer as Full Transformer (save transformer)
                 self.storage['cond_transformer'][set_no] = self.storage['transformer']
+                self.cond_transformed_dfs[set_no] = {}
+                self.sparse_set_index_dict[set_no] = []
+                min_rows = conditionalBody.get("min_rows", getattr(self, 'min_rows', None))
 
                 # Filter Out Irrelevant Rows using Condition Array, then SAVE
-                for merged_set_index, set_cond in cond_array.items():
+                for merged_set_index in full_list_set_index:
 
+                    set_cond = transformedData.index.isin(train_index[groups[merged_set_index]])
                     transformed_filtered = transformedData[set_cond].copy()
 
+                    # Skip under-populated permutations (sampled from the global copula)
+                    if min_rows is not None and len(transformed_filtered) < min_rows:
+                        self.sparse_set_index_dict[set_no].append(merged_set_index)
+                        if (self.debug):
+                            print(f"Permutation {set_no}-{merged_set_index} has {len(transformed_filtered)} rows (min_rows={min_rows}), skipped.")
+                        continue
+
                     # If null settings is 'mean'/'median'/'mode', update new mean/median/mode for null values
                     # (1) filter for all relevant children variables
                     if (conditionalBody["children"] == "allOthers"):
@@ -467,8 +722,10 @@ class TabulaCopula:
 
                     # print(transformed_filtered.dtypes)
 
-                    # Save filtered transformed_data (output to file)
-                    self._save_data_to_file(transformed_filtered, self.output_filenames['conditional_transformed'][set_no][merged_set_index])
+                    # Save filtered transformed_data (output to file), and keep it in memory for fit_gaussian_copula_conditional
+                    transformed_filtered = transformed_filtered.reset_index(drop=True) # (index not saved)
+                    self._save_output(transformed_filtered, self.output_filenames['conditional_transformed'][set_no][merged_set_index])
+                    self.cond_transformed_dfs[set_no][merged_set_index] = transformed_filtered
 
         return 0
 
@@ -483,17 +740,17 @@ class TabulaCopula:
         if transformed_df is not None:
             df = transformed_df
         else:
-            df = self.syn_samples_df
+            df = self._get_frame('syn_samples_df')
 
         if conditional_transformed_df is not None:
             cond_df = conditional_transformed_df
         else: 
-            cond_df = self.syn_samples_conditional_df
+            cond_df = self._get_frame('syn_samples_conditional_df')
 
         if control_transformed_df is not None:
             control_df = control_transformed_df
         else:
-            control_df = self.control_df
+            control_df = self._get_frame('control_df')
 
         # Get saved transformer from storage
         transformer = self.storage['transformer']
@@ -509,16 +766,16 @@ class TabulaCopula:
         # Reverse the control data transformation
         if control_df is not None:
             self.reversed_control_df = transformer.reverse(control_df)
-            self.reversed_transformed_df = transformer.reverse(self.transformed_df)
+            self.reversed_transformed_df = transformer.reverse(self._get_frame('transformed_df'))
 
         # Output to file
-        self._save_data_to_file(self.reversed_df, self.output_filenames["reversed_samples"])
+        self._save_output(self.reversed_df, self.output_filenames["reversed_samples"], final=True)
         if cond_df is not None:
-            self._save_data_to_file(self.reversed_conditional_df, self.output_filenames["conditional_reversed_samples"])
+            self._save_output(self.reversed_conditional_df, self.output_filenames["conditional_reversed_samples"], final=True)
 
         if control_df is not None:
-            self._save_data_to_file(self.reversed_control_df, self.output_filenames["controlReversed_samples"])
-            self._save_data_to_file(self.reversed_transformed_df, self.output_filenames["training_samples"])
+            self._save_output(self.reversed_control_df, self.output_filenames["controlReversed_samples"])
+            self._save_output(self.reversed_transformed_df, self.output_filenames["training_samples"])
 
         return self.reversed_df, self.reversed_conditional_df
     
@@ -536,7 +793,7 @@ class TabulaCopula:
 
                         pprint(f'Printing Conditional-Copula Parameters for {set_no}: {merged_set_index}')
 
-                        cp_cond = self.storage['cond_copula'][set_no][merged_set_index]
+                        cp_cond = self._get_cond_copula(set_no, merged_set_index)
                         cp_cond.print_copula_params()
         
         return 0
@@ -544,17 +801,34 @@ class TabulaCopula:
     def fit_gaussian_copula(self, correlation_method='kendall', marginal_dist_dict=None):
 
         # Get transformed data
-        transformed_df = self.transformed_df
+        transformed_df = self._get_frame('transformed_df')
 
         # Fit Gaussian Copula using given options
-        gaussian_copula = GaussianCopula(debug=self.debug, correlation_method=correlation_method)
+        gaussian_copula = GaussianCopula(debug=self.debug, correlation_method=correlation_method, **self.copula_options)
         gaussian_copula.fit(transformed_df, marginal_dist_dict=marginal_dist_dict)
 
         # Save learned Gaussian Copula
         self.storage['copula'] = gaussian_copula
 
-    def fit_gaussian_copula_conditional(self, correlation_method='kendall', marginal_dist_dict=None):
-        """Build Conditional Copula for given conditional_dict"""
+    def fit_gaussian_copula_conditional(self, correlation_method='kendall', marginal_dist_dict=None, n_jobs=None, lazy=False, prefetch=False):
+        """Build Conditional Copula for given conditional_dict.
+        Inputs:
+            correlation_method (str): correlation method of the copulas. Default is 'kendall'.
+            marginal_dist_dict (dict): candidate marginal distributions of each variable. Default is None.
+            n_jobs (int): no. of processes used to fit the copulas of the permutations in parallel (-1: all cores). Default is None (serial).
+                The transformed data of each set are passed to the workers as a memory-mapped array (one slice for each permutation), and the copulas are stored in the order of the permutations.
+            lazy (bool): If True, the copulas are not fitted here: each permutation is stored as a thunk, fitted on first use by sample_gaussian_copula_conditional (and cached). Default is False.
+            prefetch (bool, int): (lazy only) fit the thunks in the background, in order of the permutations, with 1 (True) or the given no. of threads. Default is False.
+                Each thunk is given its own seed (drawn in order of the permutations), so the results do not depend on the scheduling of the threads.
+        """
+
+        if n_jobs is not None and n_jobs < 0:
+            n_jobs = os.cpu_count()
+
+        # Cancel the background fits of a previous lazy fit (its thunks are replaced)
+        if getattr(self, 'prefetch_executor', None) is not None:
+            self.prefetch_executor.shutdown(wait=False, cancel_futures=True)
+        self.prefetch_executor = None
 
         for set_no, conditionalBody in self.conditionalSettings_dict.items():
 
@@ -569,22 +843,77 @@ class TabulaCopula:
                 # Initialise storage for set_no
                 self.storage['cond_copula'][set_no] = {}
 
-                for merged_set_index in full_list_set_index: # e.g. "1-1-1", "1-2-1"
-
-                    # Read Transformed-Conditional Dataset from Stored CSVs
-                    transformed_filtered_conditional_filename = self.output_filenames['conditional_transformed'][set_no][merged_set_index]
+                # Warm start the nearest-correlation projections from the global copula (or the previous permutation)
+                pd_warm_start = getattr(self.storage.get('copula'), 'pd_info', None)
 
-                    transformed_filtered_conditional = pd.read_csv(transformed_filtered_conditional_filename)
-                    # transformed_filtered_conditional = pd.read_csv(transformed_filtered_conditional_filename, na_values=None, keep_default_na=False)  #(MZ): 19042024: switch to preserve user defined 'na'
+                # Transformed-Conditional Datasets (kept in memory by transform_conditional, else read from stored CSVs)
+                # (under-populated permutations are not fitted)
+                sparse_set_index_list = self._get_sparse_set_index(set_no)
+                fit_list_set_index = [merged_set_index for merged_set_index in full_list_set_index if merged_set_index not in sparse_set_index_list]
+                transformed_conditional_dict = {
+                    merged_set_index: self._get_conditional_transformed(set_no, merged_set_index)
+                    for merged_set_index in fit_list_set_index
+                }
 
-                    if (self.debug):
-                        print(transformed_filtered_conditional)
+                if lazy:
+                    fit_options = {
+                        'debug': self.debug,
+                        'correlation_method': correlation_method,
+                        'copula_options': self.copula_options,
+                        'marginal_dist_dict': marginal_dist_dict,
+                        'pd_warm_start': pd_warm_start,
+                    }
+                    seeds = np.random.randint(2**32, size=len(fit_list_set_index), dtype=np.uint64)
+                    copula_dict = {
+                        merged_set_index: _ConditionalCopulaThunk(transformed_conditional_dict[merged_set_index], fit_options, f"{set_no}-{merged_set_index}", seed=int(seeds[k]))
+                        for k, merged_set_index in enumerate(fit_list_set_index)
+                    }
+                    if prefetch:
+                        if self.prefetch_executor is None:
+                            self.prefetch_executor = ThreadPoolExecutor(max_workers=1 if prefetch is True else int(prefetch))
+                        for thunk in copula_dict.values():
+                            self.prefetch_executor.submit(thunk.resolve)
+                elif n_jobs is not None and n_jobs > 1 and len(fit_list_set_index) > 1:
+                    fit_options = {
+                        'debug': self.debug,
+                        'correlation_method': correlation_method,
+                        'copula_options': self.copula_options,
+                        'marginal_dist_dict': marginal_dist_dict,
+                        'pd_warm_start': pd_warm_start,
+                    }
+                    copula_dict = self._fit_conditional_copula_parallel(transformed_conditional_dict, fit_options, n_jobs)
+                else:
+                    copula_dict = {}
+                    for merged_set_index in fit_list_set_index: # e.g. "1-1-1", "1-2-1"
 
-                    # Fit Gaussian Copula using given options
-                    gaussian_copula_conditional = GaussianCopula(debug=self.debug, correlation_method=correlation_method)
-                    gaussian_copula_conditional.fit(transformed_filtered_conditional, marginal_dist_dict=marginal_dist_dict)
+                        transformed_filtered_conditional = transformed_conditional_dict[merged_set_index]
 
-                    if ( not gaussian_copula_conditional.fitted):
+                        if (self.debug):
+                            print(transformed_filtered_conditional)
+
+                        # Fit Gaussian Copula using given options
+                        gaussian_copula_conditional = GaussianCopula(debug=self.debug, correlation_method=correlation_method, **self.copula_options)
+                        gaussian_copula_conditional.fit(transformed_filtered_conditional, marginal_dist_dict=marginal_dist_dict, pd_warm_start=pd_warm_start)
+                        if gaussian_copula_conditional.pd_info is not None and gaussian_copula_conditional.pd_info['correction'] is not None:
+                            pd_warm_start = gaussian_copula_conditional.pd_info
+
+                        copula_dict[merged_set_index] = gaussian_copula_conditional
+
+                for merged_set_index in full_list_set_index:
+
+                    if merged_set_index in sparse_set_index_list:
+                        # Fall back to the global copula (children sampled from its conditional distribution)
+                        if self.storage['copula'] is None:
+                            raise ValueError(f"Permutation {set_no}-{merged_set_index} has fewer than min_rows rows, fit the global copula (fit_gaussian_copula) first.")
+                        print(f"Building conditional-copulae for {set_no}-{merged_set_index} Skipped (fewer than min_rows rows), using the global copula.")
+                        self.storage['cond_copula'][set_no][merged_set_index] = self.storage['copula']
+                        continue
+
+                    gaussian_copula_conditional = copula_dict[merged_set_index]
+                    if lazy:
+                        self.storage['cond_copula'][set_no][merged_set_index] = gaussian_copula_conditional
+                        continue
+                    elif ( not gaussian_copula_conditional.fitted):
                         print(f"Building conditional-copulae for {set_no}-{merged_set_index} Failed!")
                     else:
                         print(f"Building conditional-copulae for {set_no}-{merged_set_index} Completed!")
@@ -592,24 +921,144 @@ class TabulaCopula:
                     # Save learned Gaussian Copula
                     self.storage['cond_copula'][set_no][merged_set_index] = gaussian_copula_conditional
 
+                # Release the in-memory datasets of set_no
+                if getattr(self, 'cond_transformed_dfs', None) is not None:
+                    self.cond_transformed_dfs.pop(set_no, None)
+
+    def _get_cond_copula(self, set_no, merged_set_index):
+        """Conditional copula of set_no and merged_set_index. A thunk (lazy fit) is fitted on first use, and replaced by the fitted copula."""
+
+        gaussian_copula_conditional = self.storage['cond_copula'][set_no][merged_set_index]
+        if isinstance(gaussian_copula_conditional, _ConditionalCopulaThunk):
+            gaussian_copula_conditional = gaussian_copula_conditional.resolve()
+            self.storage['cond_copula'][set_no][merged_set_index] = gaussian_copula_conditional
+
+        return gaussian_copula_conditional
+
+    def resolve_conditional_copulas(self):
+        """Fit all pending conditional copulas of a lazy fit (e.g. before saving the instance), and stop the prefetch threads."""
+
+        for set_no, cond_copula_dict in self.storage.get('cond_copula', {}).items():
+            for merged_set_index in cond_copula_dict:
+                self._get_cond_copula(set_no, merged_set_index)
+
+        if getattr(self, 'prefetch_executor', None) is not None:
+            self.prefetch_executor.shutdown(wait=True)
+        self.prefetch_executor = None
+
+    def _get_sparse_set_index(self, set_no):
+        """List of permutations of set_no with fewer than min_rows rows (ref. transform_conditional)."""
+
+        sparse_set_index_dict = getattr(self, 'sparse_set_index_dict', None) # (instances pickled before min_rows was added)
+        if sparse_set_index_dict is None:
+            return []
+
+        return sparse_set_index_dict.get(set_no, [])
+
+    def _get_conditional_transformed(self, set_no, merged_set_index):
+        """Transformed-conditional dataset of set_no and merged_set_index, from memory if available (ref. transform_conditional), otherwise from the stored CSV."""
+
+        cond_transformed_dfs = getattr(self, 'cond_transformed_dfs', None) # (instances pickled before cond_transformed_dfs was added)
+        if cond_transformed_dfs is not None and merged_set_index in cond_transformed_dfs.get(set_no, {}):
+            return cond_transformed_dfs[set_no][merged_set_index]
 
-    def sample_gaussian_copula(self, sample_size=1, conditions=None):
+        transformed_filtered_conditional_filename = self.output_filenames['conditional_transformed'][set_no][merged_set_index]
+        pending_outputs = getattr(self, 'pending_outputs', None) or {}
+        if transformed_filtered_conditional_filename in pending_outputs: # (not written to file, ref. intermediate_outputs)
+            return self._get_pending_output(transformed_filtered_conditional_filename)
+        transformed_filtered_conditional = ut_.read_df_from_file(transformed_filtered_conditional_filename)
+        # transformed_filtered_conditional = pd.read_csv(transformed_filtered_conditional_filename, na_values=None, keep_default_na=False)  #(MZ): 19042024: switch to preserve user defined 'na'
+
+        return transformed_filtered_conditional
+
+    def _fit_conditional_copula_parallel(self, transformed_conditional_dict, fit_options, n_jobs):
+        """Fit the conditional copulas of transformed_conditional_dict in a process pool.
+        The datasets are stacked into one array, saved as .npy and memory-mapped by the workers (each worker reads its own rows only).
+        Each permutation is given its own seed (drawn in order of the permutations), so the results do not depend on the scheduling of the workers.
+        Returns:
+            copula_dict (dict): fitted GaussianCopula, for each merged_set_index (same order as transformed_conditional_dict)
+        """
+
+        merged_set_index_list = list(transformed_conditional_dict.keys())
+        first_df = transformed_conditional_dict[merged_set_index_list[0]]
+        columns = list(first_df.columns)
+        dtypes = [str(dtype) for dtype in first_df.dtypes]
+
+        bounds = np.cumsum([0] + [len(transformed_conditional_dict[merged_set_index]) for merged_set_index in merged_set_index_list])
+        seeds = np.random.randint(2**32, size=len(merged_set_index_list), dtype=np.uint64)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+
+            data_filename = os.path.join(tmp_dir, 'cond_transformed.npy')
+            data_np = np.lib.format.open_memmap(data_filename, mode='w+', dtype=np.float64, shape=(bounds[-1], len(columns)))
+            for k, merged_set_index in enumerate(merged_set_index_list):
+                data_np[bounds[k]:bounds[k+1]] = transformed_conditional_dict[merged_set_index][columns].to_numpy(dtype=np.float64)
+            data_np.flush()
+            del data_np
+
+            with ProcessPoolExecutor(max_workers=min(n_jobs, len(merged_set_index_list))) as executor:
+                futures = [
+                    executor.submit(_fit_conditional_copula, data_filename, bounds[k], bounds[k+1], columns, dtypes, fit_options, int(seeds[k]))
+                    for k in range(len(merged_set_index_list))
+                ]
+                copula_dict = {
+                    merged_set_index: future.result()
+                    for merged_set_index, future in zip(merged_set_index_list, futures)
+                }
+
+        return copula_dict
+
+    def sample_gaussian_copula(self, sample_size=1, conditions=None, sampling_method='random'):
+        """Sample from the fitted Gaussian copula. sampling_method: 'random' (default) or 'sobol' (ref. GaussianCopula.sample)."""
 
         # Get Copula 
         gaussian_copula = self.storage['copula']
 
         # Sample from Copula
-        syn_samples_df = gaussian_copula.sample(size=sample_size, conditions=conditions)
+        syn_samples_df = gaussian_copula.sample(size=sample_size, conditions=conditions, method=sampling_method)
 
         # Save generated samples
         self.syn_samples_df = syn_samples_df
 
         # Output to file
-        self._save_data_to_file(self.syn_samples_df, self.output_filenames['synthetic_samples'])
+        self._save_output(self.syn_samples_df, self.output_filenames['synthetic_samples'])
+
+    def sample_fused(self, sample_size=1, sampling_method='random'):
+        """Sample from the fitted Gaussian copula and reverse the transformation in a single pass over numpy arrays (ref. SamplingPlan).
+        Gives the same output as sample_gaussian_copula() followed by reverse_transform(), without the intermediate (transformed) synthetic samples."""
+
+        sampling_plan = self._get_sampling_plan()
+
+        # Sample and decode
+        self.reversed_df = sampling_plan.sample(size=sample_size, method=sampling_method)
+
+        # Output to file
+        self._save_output(self.reversed_df, self.output_filenames["reversed_samples"], final=True)
+
+        return self.reversed_df
+
+    def export_sampler(self, path=None, n_grid=4097):
+        """Export the fitted copula and transformer to a numpy-only artifact (meta.json and .npy files), to be loaded by SamplerRuntime (ref. SamplingPlan.export).
+        If path is None, output_filenames['sampler'] is used."""
 
-    def sample_gaussian_copula_conditional(self):
+        if path is None:
+            path = self.output_filenames['sampler']
 
-        samples = deepcopy(self.syn_samples_df) # Get generated set of synthetic samples
+        return self._get_sampling_plan().export(path, n_grid=n_grid)
+
+    def _get_sampling_plan(self):
+        """Compile (or reuse) the sampling plan for the current copula and transformer."""
+
+        sampling_plan = self.storage.get('sampling_plan')
+        if (sampling_plan is None) or (sampling_plan.copula is not self.storage['copula']) or (sampling_plan.transformer is not self.storage['transformer']):
+            sampling_plan = SamplingPlan(copula=self.storage['copula'], transformer=self.storage['transformer'], debug=self.debug)
+            self.storage['sampling_plan'] = sampling_plan
+
+        return sampling_plan
+
+    def sample_gaussian_copula_conditional(self, sampling_method='random'):
+
+        samples = self._get_frame('syn_samples_df').copy(deep=False) # Get generated set of synthetic samples (columns shared with syn_samples_df, until resampled)
 
         for set_no, conditionalBody in self.conditionalSettings_dict.items():
 
@@ -639,79 +1088,27 @@ class TabulaCopula:
                     a = cond_transformer.transformer_meta_dict[childVar]['output_fields'].keys()
                     childVarTransform_meta_outputfields = childVarTransform_meta_outputfields + list(a)
 
+                # Copy the child fields before resampling (syn_samples_df is left unchanged)
+                for field in childVarTransform_meta_outputfields:
+                    if field in samples.columns:
+                        samples[field] = samples[field].to_numpy(copy=True)
 
-                # Build Condition Array to Filter Out Irrelevant Rows
-                cond_array = dict() #initialise condition array
+                # Permutations sampled from the global copula (fewer than min_rows rows)
+                sparse_set_index_list = self._get_sparse_set_index(set_no)
 
-                for merged_set_index in full_list_set_index: # e.g. "1-1-1", "1-2-1"
-                    
-                    cond_array[merged_set_index] = None # initialise condition array dict for each permutation
-                    grp_set_index = str(merged_set_index).split("-")
-
-                    for set_index, parentVar in zip(grp_set_index, parentVar_list):
-
-                        parentVarBody = conditionalBody["parent_conditions"][parentVar] # get corresponding parent body
-                        set_values = parentVarBody["condition_value"][int(set_index)] # get corresponding value from parent body, e.g. "1", "YES"
-                        parentVarTransform_meta = cond_transformer.transformer_meta_dict[parentVar] # get meta information of how parentVar is transformed
-                        parentVarTransform_meta_outputfields = parentVarTransform_meta['output_fields'].keys() # get list of parentVar output fields after transformation (including null)
-                        sub_cond_array = None
-
-                        # Build Sampling Conditions
-                        if (parentVarBody['condition']=="set"):
-
-                            if parentVarTransform_meta['transformer_type']=='One-Hot':
-                                parentVarTransform_meta_params_dict = parentVarTransform_meta['params_dict']
-                                for set_value in set_values:
-                                    hotCol = parentVarTransform_meta_params_dict[set_value]
-                                    if sub_cond_array is None:
-                                        sub_cond_array = (samples[hotCol] == samples[parentVarTransform_meta_outputfields].max(axis=1))
-                                    else:
-                                        sub_cond_array = sub_cond_array | (samples[hotCol] == samples[parentVarTransform_meta_outputfields].max(axis=1))
-
-                            elif parentVarTransform_meta['transformer_type'] == 'LabelEncoding':
-                                parentVarTransform_meta_params_dict = parentVarTransform_meta['params_dict']
-                                parentVar_value = list(parentVarTransform_meta_outputfields)[0] #<parentVar>.value
-                                for set_value in set_values:
-                                    label_en = parentVarTransform_meta_params_dict[set_value]
-                                    if sub_cond_array is None:
-                                        sub_cond_array = (samples[parentVar_value].round(0) == label_en)
-                                    else:
-                                        sub_cond_array = sub_cond_array | (samples[parentVar_value].round(0) == label_en)
-
-                            elif parentVarTransform_meta['transformer_type'] == 'Cat1':
-                                parentVarTransform_meta_interval_dict = parentVarTransform_meta['intervals']
-                                parentVar_value = list(parentVarTransform_meta_outputfields)[0] #<parentVar>.value
-                                temp_rev_col = samples[parentVar_value].apply(lambda x: next(key for key, (lower, upper) in parentVarTransform_meta_interval_dict.items() if lower <= x <= upper))
-                                for set_value in set_values:
-                                    if sub_cond_array is None:
-                                        sub_cond_array = (temp_rev_col == set_value)
-                                    else:
-                                        sub_cond_array = sub_cond_array | (temp_rev_col == set_value)
-
-                        elif (parentVarBody['condition']=="range"):
-                            parentVar_value = list(parentVarTransform_meta_outputfields)[0] #<parentVar>.value
-                            for set_value in set_values:
-                                if sub_cond_array is None:
-                                    sub_cond_array = eval(f"(samples[parentVar_value]{set_value})")
-                                else:
-                                    sub_cond_array = sub_cond_array & eval(f"(samples[parentVar_value]{set_value})")
+                # Find Samples of each Permutation (parent fields decoded once, ref. ConditionEngine)
+                condition_engine = self._get_condition_engine(set_no)
+                groups = condition_engine.evaluate(samples, transformer_meta_dict=cond_transformer.transformer_meta_dict)
 
-                        
-                        if cond_array[merged_set_index] is None:
-                            cond_array[merged_set_index] = sub_cond_array
-                        else:
-                            cond_array[merged_set_index] = cond_array[merged_set_index] & sub_cond_array
+                for merged_set_index in full_list_set_index: # e.g. "1-1-1", "1-2-1"
 
                     # Filter Full Samples for Required Parent Conditions
-                    if (cond_array[merged_set_index] is None):
-                        sampling_condition_array = None
-                    else:
-                        sampling_condition_array = samples.loc[cond_array[merged_set_index]]
+                    sampling_condition_array = samples.iloc[groups[merged_set_index]]
 
                     if (self.debug):
                         print(f"Filtered Samples Based on Condition: {set_no}:{merged_set_index} \n: {sampling_condition_array}")
 
-                    if (sampling_condition_array is not None):
+                    if (len(sampling_condition_array) > 0):
                         # Drop Children from Full-Samples
                         sampling_condition_array = sampling_condition_array.drop(
                             columns = childVarTransform_meta_outputfields,
@@ -719,7 +1116,7 @@ class TabulaCopula:
                         )
 
                         # Get Conditional Copula
-                        gaussian_copula_conditional = self.storage['cond_copula'][set_no][merged_set_index]
+                        gaussian_copula_conditional = self._get_cond_copula(set_no, merged_set_index)
 
                         # Build Covariates
                         # Filtering non-parent variables to use as covariates to generate children variables
@@ -749,6 +1146,13 @@ class TabulaCopula:
                                 if c_var in conditions_Array:
                                     conditions_Array.remove(c_var)
 
+                        # Permutations with fewer than min_rows rows use the global copula: condition on the parent fields too, so that the children are drawn from its conditional distribution given the parents
+                        if merged_set_index in sparse_set_index_list:
+                            for p_var in parentVar_list:
+                                for p_field in cond_transformer.transformer_meta_dict[p_var]['output_fields'].keys():
+                                    if p_field not in conditions_Array and p_field in gaussian_copula_conditional.var_names:
+                                        conditions_Array.append(p_field)
+
                         if (self.debug):
                             print(f"Covariates Used for Sampling: {conditions_Array}")
 
@@ -766,7 +1170,7 @@ class TabulaCopula:
 
                             if (self.debug):
                                 print(conditions)
-                            cond_samples = gaussian_copula_conditional.sample(size=1, conditions=conditions)
+                            cond_samples = gaussian_copula_conditional.sample(size=1, conditions=conditions, var_list=childVarTransform_meta_outputfields, method=sampling_method)
 
                             if (self.debug):
                                 print(ii)
@@ -779,49 +1183,233 @@ class TabulaCopula:
                             ii += 1
 
         # Save generated samples
-        self.syn_samples_conditional_df = deepcopy(samples)
+        self.syn_samples_conditional_df = samples
 
         # Output to file
-        self._save_data_to_file(self.syn_samples_conditional_df, self.output_filenames['conditional_synthetic_samples'])
+        self._save_output(self.syn_samples_conditional_df, self.output_filenames['conditional_synthetic_samples'])
 
-    def syn_generate(self, sample_size=2000, cond_bool=False, conditions=None):
+    def syn_generate(self, sample_size=2000, cond_bool=False, conditions=None, sampling_method='random', n_jobs=None, correlation_method='kendall', cache=False, seed=None):
+        """
+        Wrapper for synthetic data generation: transform, fit, sample and reverse transform.
+        Inputs:
+            sample_size (int): no. of synthetic samples. Default is 2000.
+            cond_bool (bool): Whether to use the conditional-copulae (conditionalSettings_dict). Default is False.
+            conditions (dict): conditions for sampling the copula. Default is None.
+            sampling_method (str): 'random' (default) or 'sobol' (ref. GaussianCopula.sample).
+            n_jobs (int): no. of processes for fitting the conditional-copulae (ref. fit_gaussian_copula_conditional). Default is None (serial).
+            correlation_method (str): correlation method of the copulas. Default is 'kendall'.
+            cache (bool, str): Whether to cache the stages (transform, fit, sample), in output_filenames['cache'] (True) or in the given directory.
+                Each stage is keyed by a hash of its inputs (checksums of the data and dictionary files, settings, seed, and the key of the previous stage), and is skipped (loaded from the cache) if unchanged. Stages drawing random numbers are only cached if seed is given: the fit and sample stages, and the transform stage with sampling or 'Cat1Fuzzy' fields (noise). Default is False.
+            seed (int): random seed of each stage. Default is None.
+        The rss and peak rss of each stage are saved in stage_memory (printed if debug). If memory_lean, the frames no longer needed after each stage are spilled to disk (ref. LEAN_RELEASE).
+        """
 
-        # Transformation
-        try:
-            self.transform(metaData=self.metaData_transformer, var_list=self.var_list_filter)
-            if cond_bool:
-                self.transform_conditional(metaData=self.metaData_transformer)
+        cache_dir = None
+        if cache:
+            cache_dir = cache if isinstance(cache, str) else self.output_filenames['cache']
+            os.makedirs(cache_dir, exist_ok=True)
+        stage_keys = None # (only computed if cached: the checksums read the data and dictionary files)
+        if cache_dir is not None:
+            stage_keys = self._stage_keys(sample_size, cond_bool, conditions, sampling_method, n_jobs, correlation_method, seed)
 
-        except ValueError as e:
-            raise ValueError('Error performing transformation: ' + str(e)) from None
+        self.stage_memory = {}
+
+        # Transformation
+        cache_transform = cache_dir is not None and (seed is not None or self._transform_is_deterministic())
+        with self._track_stage('transform'):
+            if not (cache_transform and self._load_stage('transform', stage_keys['transform'], cache_dir)):
+                try:
+                    with self._stage_seed(seed, 0):
+                        self.transform(metaData=self.metaData_transformer, var_list=self.var_list_filter)
+                        if cond_bool:
+                            self.transform_conditional(metaData=self.metaData_transformer)
+
+                except ValueError as e:
+                    raise ValueError('Error performing transformation: ' + str(e)) from None
+
+                if cache_transform:
+                    self._save_stage('transform', stage_keys['transform'], cache_dir)
         
         # Check there are variables left after filtering for chosen variables
         if len(self.storage['transformer'].var_list) == 0:
             raise ValueError('No variables left to transform after filtering.')
         
-        # Fit Copula
-        try:
-            self.fit_gaussian_copula()
-            if cond_bool:
-                self.fit_gaussian_copula_conditional()
-        except ValueError as e:
-            raise ValueError('Error fitting copula: ' + str(e)) from None
+        # Fit Copula (block screening subsamples the data, and the parallel fit seeds each permutation)
+        cache_fit = cache_dir is not None and seed is not None
+        with self._track_stage('fit'):
+            if not (cache_fit and self._load_stage('fit', stage_keys['fit'], cache_dir)):
+                try:
+                    with self._stage_seed(seed, 1):
+                        self.fit_gaussian_copula(correlation_method=correlation_method)
+                        if cond_bool:
+                            self.fit_gaussian_copula_conditional(correlation_method=correlation_method, n_jobs=n_jobs)
+                except ValueError as e:
+                    raise ValueError('Error fitting copula: ' + str(e)) from None
+
+                if cache_fit:
+                    self._save_stage('fit', stage_keys['fit'], cache_dir)
+            else:
+                self.cond_transformed_dfs = {} # (only needed for fitting)
         
         # Sample Copula
-        try:
-            self.sample_gaussian_copula(sample_size=sample_size, conditions=conditions)
-            if cond_bool:
-                self.sample_gaussian_copula_conditional()
-        except ValueError as e:
-            raise ValueError('Error sampling from fitted copula: ' + str(e)) from None
+        cache_sample = cache_dir is not None and seed is not None
+        with self._track_stage('sample'):
+            if not (cache_sample and self._load_stage('sample', stage_keys['sample'], cache_dir)):
+                try:
+                    with self._stage_seed(seed, 2):
+                        self.sample_gaussian_copula(sample_size=sample_size, conditions=conditions, sampling_method=sampling_method)
+                        if cond_bool:
+                            self.sample_gaussian_copula_conditional(sampling_method=sampling_method)
+                except ValueError as e:
+                    raise ValueError('Error sampling from fitted copula: ' + str(e)) from None
+
+                if cache_sample:
+                    self._save_stage('sample', stage_keys['sample'], cache_dir)
         
         # Reverse Transformation
-        try:
-            self.reverse_transform()
-        except ValueError as e:
-            raise ValueError('Error reversing transform: ' + str(e)) from None
+        with self._track_stage('reverse'):
+            try:
+                self.reverse_transform()
+            except ValueError as e:
+                raise ValueError('Error reversing transform: ' + str(e)) from None
+
+        # Wait for the background writes (if async_write)
+        self.flush()
         
         return True
+
+    def _stage_keys(self, sample_size, cond_bool, conditions, sampling_method, n_jobs, correlation_method, seed):
+        """Keys of the cached stages of syn_generate (hash of the inputs of each stage, chained with the key of the previous stage)."""
+
+        data_checksum = ut_.file_checksum(self.train_data_filename)
+        dict_checksum = ut_.file_checksum(self.train_data_dict_filename)
+
+        stage_keys = {}
+        stage_keys['transform'] = ut_.hash_inputs(
+            'transform', data_checksum, getattr(self, 'train_data_sheetname', None), dict_checksum,
+            self.metaData_transformer, self.var_list_filter, self.removeNull, self.sampling,
+            cond_bool, self.conditionalSettings_dict if cond_bool else None, getattr(self, 'min_rows', None) if cond_bool else None,
+            getattr(self, 'chunksize', None), getattr(self, 'compact_dtypes', False),
+            seed
+        )
+        stage_keys['fit'] = ut_.hash_inputs(
+            'fit', stage_keys['transform'], correlation_method, self.copula_options, n_jobs if cond_bool else None, seed
+        )
+        stage_keys['sample'] = ut_.hash_inputs(
+            'sample', stage_keys['fit'], sample_size, conditions, sampling_method, seed
+        )
+
+        return stage_keys
+
+    def _transform_is_deterministic(self):
+        """Whether the transform stage of syn_generate draws no random numbers: all the transformed data is used (no sampling), and no field is transformed with 'Cat1Fuzzy' (noise)."""
+
+        if self.sampling != 1:
+            return False
+
+        for var_meta in (self.metaData_transformer or {}).values():
+            if isinstance(var_meta, dict) and 'Cat1Fuzzy' in (var_meta.get('transformer_type'), var_meta.get('onehot_fallback')):
+                return False
+
+        return True
+
+    def _stage_seed(self, seed, offset):
+        """Random seed of a stage of syn_generate (each stage is seeded, so that results do not depend on which stages were loaded from the cache)."""
+
+        if seed is None:
+            return contextlib.nullcontext()
+
+        return ut_.random_seed(seed + offset)
+
+    def _load_stage(self, stage, key, cache_dir):
+        """Load the outputs of a stage of syn_generate from the cache (ref. STAGE_CACHE). Returns True if found."""
+
+        filename = os.path.join(cache_dir, f"{stage}-{key}.pkl")
+        if not os.path.exists(filename):
+            return False
+
+        with open(filename, 'rb') as fl:
+            stage_dict = pickle.load(fl)
+
+        attributes, storage_keys = STAGE_CACHE[stage]
+        for attribute in attributes:
+            setattr(self, attribute, stage_dict.get(attribute)) # (attributes added after the stage was cached are None)
+            getattr(self, 'spilled_frames', {}).pop(attribute, None)
+        for storage_key in storage_keys:
+            self.storage[storage_key] = stage_dict['storage'][storage_key]
+
+        print(f"Stage {stage} loaded from cache: {filename}")
+
+        return True
+
+    def _save_stage(self, stage, key, cache_dir):
+        """Save the outputs of a stage of syn_generate to the cache (ref. STAGE_CACHE)."""
+
+        attributes, storage_keys = STAGE_CACHE[stage]
+        stage_dict = {attribute: self._get_frame(attribute) for attribute in attributes}
+        stage_dict['storage'] = {storage_key: self.storage.get(storage_key) for storage_key in storage_keys}
+
+        return self._save_to_pickle(stage_dict, os.path.join(cache_dir, f"{stage}-{key}.pkl"))
+
+    @contextlib.contextmanager
+    def _track_stage(self, stage):
+        """Record the rss and peak rss (MB) and time (s) of a stage of syn_generate in stage_memory, then spill the frames released by the stage (if memory_lean)."""
+
+        ut_.memory_usage(reset_peak=True)
+        start_time = time.perf_counter()
+
+        yield
+
+        if getattr(self, 'memory_lean', False):
+            for name in LEAN_RELEASE[stage]:
+                self._spill_frame(name)
+
+        rss, peak_rss = ut_.memory_usage()
+        self.stage_memory[stage] = {
+            'rss_mb': rss / 2**20 if rss is not None else None,
+            'peak_rss_mb': peak_rss / 2**20 if peak_rss is not None else None,
+            'time': time.perf_counter() - start_time,
+        }
+
+        if (self.debug):
+            print(f"Stage {stage}: {self.stage_memory[stage]}")
+
+    def _spill_frame(self, name):
+        """Pickle the frame of attribute name to output_filenames['spill'], and release it from memory (ref. _get_frame)."""
+
+        df = getattr(self, name, None)
+        if df is None:
+            return False
+
+        spill_dir = self.output_filenames.get('spill', os.path.join(self.syn_data_path, 'SPILL'))
+        os.makedirs(spill_dir, exist_ok=True)
+        filename = os.path.join(spill_dir, f"{name}.pkl")
+        df.to_pickle(filename)
+
+        self.spilled_frames[name] = filename
+        setattr(self, name, None)
+
+        # outputs kept in memory (ref. intermediate_outputs) holding the same frame are released too, and reloaded from the spill on demand
+        pending_outputs = getattr(self, 'pending_outputs', None) or {}
+        for output_filename, output_df in pending_outputs.items():
+            if output_df is df:
+                pending_outputs[output_filename] = name
+
+        if (self.debug):
+            print(f"Spilled {name} to {filename}")
+
+        return True
+
+    def _get_frame(self, name):
+        """Get the frame of attribute name, reloaded from disk if it has been spilled (ref. memory_lean)."""
+
+        df = getattr(self, name, None)
+        spilled_frames = getattr(self, 'spilled_frames', None) or {} # (instances pickled before memory_lean was added)
+        if df is None and name in spilled_frames:
+            df = pd.read_pickle(spilled_frames.pop(name))
+            setattr(self, name, df)
+
+        return df
     
     def build_privacyMetric(self):
 
@@ -1007,11 +1595,13 @@ class TabulaCopula:
         self.storage = {}
         self.storage['transformer'] = None
         self.storage['copula'] = None
+        self.storage['sampling_plan'] = None
 
     def build_conditional_storage(self):
         # Conditional Storage
         self.storage['cond_transformer'] = {}
         self.storage['cond_copula'] = {}
+        self.prefetch_executor = None # background fits of a lazy fit_gaussian_copula_conditional
 
     def build_filenames(self):
 
@@ -1083,6 +1673,34 @@ class TabulaCopula:
         training_filename = self.syn_data_path + training_filename
         self.output_filenames["training_samples"] = training_filename
 
+        # For numpy-only sampler artifact (directory, ref. SamplerRuntime)
+        sampler_suffix = "SAMPLER"
+        sampler_dirname = ut_.update_filename_with_suffix(self.output_filename_withprefix, sampler_suffix)
+        sampler_dirname = os.path.splitext(sampler_dirname)[0]
+        sampler_dirname = self.syn_data_path + sampler_dirname
+        self.output_filenames["sampler"] = sampler_dirname
+
+        # For cached stages of syn_generate (directory)
+        cache_suffix = "CACHE"
+        cache_dirname = ut_.update_filename_with_suffix(self.output_filename_withprefix, cache_suffix)
+        cache_dirname = os.path.splitext(cache_dirname)[0]
+        cache_dirname = self.syn_data_path + cache_dirname
+        self.output_filenames["cache"] = cache_dirname
+
+        # For fitted model (directory, ref. save_model)
+        model_suffix = "MODEL"
+        model_dirname = ut_.update_filename_with_suffix(self.output_filename_withprefix, model_suffix)
+        model_dirname = os.path.splitext(model_dirname)[0]
+        model_dirname = self.syn_data_path + model_dirname
+        self.output_filenames["model"] = model_dirname
+
+        # For frames spilled to disk in memory_lean mode (directory)
+        spill_suffix = "SPILL"
+        spill_dirname = ut_.update_filename_with_suffix(self.output_filename_withprefix, spill_suffix)
+        spill_dirname = os.path.splitext(spill_dirname)[0]
+        spill_dirname = self.syn_data_path + spill_dirname
+        self.output_filenames["spill"] = spill_dirname
+
         # For Singling Out Privacy Leakage Test (Univariate)
         singlingOut_suffix = "SINGLINGOUT_UNI"
         singlingOut_filename = ut_.update_filename_with_suffix(self.output_filename_withprefix, singlingOut_suffix)
@@ -1115,6 +1733,7 @@ class TabulaCopula:
     def build_conditional_filenames(self):
         # Conditional Stuff
         self.set_index_permutations_dict = {}
+        self.condition_engines = {} # compiled parent conditions (ref. ConditionEngine), for each set_no
         self.output_filenames["conditional_transformed"] = {}
 
         if self.conditionalSettings_dict is not None:
@@ -1183,6 +1802,59 @@ class TabulaCopula:
             self.conditional_set_bool = True
 
 
+    def _save_output(self, df, filename, final=False):
+        """Save an output of the pipeline to file, or keep it in memory (ref. intermediate_outputs).
+        Inputs:
+            df (pandas.dataframe): output to save.
+            filename (string): filename of the output (ref. output_filenames).
+            final (boolean): whether the output is a final output (reversed synthetic samples). Default is False.
+        Returns:
+            True if saved to file, False if kept in memory.
+        """
+
+        intermediate_outputs = getattr(self, 'intermediate_outputs', 'all') # (instances pickled before intermediate_outputs was added)
+        if (intermediate_outputs == 'all') or (final and intermediate_outputs == 'final'):
+            return self._save_data_to_file(df, filename)
+
+        if getattr(self, 'pending_outputs', None) is None:
+            self.pending_outputs = {}
+        self.pending_outputs[filename] = df
+
+        return False
+
+    def _get_pending_output(self, filename):
+        """Output kept in memory for filename (ref. intermediate_outputs), reloaded if its frame has been spilled (the attribute name of the frame is kept instead, ref. _spill_frame)."""
+
+        output_df = self.pending_outputs[filename]
+        if isinstance(output_df, str):
+            return self._get_frame(output_df)
+
+        return output_df
+
+    def materialize_outputs(self, filenames=None):
+        """Write the outputs kept in memory (ref. intermediate_outputs) to file, e.g. for debugging.
+        Inputs:
+            filenames (list): filenames to write (ref. output_filenames). Default is None (all pending outputs).
+        Returns:
+            written (list): filenames written
+        """
+
+        pending_outputs = getattr(self, 'pending_outputs', None) or {}
+        if filenames is None:
+            filenames = list(pending_outputs.keys())
+
+        written = []
+        for filename in filenames:
+            if filename in pending_outputs:
+                self._save_data_to_file(self._get_pending_output(filename), filename)
+                pending_outputs.pop(filename)
+                written.append(filename)
+
+        if (self.debug):
+            print(f"{len(written)} outputs written to file.")
+
+        return written
+
     def _save_data_to_file(self, df, filename, indexTrue=False, sheetname="Sheet1"):
         """
         Saves a dataframe to file based on the file extension of the given filename.
@@ -1202,25 +1874,52 @@ class TabulaCopula:
         file_ext = ut_.get_extension(filename)
 
         if (file_ext=='csv'):
-            ut_.save_df_as_csv(df, filename, index=indexTrue)
+            self._write(ut_.save_df_as_csv, df, filename, index=indexTrue)
 
         elif (file_ext=='xlsx'):
-            ut_.save_df_as_excel(df, 
-                excel_file_name = filename, 
+            self._write(ut_.save_df_as_excel, df, filename,
                 sheet_name = sheetname,
                 index = indexTrue # not saving the index (if False)
             )
 
+        elif (file_ext=='parquet'):
+            self._write(ut_.save_df_as_parquet, df, filename, index=indexTrue)
+
+        elif (file_ext=='feather'):
+            self._write(ut_.save_df_as_feather, df, filename, index=indexTrue)
+
         else:
             raise ValueError(f"Not able to save data to file for extension type: {file_ext}")
         
         return True
+
+    def _write(self, write_fn, df, filename, **kwargs):
+        """Call write_fn(df, filename, **kwargs), or queue it in the background writer (ref. async_write)."""
+
+        writer = getattr(self, 'writer', None) # (instances pickled before async_write was added)
+        if writer is not None:
+            writer.submit(write_fn, df, filename, **kwargs)
+        else:
+            write_fn(df, filename, **kwargs)
+
+    def flush(self):
+        """Wait for the queued writes of the background writer (ref. async_write) to complete. Raises RuntimeError if any write failed."""
+
+        writer = getattr(self, 'writer', None)
+        if writer is not None:
+            return writer.flush()
+
+        return True
         
-    def save(self):
-        """Saves the current class instance to a pickle file. Saves the output filenames dictionary to a csv file."""
+    def save(self, mode='instance'):
+        """Saves the current class instance to a pickle file (or only the model if mode is 'model', ref. save_model). Saves the output filenames dictionary to a csv file, and waits for the background writes (ref. async_write)."""
 
-        b = self.save_instance()
+        if mode == 'model':
+            b = self.save_model()
+        else:
+            b = self.save_instance()
         c = self.save_outputFilenames()
+        self.flush()
 
         if b and c:
             return True
@@ -1237,6 +1936,10 @@ class TabulaCopula:
 
         print(f"Saving class instance to filename: {self.output_filenames['tc-class-instance']}")
 
+        # Fit pending conditional copulas of a lazy fit (thunks and threads cannot be pickled), and wait for the background writes
+        self.resolve_conditional_copulas()
+        self.flush()
+
         b = self._save_to_pickle(self, self.output_filenames['tc-class-instance'])
         if b:
             print(f"Saving class instance complete.")
@@ -1245,6 +1948,82 @@ class TabulaCopula:
 
         return b
     
+    def save_model(self, path=None, min_size=1024):
+        """Saves the fitted model only (transformers, copulas and conditional copulas, settings), without the data and privacy evaluators (ref. MODEL_EXCLUDE), to be loaded by load_model() or load_TC(mode='model').
+        The numeric arrays of at least min_size elements are saved as .npy files, memory-mapped on loading.
+        Inputs:
+            path (str): directory of the model. Default is None (output_filenames['model']).
+            min_size (int): min. no. of elements of the arrays saved as .npy files. Default is 1024.
+        Returns:
+            True if the model is successfully saved, False otherwise.
+        """
+
+        if path is None:
+            path = self.output_filenames.get('model', os.path.join(self.syn_data_path, 'MODEL')) # (instances pickled before save_model was added)
+        os.makedirs(path, exist_ok=True)
+
+        print(f"Saving model to: {path}")
+
+        # Fit pending conditional copulas of a lazy fit, and wait for the background writes
+        self.resolve_conditional_copulas()
+        self.flush()
+
+        try:
+            n_arrays = ut_.save_pickle_npy(self._model_copy(), os.path.join(path, "model.pkl"), min_size=min_size)
+        except Exception as e:
+            print("Error saving model: {}".format(e))
+            return False
+
+        print(f"Saving model complete ({n_arrays} arrays).")
+
+        return True
+
+    def _model_copy(self):
+        """Shallow copy of the instance for save_model: the data attributes are dropped, and the transformers and marginals are replaced by copies without data (the instance is left unchanged)."""
+
+        model = copy.copy(self)
+        for attribute in MODEL_EXCLUDE:
+            if hasattr(model, attribute):
+                setattr(model, attribute, None)
+        model.pending_outputs = {}
+        model.spilled_frames = {}
+        model.cond_transformed_dfs = {}
+
+        copies = {} # copy of each transformer and copula (shared by the storage keys, e.g. transformer and cond_transformer)
+
+        def slim(obj):
+            if id(obj) in copies:
+                return copies[id(obj)]
+
+            if isinstance(obj, Transformer):
+                obj_copy = copy.copy(obj)
+                obj_copy.data_curated_df = None
+            elif isinstance(obj, GaussianCopula):
+                obj_copy = copy.copy(obj)
+                obj_copy.univariates = {}
+                for var_name, uni in (obj.univariates or {}).items():
+                    uni_copy = copy.copy(uni)
+                    for attribute in MODEL_EXCLUDE_MARGINAL:
+                        setattr(uni_copy, attribute, None)
+                    obj_copy.univariates[var_name] = uni_copy
+            else:
+                obj_copy = obj
+
+            copies[id(obj)] = obj_copy
+            return obj_copy
+
+        model.storage = dict(self.storage)
+        model.storage['transformer'] = slim(self.storage['transformer'])
+        model.storage['copula'] = slim(self.storage['copula'])
+        model.storage['cond_transformer'] = {set_no: slim(transformer) for set_no, transformer in self.storage.get('cond_transformer', {}).items()}
+        model.storage['cond_copula'] = {
+            set_no: {merged_set_index: slim(cp) for merged_set_index, cp in cond_copula_dict.items()}
+            for set_no, cond_copula_dict in self.storage.get('cond_copula', {}).items()
+        }
+        model.storage['sampling_plan'] = None # (recompiled on first use)
+
+        return model
+
     def save_outputFilenames(self):
         """Saves the output filenames dictionary to a csv file
         """
@@ -1253,10 +2032,12 @@ class TabulaCopula:
         
         # Convert output filenames dictionary to dataframe
         df = pd.DataFrame.from_dict(self.output_filenames, orient='index', columns=['Object'])
+        df['Object'] = df['Object'].apply(str) # (nested dictionaries of filenames, for columnar file types)
         df['Type'] = df.index
 
-        # Save dataframe to csv file
+        # Save dataframe to csv file (and wait for the write, if queued in the background writer)
         b = self._save_data_to_file(df, self.output_filenames['tc-class-outputfilenames'], indexTrue=False)
+        b = b and self.flush()
         if b:
             print("Saving output filenames complete.")
         else:
@@ -1287,6 +2068,38 @@ class TabulaCopula:
 
         return False
 
+    def _get_condition_engine(self, set_no):
+        """Compile (once) the parent conditions of set_no (ref. ConditionEngine)."""
+
+        if getattr(self, 'condition_engines', None) is None: # (instances pickled before condition_engines was added)
+            self.condition_engines = {}
+        if set_no not in self.condition_engines:
+            self.condition_engines[set_no] = ConditionEngine(self.conditionalSettings_dict[set_no]['parent_conditions'], debug=self.debug)
+
+        return self.condition_engines[set_no]
+
+    def _evaluate_conditions(self, condition_engine, parentVar_list, trainData=None):
+        """Rows of the training data in each permutation of condition_engine: (dict of row positions, index of the training data). If the training data is not loaded (chunksize), the parent columns are streamed."""
+
+        if trainData is not None:
+            return condition_engine.evaluate(trainData), trainData.index
+
+        groups_list = []
+        index_list = []
+        offset = 0
+        for chunk in self.iter_inputData(self.chunksize, columns=parentVar_list):
+            groups = condition_engine.evaluate(chunk)
+            groups_list.append({set_index: positions + offset for set_index, positions in groups.items()})
+            index_list.append(chunk.index.to_numpy())
+            offset += len(chunk)
+
+        groups = {
+            set_index: np.concatenate([groups[set_index] for groups in groups_list] + [np.array([], dtype=np.int64)])
+            for set_index in condition_engine.set_index_list
+        }
+
+        return groups, pd.Index(np.concatenate(index_list + [np.array([], dtype=np.int64)]))
+
     def _conditional_makeSetIndex(self, parent_conditions):
         """Build reference index set for parent conditions (used for conditional copula).
         Inputs:
@@ -1346,7 +2159,7 @@ class TabulaCopula:
                 if (transformer_meta_dict[childVar]['null']['fix_null']):
 
                     childVar_t_name = childVar + ".value"
-                    childVar_t_null_name = childVar + ".is_null"
+                    childVar_t_null_name = transformer_meta_dict[childVar]['null'].get('null_field', childVar + ".is_null")
 
                     if (childVar_t_null_name in transformed_filtered.columns):
                         cond_i6 = transformed_filtered[childVar_t_null_name] == 1 # the null indicator
@@ -1,7 +1,10 @@
 from copy import deepcopy
+import hashlib
 import pandas as pd
 import os
 import numpy as np
+from scipy import sparse
+from concurrent.futures import ThreadPoolExecutor
 
 from bdarpack import utils_ as ut_
 
@@ -25,6 +28,10 @@ class Transformer:
                         - Cat1Fuzzy: This option is the same as Cat1, except for the additional Gaussian noise around the class representative of each interval. (ref. Synthetic Data Vault package)
 
                 'datetime_format': use this field to specify the datetime format, for 'datetime' inputs
+
+                'onehot_max_levels': use this field to specify the maximum no. of categories of a 'One-Hot' field (overrides onehot_max_levels). Fields with more categories are transformed with 'onehot_fallback' instead.
+
+                'onehot_fallback': use this field to specify the transformer_type of a 'One-Hot' field with more than 'onehot_max_levels' categories (overrides onehot_fallback).
             }
         default_transformer_type_4_string (str): specify the default transformer_type for dtype='string'. Default is 'One-Hot'. Options include 'One-Hot', 'LabelEncoding', 'Cat1'.
 
@@ -34,6 +41,22 @@ class Transformer:
 
         removeNull (bool): Whether to remove all rows with null inputs before transformation. Default is False
 
+        onehot_max_levels (int): maximum no. of categories of the 'One-Hot' fields. Fields with more categories (e.g. postcodes) are transformed with onehot_fallback instead (ref. report_width). Default is None (no maximum).
+
+        onehot_fallback (str): transformer_type of the 'One-Hot' fields with more than onehot_max_levels categories. Options include 'Cat1', 'Cat1Fuzzy', 'LabelEncoding'. Default is 'Cat1'.
+
+        onehot_dtype (str): storage of the 'One-Hot' fields in the transformed data: None (same as output_dtype), 'uint8', or 'sparse' (pd.SparseDtype('uint8', 0)). Default is None.
+
+        null_min_rate (float): minimum missing rate of a (non-string) field for its null indicator field ('<field>.is_null'). The nulls of fields below it are restored at random, at their missing rate, when reversing. Default is 0 (null indicator for all fields with missing values).
+
+        null_merge (bool): Whether fields with identical missingness patterns (e.g. variables missing together for a visit) share a single null indicator field (the field of the first variable). Default is False.
+
+        null_sentinel (bool): Whether to encode the missing values of (non-string) fields into a sentinel of the value field instead of a null indicator field: nulls are filled with min - (max - min), and reversed values below min - (max - min)/2 are restored as null. Default is False.
+
+        output_dtype (str): dtype of the transformed fields, 'float64' or 'float32' (halves the memory of the transformed data, with less precision). Default is 'float64'.
+
+        n_jobs (int): no. of threads used to transform and reverse the fields in parallel (-1: all cores). Fields are encoded and decoded independently, and assembled in order. Random draws (Cat1Fuzzy noise, nulls restored at random) then depend on the order of the threads. Default is None (serial).
+
         debug (bool): Flag to print debugging lines. Default is `False`.
 
         Change Log:
@@ -49,6 +72,14 @@ class Transformer:
         default_datetime_format=f"%Y-%m-%d %H:%M:%S",
         var_list=None,
         removeNull=False,
+        output_dtype='float64',
+        onehot_max_levels=None,
+        onehot_fallback='Cat1',
+        onehot_dtype=None,
+        null_min_rate=0,
+        null_merge=False,
+        null_sentinel=False,
+        n_jobs=None,
         debug=False
     ):
         self.metaData = metaData
@@ -56,9 +87,18 @@ class Transformer:
         self.debug = debug
         self.var_list = var_list #to limit the number of transformed variables to a subset of the given inputs
         self.removeNull = removeNull
+        self.output_dtype = output_dtype
+        self.onehot_max_levels = onehot_max_levels
+        self.onehot_fallback = onehot_fallback
+        self.onehot_dtype = onehot_dtype
+        self.null_min_rate = null_min_rate
+        self.null_merge = null_merge
+        self.null_sentinel = null_sentinel
+        self.n_jobs = n_jobs
 
         self.transformer_meta_dict = None
         self.data_curated_df = None # the dataframe that has undergone curation based on var_list and removeNull options, prior to transformation
+        self.fit_stats = None # statistics accumulated by partial_fit (counts of categories, sums and counts of values, GCD of datetimes), for each field
 
         self.default_transformer_type_4_string = default_transformer_type_4_string
         self.default_datetime_format = default_datetime_format
@@ -89,31 +129,41 @@ class Transformer:
 
         return output_df
     
-    def _get_null_value_from_metaData(self, column, default_value, data_df):
-        """Compute the set_null_value from options specified in metaData for the field: column
+    def _get_null_option_from_metaData(self, column):
+        """Null option of the field column in metaData ('mean', 'mode', 'median', 'ignore' or a value), None if not specified."""
+
+        if self.metaData is not None:
+            if column in self.metaData:
+                if 'null' in self.metaData[column]:
+                    return self.metaData[column]['null']
+
+        return None
+
+    def _get_null_value_from_metaData(self, column, default_value, column_stats, scale=1):
+        """Compute the set_null_value from options specified in metaData for the field: column, using the statistics accumulated by partial_fit (divided by scale, e.g. the common divider of datetime fields)
 
         Change Log (MZ): 28-07-2023 added ignore option
         """
 
         set_null_value = default_value
-        if self.metaData is not None:
-            if column in self.metaData:
-                if 'null' in self.metaData[column]:
-                    null_value = self.metaData[column]['null']
-
-                    if (null_value=='mean'):
-                        set_null_value = data_df[column].mean()
-                    elif (null_value=='mode'):
-                        set_null_value = data_df[column].mode(dropna=True)[0]
-                    elif (null_value=='median'):
-                        set_null_value = data_df[column].median()
-                    elif (null_value=='ignore'):
-                        set_null_value = np.nan
-                    else:
-                        set_null_value = float(null_value)
-        
+        null_value = self._get_null_option_from_metaData(column)
+        if null_value is not None:
+
+            if (null_value=='mean'):
+                set_null_value = column_stats['sum'] / column_stats['n'] / scale if column_stats['n'] > 0 else np.nan
+            elif (null_value=='mode'):
+                value_counts = column_stats['value_counts']
+                max_count = max(value_counts.values())
+                set_null_value = min(value for value, count in value_counts.items() if count == max_count) / scale
+            elif (null_value=='median'):
+                set_null_value = column_stats['median'] / scale
+            elif (null_value=='ignore'):
+                set_null_value = np.nan
+            else:
+                set_null_value = float(null_value)
+
         return set_null_value
-    
+
     def _get_datetime_format_from_metaData(self, column):
 
         datetime_format = self.default_datetime_format
@@ -124,11 +174,23 @@ class Transformer:
                     datetime_format = self.metaData[column]['datetime_format']
 
         return datetime_format
-    
-    def _get_transformer_type_from_metaData(self, column, data_df):
+
+    def _get_onehot_policy_from_metaData(self, column):
+        """Maximum no. of categories of a 'One-Hot' field, and the transformer_type used above it."""
+
+        max_levels = getattr(self, 'onehot_max_levels', None)
+        fallback = getattr(self, 'onehot_fallback', 'Cat1')
+        if self.metaData is not None:
+            if column in self.metaData:
+                max_levels = self.metaData[column].get('onehot_max_levels', max_levels)
+                fallback = self.metaData[column].get('onehot_fallback', fallback)
+
+        return max_levels, fallback
+
+    def _get_transformer_type_from_metaData(self, column, col_dtype_str):
 
         # set defaults based on dtype
-        col_dtype_str = data_df[column].dtype
+        transformer_type = None
         if col_dtype_str=='string':
             transformer_type = self.default_transformer_type_4_string
 
@@ -138,69 +200,76 @@ class Transformer:
                     transformer_type = self.metaData[column]['transformer_type']
 
         return transformer_type
-    
-    def _categorical_transformer(self, df_col, type='Fixed'):
+
+    def _categorical_transformer(self, category_counts, type='Fixed'):
         """
+        Compute the representative, interval (and std, if fuzzy) of each category from the counts of the categories (in order of first appearance).
+
         Change log:
             - MZ 18-04-2023: add "fuzzy" option, ref. SDV
         """
 
-        # Create a dictionary to store the relative frequences of each category
-        rel_freq = {}
+        categories = list(category_counts.keys())
+        counts = np.array(list(category_counts.values()), dtype=np.int64)
 
         # Calculate the relative frequencies of each category
-        for cat in df_col.unique():
-            
-            cat_count = df_col[df_col==cat].count() # count the no. of times the cat appears
-            rel_freq[cat] = cat_count/df_col.count() # compute relative freq. of the category
+        rel_freq = counts / counts.sum()
+
+        # Sort the categories by their relative frequencies (descending, ties in order of first appearance)
+        order = np.argsort(-rel_freq, kind='stable')
+        sorted_freq = rel_freq[order]
 
-        # Sort the categories by their relative frequencies
-        sorted_categories = {}
-        for k,v in sorted(rel_freq.items(), key=lambda x:x[1], reverse=True): #sorting in descending order
-            sorted_categories[k] = v
+        # Divide the [0,1] interval by the relative frequencies, and assign the middle point of each interval to the corresponding category
+        upper_bounds = np.cumsum(sorted_freq)
+        lower_bounds = np.concatenate([[0], upper_bounds[:-1]])
+        mid_points = (lower_bounds + upper_bounds) / 2
 
-        # Divide the [0,1] interval by the relative frequencies
         cat_intervals = {}
-        intervals = []
+        rep = {}
         cat_std = {} #Add fuzzy implementation as in SDV
+        for i, k in enumerate(order):
+            cat = categories[k]
+            cat_intervals[cat] = [float(lower_bounds[i]), float(upper_bounds[i])]
+            rep[cat] = float(mid_points[i])
+            if type=='Gaussian': #Add fuzzy implementation as in SDV
+                cat_std[cat] = float(sorted_freq[i]/6)
 
-        lower_bound = 0
-        for cat in sorted_categories:
-            upper_bound = lower_bound + rel_freq[cat]
-            intervals.append([lower_bound, upper_bound])
-            cat_intervals[cat] = [lower_bound, upper_bound]
-            lower_bound = upper_bound
+        return rep, cat_intervals, cat_std
 
-            if type=='Gaussian': #Add fuzzy implementation as in SDV
-                cat_std[cat] = rel_freq[cat]/6
-            
+    def _category_codes(self, df_col, categories):
+        """Position of the category of each instance of df_col in categories (-1 for categories not seen by fit)."""
+
+        return pd.Index(categories, dtype=object).get_indexer(df_col)
+
+    def _categorical_transform(self, df_col, rep, stds=None, type='Fixed'):
+        """Replace the instances of the categories with the corresponding representative (with Gaussian noise, if type is 'Gaussian'). Categories not seen by fit are set to NaN."""
+
+        codes = self._category_codes(df_col, list(rep.keys()))
+
+        # gather the representative (and std) of each instance by its category code (code -1 gathers the trailing NaN)
+        transformed_column = np.append(np.array(list(rep.values()), dtype=float), np.nan)[codes]
+        if type=='Gaussian':
+            transformed_column = np.random.normal(transformed_column, np.append(np.array([stds[cat] for cat in rep], dtype=float), 0)[codes])
+
+        return pd.Series(transformed_column, index=df_col.index)
+
+    def _reverse_categorical_transformer(self, df_col, intervals, upper_bounds=None):
+        """
+        Assign each value the category of the interval it falls in (values are clipped to [0, 1]).
+        The upper bounds of the intervals are sorted (cumulative relative frequencies), so the interval of each value is found by np.searchsorted, and the category gathered by its position. Values above the last upper bound (relative frequencies may not sum up to exactly 1) are assigned the last category.
+        """
+
+        if upper_bounds is None: # (transformers pickled before upper_bounds was added)
+            upper_bounds = np.array([upper for (lower, upper) in intervals.values()], dtype=float)
+        categories = np.array(list(intervals.keys()), dtype=object)
+
+        values = np.clip(df_col.to_numpy(dtype=float, na_value=np.nan), 0, 1)
+        codes = np.minimum(np.searchsorted(upper_bounds, values, side='left'), len(categories)-1)
+        rev_col = categories[codes]
+        rev_col[np.isnan(values)] = np.nan
+
+        return pd.Series(rev_col, index=df_col.index, name=df_col.name)
 
-        # Assign the middle point of each interval to the corresponding category
-        rep = {}
-        for i, cat in enumerate(sorted_categories):
-            rep[cat] = (intervals[i][0] + intervals[i][1]) / 2
-        
-        # Replace the instances of the categories with the corresponding representative
-        transformed_column = deepcopy(df_col)
-        for cat in df_col.unique():
-            if type=='Fixed':
-                transformed_column[df_col==cat] = str(rep[cat])
-            elif type=='Gaussian':
-                mean = rep[cat]
-                std = cat_std[cat]
-                transformed_column = transformed_column.apply(lambda x: np.random.normal(mean, std) if x == cat else x)
-
-        transformed_column = transformed_column.astype('float') #convert column from uint8 to float dtype
-
-        return transformed_column, rep, cat_intervals, cat_std
-    
-    def _reverse_categorical_transformer(self, df_col, intervals):
-        
-        df_col = df_col.clip(0, 1)
-        rev_df_col = df_col.apply(lambda x: next(key for key, (lower, upper) in intervals.items() if lower <= x <= upper))
-                                  
-        return rev_df_col
-    
     def _curate_var_list(self, data_df):
         all_vars = list(data_df.columns)
         if self.var_list is not None:
@@ -213,44 +282,188 @@ class Transformer:
         else:
             self.var_list = all_vars
 
-    
-    def transform(self, data_df):
+    def _curate_data(self, data_df):
+        """Limit data_df to the variables in var_list, and remove all rows with null (if removeNull)."""
 
-        # initialise empty dataframe
-        numeric_df = pd.DataFrame()
-        transformer_meta_dict = {}
+        # limit transformation to items in var_list (input variable), as a copy (the filled columns are written back into it by transform)
+        data_curated_df = data_df[self.var_list].copy()
+
+        # remove all rows with null
+        if self.removeNull:
+            data_curated_df = data_curated_df.dropna()
+
+        return data_curated_df
+
+    def fit(self, data_df):
+        """
+        Learn the encoding of each variable (dtype, transformer type, categories, intervals, common divider of datetimes, null fill values) from data_df, without transforming it.
+        Args:
+            data_df (pd.DataFrame): data to fit.
+        Returns:
+            self
+        """
+
+        self.transformer_meta_dict = None
+        self.fit_stats = None
+
+        return self.partial_fit(data_df)
+
+    def partial_fit(self, data_df):
+        """
+        Update the encoding with a chunk of data, e.g. the chunks of a csv file read with pd.read_csv(chunksize=..).
+        The counts of the categories, the sums and counts of the non-null values and the common divider of the datetimes are accumulated over the chunks, and transformer_meta_dict is rebuilt after each chunk.
+        Fitting all the chunks gives the same encoding as fitting the concatenated data, except for the 'median' null option, which needs all the values (ValueError if more than one chunk is fitted).
+        Args:
+            data_df (pd.DataFrame): chunk of data to fit.
+        Returns:
+            self
+        """
 
         # convert data_df to best possible dtypes
         data_df = self.convert_2_dtypes(data_df)
+        self._partial_fit_converted(data_df)
 
-        # limit transformation to items in var_list (input variable)
-        self._curate_var_list(data_df)
-        data_curated_df = data_df[self.var_list]
+        return self
 
-        # remove all rows with null
-        if self.removeNull:
-            data_curated_df = data_curated_df.dropna()            
+    def _partial_fit_converted(self, data_df):
+
+        if getattr(self, 'fit_stats', None) is None:
+            self._curate_var_list(data_df)
+            self.fit_stats = {'n_chunks': 0, 'columns': {}}
+
+        data_curated_df = self._curate_data(data_df)
+
+        for col in data_curated_df.columns:
+            self._update_column_stats(col, data_curated_df[col])
+
+        self.fit_stats['n_chunks'] += 1
+        self.transformer_meta_dict = self._build_transformer_meta_dict()
+
+    def _merge_dtype(self, col, fitted_dtype, chunk_dtype):
+        """dtype of a field fitted on chunks of dtype fitted_dtype and chunk_dtype (e.g. Int64 and Float64 give Float64)."""
+
+        if fitted_dtype == chunk_dtype:
+            return fitted_dtype
+
+        numerical_dtypes = ['Int32', 'Int64', 'Float64']
+        if fitted_dtype in numerical_dtypes and chunk_dtype in numerical_dtypes:
+            return max(fitted_dtype, chunk_dtype, key=numerical_dtypes.index)
+
+        raise ValueError(f"Variable {col} is of type {fitted_dtype} and {chunk_dtype} in different chunks. Set 'dtype' in metaData.")
+
+    def _field_dtype(self, df_col):
+        """dtype (str) of the field df_col. Compact dtypes (e.g. read with ut_.get_compact_dtypes, ut_.downcast_numeric) are transformed as their wider dtype: 'category' as 'string', 'Int8', 'Int16', 'Int32' as 'Int64', 'Float32' as 'Float64'."""
+
+        dtype_str = str(df_col.dtype)
+        compact_dtypes = {
+            'category': 'string',
+            'Int8': 'Int64', 'Int16': 'Int64', 'Int32': 'Int64', 'UInt8': 'Int64', 'UInt16': 'Int64', 'UInt32': 'Int64',
+            'Float32': 'Float64',
+        }
+
+        return compact_dtypes.get(dtype_str, dtype_str)
+
+    def _update_column_stats(self, col, df_col):
+        """Accumulate the statistics of the field col needed to build its transformer_meta_dict (ref. partial_fit)."""
+
+        column_stats = self.fit_stats['columns'].get(col)
+        chunk_dtype = self._field_dtype(df_col)
+        null_mask = df_col.isna()
 
-        # loop through each column of the dataframe 
-        # for i, col in enumerate(self.var_list):
-        for i, col in enumerate(data_curated_df.columns):
+        if column_stats is None:
+            column_stats = {'dtype': chunk_dtype, 'n_rows': 0, 'n_null': 0, 'n': 0, 'sum': 0}
+            self.fit_stats['columns'][col] = column_stats
+        elif not null_mask.all(): # (dtype of a null chunk is not inferred)
+            column_stats['dtype'] = self._merge_dtype(col, column_stats['dtype'], chunk_dtype)
+
+        if str(df_col.dtype) != column_stats['dtype'] and not null_mask.all():
+            df_col = df_col.astype(column_stats['dtype'])
+
+        col_dtype_str = column_stats['dtype']
+        column_stats['n_rows'] += len(df_col)
+
+        if (col_dtype_str=='string' or col_dtype_str=='object' or col_dtype_str=='category'):
+
+            transformer_type = self._get_transformer_type_from_metaData(col, col_dtype_str)
+
+            if transformer_type=='One-Hot':
+                # categories (in order of first appearance, for params_dict), and non-null categories (for the output fields)
+                column_stats.setdefault('uniques', {})
+                column_stats.setdefault('levels', set())
+                for st in df_col.unique().tolist():
+                    column_stats['uniques'][str(st)] = st
+                column_stats['levels'].update(df_col.dropna().unique().tolist())
+                column_stats['n_null'] += int(null_mask.sum())
+
+            max_levels, fallback = self._get_onehot_policy_from_metaData(col)
+            if transformer_type!='One-Hot' or max_levels is not None:
+                # counts of the categories (in order of first appearance), null as a category (also for the fallback of 'One-Hot' fields)
+                df_col = df_col.fillna('IS_NULL')
+                column_stats.setdefault('counts', {})
+                codes, uniques = pd.factorize(df_col)
+                for cat, cat_count in zip(uniques.tolist(), np.bincount(codes, minlength=len(uniques)).tolist()):
+                    column_stats['counts'][cat] = column_stats['counts'].get(cat, 0) + cat_count
+
+            return
+
+        column_stats['n_null'] += int(null_mask.sum())
+
+        if ('datetime64' in col_dtype_str):
+            # integer values, divided by the common divider (GCD) of all chunks
+            datetime_format = self._get_datetime_format_from_metaData(column=col)
+            int_values = pd.DatetimeIndex(pd.to_datetime(df_col, format=datetime_format)).asi8
+            null_array = null_mask.to_numpy(dtype=bool)
+            if not null_array.all():
+                chunk_gcd = ut_.gcd(int_values[~null_array])
+                fitted_gcd = column_stats.get('gcd')
+                column_stats['gcd'] = chunk_gcd if fitted_gcd is None else np.gcd(fitted_gcd, chunk_gcd)
+            values = pd.Series(np.where(null_array, np.nan, int_values), index=df_col.index)
+            column_stats['sum'] += float(values.sum())
+        else:
+            values = df_col
+            column_stats['sum'] += values.sum()
+
+        column_stats['n'] += int((~null_mask).sum())
+
+        # range of the values (for the null sentinel), and missingness pattern (for merging the null indicators)
+        if not null_mask.all():
+            chunk_min, chunk_max = float(values.min()), float(values.max())
+            column_stats['min'] = min(column_stats.get('min', chunk_min), chunk_min)
+            column_stats['max'] = max(column_stats.get('max', chunk_max), chunk_max)
+        if getattr(self, 'null_merge', False):
+            chunk_signature = hashlib.sha1(np.packbits(null_mask.to_numpy(dtype=bool)).tobytes()).hexdigest()
+            column_stats['null_signature'] = hashlib.sha1((column_stats.get('null_signature', '') + chunk_signature).encode()).hexdigest()
+
+        # values needed by the null options
+        null_option = self._get_null_option_from_metaData(col)
+        if null_option == 'mode':
+            column_stats.setdefault('value_counts', {})
+            for value, count in values.dropna().astype(float).value_counts().items():
+                column_stats['value_counts'][value] = column_stats['value_counts'].get(value, 0) + count
+        elif null_option == 'median':
+            if self.fit_stats['n_chunks'] > 0:
+                raise ValueError(f"Null option 'median' of variable {col} cannot be fitted on chunks. Use fit() on the full data.")
+            column_stats['median'] = float(values.astype(float).median())
+
+    def _build_transformer_meta_dict(self):
+        """Build the transformer_meta_dict of each field from the statistics accumulated by partial_fit."""
+
+        transformer_meta_dict = {}
+        field_dtype = np.dtype(getattr(self, 'output_dtype', 'float64')) # dtype of the transformed fields
+
+        for i, (col, column_stats) in enumerate(self.fit_stats['columns'].items()):
 
             transformer_meta_dict[col] = {} #initialise transformer_meta_dict for field
-            
-            # GET PANDAS dtype for column i
-            col_dtype_str = data_curated_df[col].dtype
-            transformer_meta_dict[col]['original_dtype'] = str(col_dtype_str) #update transformer_meta_dict with original pd dtype of field
+            col_dtype_str = column_stats['dtype']
+            transformer_meta_dict[col]['original_dtype'] = col_dtype_str #update transformer_meta_dict with original pd dtype of field
+            output_field_name = f"{col}.value"
+            set_null_value = None
 
             if (self.debug):
-                print(f"Transforming column {i}: {col} of type {col_dtype_str}")
+                print(f"Fitting column {i}: {col} of type {col_dtype_str}")
 
-            # TRANSFORMING
-            
             # (1) BOOLEAN / NUMERICAL (float64)/(int64)
             if (col_dtype_str=='boolean' or col_dtype_str=='Float64' or col_dtype_str=='Int64' or col_dtype_str=='Int32'):
-                output_field_name = f"{col}.value"
-
-                numeric_df[output_field_name] = data_curated_df[col].astype(float)
 
                 if (col_dtype_str=='boolean'):
                     transformer_meta_dict[col]['transformer_type'] = 'Boolean'
@@ -261,75 +474,70 @@ class Transformer:
 
                 transformer_meta_dict[col]['output_fields'] = {
                     output_field_name: {
-                        'dtype': numeric_df[output_field_name].dtype  # update transformer_meta_dict with output pd dtype of field
+                        'dtype': field_dtype
                     }
                 }
-            elif ('datetime64' in str(col_dtype_str)):
-
-                # Extract datetime_format from metaData
-                datetime_format = self._get_datetime_format_from_metaData(column=col)
-
-                # Convert from string/datetime to pandas datetime format
-                output_field_name = f"{col}.value"
-                numeric_df[output_field_name] = pd.to_datetime(data_curated_df[col], format=datetime_format)
 
-                # Convert column from datetime to int format
-                null_mask = numeric_df[output_field_name].isnull()
-                numeric_df[output_field_name] = numeric_df[output_field_name].astype(np.int64)
-                numeric_df[output_field_name] = numeric_df[output_field_name].mask(null_mask, np.nan)
+                if (col_dtype_str=='boolean'):
+                    set_null_value = self._get_null_value_from_metaData(column=col, default_value=-1, column_stats=column_stats) #default fill value for boolean is set to -1
+                elif (col_dtype_str=='Float64'):
+                    set_null_value = self._get_null_value_from_metaData(column=col, default_value=column_stats['sum'] / column_stats['n'] if column_stats['n'] > 0 else np.nan, column_stats=column_stats) #default fill value for float is set to mean
+                elif (col_dtype_str=='Int64'):
+                    set_null_value = self._get_null_value_from_metaData(column=col, default_value=column_stats['sum'] / column_stats['n'] if column_stats['n'] > 0 else np.nan, column_stats=column_stats) #default fill value for int is set to mean
+                    if not np.isnan(set_null_value):
+                        set_null_value = round(set_null_value)
 
-                # Find smallest denominator by applying GCD function to dataframe column
-                gcd = ut_.gcd(numeric_df[output_field_name])
+            elif ('datetime64' in col_dtype_str):
 
-                # Reduce converted datetime by GCD
-                numeric_df[output_field_name] = numeric_df[output_field_name] // gcd
-                numeric_df[output_field_name] = numeric_df[output_field_name].astype(float)
+                gcd = column_stats.get('gcd')
+                gcd = gcd if gcd is not None else 1
 
                 # Update meta_dict
                 transformer_meta_dict[col]['transformer_type'] = 'Datetime'
-                transformer_meta_dict[col]['datetime_format'] = datetime_format
+                transformer_meta_dict[col]['datetime_format'] = self._get_datetime_format_from_metaData(column=col)
                 transformer_meta_dict[col]['common_divider'] = gcd
                 transformer_meta_dict[col]['output_fields'] = {
                     output_field_name: {
-                        'dtype': numeric_df[output_field_name].dtype  # update transformer_meta_dict with output pd dtype of field
+                        'dtype': field_dtype
                     }
                 }
 
+                if (col_dtype_str=='datetime64[ns]'):
+                    set_null_value = self._get_null_value_from_metaData(column=col, default_value=column_stats['sum'] / gcd / column_stats['n'] if column_stats['n'] > 0 else np.nan, column_stats=column_stats, scale=gcd) #default fill value for datetime is set to mean
+                    if not np.isnan(set_null_value):
+                        set_null_value = round(set_null_value)
+
             elif (col_dtype_str=='string' or col_dtype_str=='object' or col_dtype_str=='category'):
 
-                transformer_type = self._get_transformer_type_from_metaData(col, data_curated_df)
+                transformer_type = self._get_transformer_type_from_metaData(col, col_dtype_str)
 
-                if transformer_type=='One-Hot':
-                    # Perform one-hot encoding
-                    df_onehot = pd.get_dummies(data_curated_df[col], prefix=col, prefix_sep='.')
-                    numeric_df = pd.concat([numeric_df, df_onehot], axis=1)
-                    numeric_df = numeric_df.astype('float') #convert column from uint8 to float dtype
+                # fall back from 'One-Hot' above the maximum no. of categories
+                max_levels, fallback = self._get_onehot_policy_from_metaData(col)
+                if transformer_type=='One-Hot' and max_levels is not None and len(column_stats['levels']) > max_levels:
+                    if (self.debug):
+                        print(f"{col}: {len(column_stats['levels'])} categories > onehot_max_levels={max_levels}, using {fallback}")
+                    transformer_type = fallback
 
+                if transformer_type=='One-Hot':
                     # Create a dictionary to map each string to its corresponding column
                     dic = {}
-                    for st in data_curated_df[col].unique().tolist():
+                    for st in column_stats['uniques'].values():
                         dic[str(st)] = str(col) + "." + str(st)
 
                     # Update meta_dict
                     transformer_meta_dict[col]['transformer_type'] = 'One-Hot'
                     transformer_meta_dict[col]['params_dict'] = dic
+                    transformer_meta_dict[col]['levels'] = sorted(column_stats['levels']) # categories of the output fields (as pd.get_dummies)
                     transformer_meta_dict[col]['output_fields'] = {}
-                    for onehotcol in df_onehot.columns:
-                        transformer_meta_dict[col]['output_fields'][onehotcol] = {
-                            'dtype': numeric_df[onehotcol].dtype  # update transformer_meta_dict with output pd dtype of field
+                    for level in transformer_meta_dict[col]['levels']:
+                        transformer_meta_dict[col]['output_fields'][f"{col}.{level}"] = {
+                            'dtype': field_dtype
                         }
                 elif transformer_type=='LabelEncoding':
-                    # Perform label encoding
-
-                    data_curated_df[col] = data_curated_df[col].fillna('IS_NULL')
-                    
-                    # Create a dictionary to map each string to its corresponding integer 
-                    dic = {x[1]:x[0] for x in enumerate(set(data_curated_df[col]))}
-                    inv_dic = {x[0]:x[1] for x in enumerate(set(data_curated_df[col]))}
-                    
-                    # Use the dictionary to map each string to its corresponding integer
-                    output_field_name = f"{col}.value"
-                    numeric_df[output_field_name] = data_curated_df[col].map(dic).astype('float')
+                    # Create a dictionary to map each string to its corresponding integer (in order of first appearance)
+                    categories = list(column_stats['counts'])
+                    dic = {cat: label for label, cat in enumerate(categories)}
+                    inv_dic = {label: cat for label, cat in enumerate(categories)}
 
                     # Update meta_dict
                     transformer_meta_dict[col]['transformer_type'] = 'LabelEncoding'
@@ -337,42 +545,24 @@ class Transformer:
                     transformer_meta_dict[col]['inv_params_dict'] = inv_dic
                     transformer_meta_dict[col]['output_fields'] = {
                         output_field_name: {
-                            'dtype': numeric_df[output_field_name].dtype  # update transformer_meta_dict with output pd dtype of field
-                        }
-                    }
-
-                elif transformer_type=='Cat1':
-                    # Categorical transformation: assigning representative float by frequency of occurence
-                    data_curated_df[col] = data_curated_df[col].fillna('IS_NULL')
-                    output_field_name = f"{col}.value"
-                    transformed_col, rep, intervals, stds = self._categorical_transformer(data_curated_df[col])
-                    numeric_df[output_field_name] = transformed_col
-
-                    # Update meta_dict
-                    transformer_meta_dict[col]['transformer_type'] = 'Cat1'
-                    transformer_meta_dict[col]['params_dict'] = rep
-                    transformer_meta_dict[col]['intervals'] = intervals
-                    transformer_meta_dict[col]['output_fields'] = {
-                        output_field_name: {
-                            'dtype': numeric_df[output_field_name].dtype  # update transformer_meta_dict with output pd dtype of field
+                            'dtype': field_dtype
                         }
                     }
 
-                elif transformer_type=='Cat1Fuzzy':
+                elif transformer_type=='Cat1' or transformer_type=='Cat1Fuzzy':
                     # Categorical transformation: assigning representative float by frequency of occurence
-                    data_curated_df[col] = data_curated_df[col].fillna('IS_NULL')
-                    output_field_name = f"{col}.value"
-                    transformed_col, rep, intervals, stds = self._categorical_transformer(data_curated_df[col], type='Gaussian')
-                    numeric_df[output_field_name] = transformed_col
+                    rep, intervals, stds = self._categorical_transformer(column_stats['counts'], type='Gaussian' if transformer_type=='Cat1Fuzzy' else 'Fixed')
 
                     # Update meta_dict
-                    transformer_meta_dict[col]['transformer_type'] = 'Cat1Fuzzy'
+                    transformer_meta_dict[col]['transformer_type'] = transformer_type
                     transformer_meta_dict[col]['params_dict'] = rep
                     transformer_meta_dict[col]['intervals'] = intervals
-                    transformer_meta_dict[col]['stds'] = stds
+                    transformer_meta_dict[col]['upper_bounds'] = np.array([upper for (lower, upper) in intervals.values()], dtype=float) # sorted, for decoding with np.searchsorted
+                    if transformer_type=='Cat1Fuzzy':
+                        transformer_meta_dict[col]['stds'] = stds
                     transformer_meta_dict[col]['output_fields'] = {
                         output_field_name: {
-                            'dtype': numeric_df[output_field_name].dtype  # update transformer_meta_dict with output pd dtype of field
+                            'dtype': field_dtype
                         }
                     }
 
@@ -384,145 +574,391 @@ class Transformer:
                 raise TypeError('Input array must be of type boolean, Float64, Int64, Int32, string, datetime64[ns], object, category')
 
             # FIX NULLS (not used for categorical)
-            fix_null = False
-            got_null = data_curated_df[col].isna().any()
+            got_null = column_stats['n_null'] > 0 and transformer_meta_dict[col].get('transformer_type') not in ('LabelEncoding', 'Cat1', 'Cat1Fuzzy') # (null is a category)
+            fix_null = got_null
+            null_output_field_name = None
+            sentinel_threshold = None
             if got_null:
-                fix_null = True
-
-                null_output_field_name = f"{col}.is_null" #follow convention in SDV
-                numeric_df[null_output_field_name] = data_curated_df[col].isna().astype(float)
-
-                transformer_meta_dict[col]['output_fields'][null_output_field_name] = {
-                    'dtype': numeric_df[null_output_field_name].dtype  # update transformer_meta_dict with output pd dtype of field
-                }
-                
-                if (col_dtype_str=='boolean'):
-                    set_null_value = self._get_null_value_from_metaData(
-                        column = col,
-                        default_value = -1, #default fill value for boolean is set to -1
-                        data_df = data_curated_df
-                    )
-                    numeric_df.loc[data_curated_df[col].isna(), output_field_name] = set_null_value
-                elif (col_dtype_str=='Float64'):
-                    set_null_value = self._get_null_value_from_metaData(
-                        column = col,
-                        default_value = data_curated_df[col].mean(), #default fill value for float is set to mean
-                        data_df = data_curated_df
-                    )
-                    numeric_df.loc[data_curated_df[col].isna(), output_field_name] = set_null_value
-                elif (col_dtype_str=='Int64'):
-                    set_null_value = self._get_null_value_from_metaData(
-                        column = col,
-                        default_value = data_curated_df[col].mean(), #default fill value for int is set to mean
-                        data_df = data_curated_df
-                    )
-                    if not np.isnan(set_null_value):
-                        numeric_df.loc[data_curated_df[col].isna(), output_field_name] = round(set_null_value)
-                elif (col_dtype_str=='datetime64[ns]'):
-                    set_null_value = self._get_null_value_from_metaData(
-                        # column = f"{col}.value",
-                        column = col,
-                        default_value = numeric_df[f"{col}.value"].mean(), #default fill value for datetime is set to mean
-                        data_df = numeric_df
-                    )
-                    if not np.isnan(set_null_value):
-                        numeric_df.loc[data_curated_df[col].isna(), output_field_name] = round(set_null_value)
-
-                if np.isnan(set_null_value):
+                if set_null_value is not None and np.isnan(set_null_value):
                     fix_null = False
 
+                null_rate = column_stats['n_null'] / column_stats['n_rows']
+                if col_dtype_str=='string' or not (getattr(self, 'null_sentinel', False) or null_rate < getattr(self, 'null_min_rate', 0)):
+                    null_output_field_name = f"{col}.is_null" #follow convention in SDV
+                    transformer_meta_dict[col]['output_fields'][null_output_field_name] = {
+                        'dtype': field_dtype
+                    }
+                elif getattr(self, 'null_sentinel', False) and fix_null and 'min' in column_stats:
+                    # fill the nulls with a sentinel below the range of the values
+                    scale = transformer_meta_dict[col].get('common_divider', 1)
+                    value_min, value_max = column_stats['min'] / scale, column_stats['max'] / scale
+                    span = (value_max - value_min) if value_max > value_min else 1
+                    set_null_value = value_min - span
+                    sentinel_threshold = value_min - span/2
+
             transformer_meta_dict[col]['null'] = {
                 'got_null': got_null,
                 'fix_null': fix_null,
+                'null_value': set_null_value, # fill value of the null cells (None if not filled)
+                'null_field': null_output_field_name, # null indicator field (None if the nulls are encoded by a sentinel, or restored at random)
+                'sentinel_threshold': sentinel_threshold, # reversed values below are null (None if no sentinel)
+                'null_rate': column_stats['n_null'] / column_stats['n_rows'] if column_stats['n_rows'] > 0 else 0, # missing rate (for restoring the nulls at random)
             }
 
-        self.transformer_meta_dict = transformer_meta_dict
+        # share the null indicator field of the fields with identical missingness patterns
+        if getattr(self, 'null_merge', False):
+            signature_fields = {}
+            for col, field_meta in transformer_meta_dict.items():
+                null_field = field_meta['null']['null_field']
+                signature = self.fit_stats['columns'][col].get('null_signature')
+                if null_field is None or signature is None or field_meta['original_dtype']=='string':
+                    continue
+                if signature in signature_fields:
+                    del field_meta['output_fields'][null_field]
+                    field_meta['null']['null_field'] = signature_fields[signature]
+                else:
+                    signature_fields[signature] = null_field
+
+        return transformer_meta_dict
+
+    def transform(self, data_df):
+        """
+        Transform data_df into its numerical equivalent, using the encoding learned by fit (or partial_fit). If the transformer is not fitted, it is fitted on data_df first.
+        The transformation of each row only depends on the fitted encoding, so data can be transformed in chunks (categories not seen by fit are set to NaN, or to zero in all One-Hot fields).
+        Args:
+            data_df (pd.DataFrame): data to transform.
+        Returns:
+            numeric_df (pd.DataFrame): transformed data.
+        """
+
+        # convert data_df to best possible dtypes
+        data_df = self.convert_2_dtypes(data_df)
+
+        if self.transformer_meta_dict is None or getattr(self, 'fit_stats', None) is None: # (transformers pickled before fit was added are refitted)
+            self.fit_stats = None
+            self._partial_fit_converted(data_df)
+
+        return self._transform_converted(data_df)
+
+    def report_width(self, n_rows=None):
+        """
+        Width (no. of transformed fields) and memory estimate of the transformed data, for each variable of the fitted transformer (e.g. to check the 'One-Hot' fields of high-cardinality variables before transforming and fitting the copula).
+        Args:
+            n_rows (int): no. of rows of the transformed data. Default is None (no. of rows fitted).
+        Returns:
+            report_df (pd.DataFrame): transformer_type, no. of categories (n_levels), no. of transformed fields (n_fields) and memory estimate (memory_mb) of each variable, and their total (row 'TOTAL'). The correlation matrix of the copula takes about n_fields**2 * 8 bytes.
+        """
+
+        output_itemsize = np.dtype(getattr(self, 'output_dtype', 'float64')).itemsize
+        onehot_dtype = getattr(self, 'onehot_dtype', None)
+
+        report = {}
+        for col, field_meta in self.transformer_meta_dict.items():
+            column_stats = self.fit_stats['columns'][col] if getattr(self, 'fit_stats', None) is not None else {}
+            col_n_rows = n_rows if n_rows is not None else column_stats.get('n_rows', 0)
+            transformer_type = field_meta.get('transformer_type')
+
+            n_levels = None
+            if 'levels' in column_stats:
+                n_levels = len(column_stats['levels'])
+            elif 'counts' in column_stats:
+                n_levels = len(column_stats['counts'])
+
+            n_fields = len(field_meta['output_fields'])
+            n_bytes = col_n_rows * n_fields * output_itemsize
+            if transformer_type=='One-Hot' and onehot_dtype is not None:
+                n_onehot = len(field_meta.get('levels', []))
+                if onehot_dtype=='sparse':
+                    onehot_bytes = (col_n_rows - column_stats.get('n_null', 0)) * (1 + 4) # (one uint8 value and int32 index per non-null row)
+                else:
+                    onehot_bytes = col_n_rows * n_onehot * np.dtype(onehot_dtype).itemsize
+                n_bytes = n_bytes - col_n_rows * n_onehot * output_itemsize + onehot_bytes
+
+            report[col] = {'transformer_type': transformer_type, 'n_levels': n_levels, 'n_fields': n_fields, 'memory_mb': n_bytes / 1e6}
+
+        report_df = pd.DataFrame.from_dict(report, orient='index', columns=['transformer_type', 'n_levels', 'n_fields', 'memory_mb'])
+        report_df.loc['TOTAL'] = [None, None, report_df['n_fields'].sum(), report_df['memory_mb'].sum()]
+        report_df = report_df.astype({'n_levels': 'Int64', 'n_fields': 'int64'})
+
+        return report_df
+
+    def fit_transform(self, data_df):
+        """Fit the encoding on data_df, then transform it (ref. fit, transform)."""
+
+        self.transformer_meta_dict = None
+
+        return self.transform(data_df)
+
+    def _transform_converted(self, data_df):
+
+        data_curated_df = self._curate_data(data_df)
+        onehot_dtype = getattr(self, 'onehot_dtype', None)
+
+        # output fields of each column, in order (value field(s), then null field)
+        output_fields = []
+        onehot_fields = {} # compact 'One-Hot' fields (stored outside of the array), for each column
+        onehot_positions = {} # position of the compact 'One-Hot' fields in the array fields, for each column
+        n_array_fields = 0
+        for col in data_curated_df.columns:
+            field_meta = self.transformer_meta_dict[col]
+            fields = list(field_meta['output_fields'].keys())
+            if onehot_dtype is not None and field_meta.get('transformer_type')=='One-Hot':
+                onehot_fields[col] = [f for f in fields if f != f"{col}.is_null"]
+                onehot_positions[col] = n_array_fields
+            n_array_fields += len(fields) - len(onehot_fields.get(col, []))
+            output_fields += fields
+
+        # the (other) output fields are written in place into a single (column-major) array, exposed as the transformed dataframe
+        compact_fields = set(f for fields in onehot_fields.values() for f in fields)
+        array_fields = [f for f in output_fields if f not in compact_fields]
+        array_index = {f: j for j, f in enumerate(array_fields)}
+        output_dtype = getattr(self, 'output_dtype', 'float64')
+        numeric_array = np.empty((len(data_curated_df), len(array_fields)), dtype=output_dtype, order='F')
+        onehot_dfs = {}
+
+        # transform each column into its own fields of the array (in parallel with n_jobs)
+        def transform_column(i, col):
+
+            filled_col = None # column with the nulls filled (categorical), for data_curated_df
+            onehot_df = None # compact 'One-Hot' fields
+            field_meta = self.transformer_meta_dict[col]
+            col_dtype_str = field_meta['original_dtype']
+            output_field_name = f"{col}.value"
+
+            df_col = data_curated_df[col]
+            if str(df_col.dtype) != col_dtype_str:
+                df_col = df_col.astype(col_dtype_str)
+
+            if (self.debug):
+                print(f"Transforming column {i}: {col} of type {col_dtype_str}")
+
+            # TRANSFORMING
+
+            # (1) BOOLEAN / NUMERICAL (float64)/(int64)
+            if (col_dtype_str=='boolean' or col_dtype_str=='Float64' or col_dtype_str=='Int64' or col_dtype_str=='Int32'):
+
+                numeric_array[:, array_index[output_field_name]] = df_col.to_numpy(dtype=float, na_value=np.nan)
+
+            elif ('datetime64' in col_dtype_str):
+
+                # Convert from string/datetime to pandas datetime format
+                datetime_col = pd.to_datetime(df_col, format=field_meta['datetime_format'])
+
+                # Convert column from datetime to int format, and reduce by GCD
+                null_mask = datetime_col.isnull().to_numpy()
+                int_values = pd.DatetimeIndex(datetime_col).asi8 // field_meta['common_divider']
+                numeric_array[:, array_index[output_field_name]] = int_values
+                numeric_array[null_mask, array_index[output_field_name]] = np.nan
+
+            else:
+
+                transformer_type = field_meta['transformer_type']
+
+                if transformer_type=='One-Hot':
+                    # Perform one-hot encoding (one field for each fitted category, in the order of pd.get_dummies)
+                    levels = field_meta.get('levels', [f[len(col)+1:] for f in field_meta['output_fields'] if f != f"{col}.is_null"])
+                    codes = pd.Categorical(df_col, categories=levels).codes
+                    hot = codes >= 0
+                    if col in onehot_fields:
+                        onehot_df = self._onehot_frame(codes, hot, onehot_fields[col], df_col.index, onehot_dtype)
+                    else:
+                        onehot_index = array_index[f"{col}.{levels[0]}"] if len(levels) > 0 else 0
+                        onehot_array = numeric_array[:, onehot_index:onehot_index+len(levels)]
+                        onehot_array[:] = 0
+                        onehot_array[np.flatnonzero(hot), codes[hot]] = 1
+
+                elif transformer_type=='LabelEncoding':
+                    # Use the dictionary to map each string to its corresponding integer
+                    df_col = filled_col = df_col.fillna('IS_NULL')
+                    codes = self._category_codes(df_col, list(field_meta['params_dict'].keys()))
+                    numeric_array[:, array_index[output_field_name]] = np.append(np.array(list(field_meta['params_dict'].values()), dtype=float), np.nan)[codes]
+
+                elif transformer_type=='Cat1':
+                    df_col = filled_col = df_col.fillna('IS_NULL')
+                    numeric_array[:, array_index[output_field_name]] = self._categorical_transform(df_col, field_meta['params_dict']).to_numpy()
+
+                elif transformer_type=='Cat1Fuzzy':
+                    df_col = filled_col = df_col.fillna('IS_NULL')
+                    numeric_array[:, array_index[output_field_name]] = self._categorical_transform(df_col, field_meta['params_dict'], field_meta['stds'], type='Gaussian').to_numpy()
+
+            # FIX NULLS (not used for categorical)
+            if field_meta['null']['got_null']:
+                null_mask = df_col.isna().to_numpy()
+                null_field = field_meta['null'].get('null_field', f"{col}.is_null")
+                if null_field in field_meta['output_fields']: # (not written by the fields sharing the null indicator field of another field)
+                    numeric_array[:, array_index[null_field]] = null_mask
+
+                set_null_value = field_meta['null'].get('null_value')
+                if set_null_value is not None and not np.isnan(set_null_value):
+                    numeric_array[null_mask, array_index[output_field_name]] = set_null_value
+
+            return filled_col, onehot_df
+
+        # the workers only read data_curated_df: the filled columns are written back on this thread, once all the fields are transformed
+        columns = list(data_curated_df.columns)
+        column_results = self._map_columns(transform_column, range(len(columns)), columns)
+        for col, (filled_col, onehot_df) in zip(columns, column_results):
+            if filled_col is not None:
+                data_curated_df[col] = filled_col
+            if onehot_df is not None:
+                onehot_dfs[col] = onehot_df
+
         self.data_curated_df = data_curated_df
 
+        numeric_df = pd.DataFrame(numeric_array, index=data_curated_df.index, columns=array_fields, copy=False)
+        if len(onehot_dfs) > 0:
+            # put the compact 'One-Hot' fields back in place (the array is split into views, not copied)
+            pieces = []
+            start = 0
+            for col, onehot_df in onehot_dfs.items():
+                end = onehot_positions[col]
+                pieces += [numeric_df.iloc[:, start:end], onehot_df]
+                start = end
+            pieces.append(numeric_df.iloc[:, start:])
+            numeric_df = pd.concat(pieces, axis=1, copy=False)
+
         return numeric_df
 
+    def _onehot_frame(self, codes, hot, fields, index, onehot_dtype):
+        """'One-Hot' fields of the category codes, stored as 'uint8' (dense) or 'sparse' (pd.SparseDtype('uint8', 0)) columns."""
 
-    def reverse(self, data):
+        if onehot_dtype=='sparse':
+            rows = np.flatnonzero(hot)
+            onehot_matrix = sparse.csc_matrix((np.ones(len(rows), dtype=np.uint8), (rows, codes[hot])), shape=(len(codes), len(fields)))
+            return pd.DataFrame.sparse.from_spmatrix(onehot_matrix, index=index, columns=fields)
 
-        # initialise empty dataframe
-        revert_df = pd.DataFrame()
+        onehot_array = np.zeros((len(codes), len(fields)), dtype=onehot_dtype, order='F')
+        onehot_array[np.flatnonzero(hot), codes[hot]] = 1
 
-        # loop through every transformed field
-        for field, field_meta in self.transformer_meta_dict.items():
+        return pd.DataFrame(onehot_array, index=index, columns=fields, copy=False)
+
+    def _reverse_null_mask(self, field, field_meta, data):
+        """Null cells of the reversed field: from its null indicator field (possibly shared), from its sentinel, or drawn at random at its missing rate (no null indicator field)."""
+
+        null_meta = field_meta['null']
+        null_field = null_meta.get('null_field', f"{field}.is_null")
+
+        if null_field is not None:
+            return data[null_field] > 0.5
+        elif null_meta.get('sentinel_threshold') is not None:
+            return data[f"{field}.value"] < null_meta['sentinel_threshold']
+        else:
+            return pd.Series(np.random.random(len(data)) < null_meta.get('null_rate', 0), index=data.index)
 
-            # get output fields
-            output_fields_dict = field_meta['output_fields']
-            for output_field_name, output_field_meta in output_fields_dict.items():
-
-                # IF BOOLEAN
-                if (field_meta['original_dtype']=='boolean'):
-                    if output_field_name == (f"{field}.value"):
-                        revert_df[field] = np.round(data[output_field_name]).clip(0, 1).astype('boolean')
-                # IF FLOAT
-                elif (field_meta['original_dtype']=='Float64'):
-                    if output_field_name == (f"{field}.value"):
-                        revert_df[field] = data[output_field_name]
-                # IF INT
-                elif (field_meta['original_dtype']=='Int64'):
-                    if output_field_name == (f"{field}.value"):
-                        revert_df[field] = np.round(data[output_field_name])
-                # IF DATETIME
-                elif (field_meta['original_dtype']=='datetime64[ns]'):
-                    if output_field_name == (f"{field}.value"):
-                        revert_df_col = data[output_field_name] * field_meta['common_divider']
-                        revert_df_col = pd.to_datetime(revert_df_col, unit="ns", errors = 'coerce')
-                        revert_df[field] = revert_df_col.dt.strftime(field_meta['datetime_format'])
-                elif (field_meta['original_dtype']=='datetime64[s]'):
-                    if output_field_name == (f"{field}.value"):
-                        revert_df_col = data[output_field_name] * field_meta['common_divider']
-                        revert_df_col = pd.to_datetime(revert_df_col, unit="s")
-                        revert_df[field] = revert_df_col.dt.strftime(field_meta['datetime_format'])
-
-
-            # IF STRING
-            if (field_meta['original_dtype']=='string'):
-                if (field_meta['transformer_type']=='One-Hot'):
-
-                    # Get column names 
-                    column_names = list(output_fields_dict.keys())
-                    decoded_df = data[column_names].idxmax(axis=1)
-                    revert_df[field] = decoded_df.str.split('.').str[1]
-                    revert_df[field].replace('is_null', np.nan, inplace=True)
-
-                if (field_meta['transformer_type']=='LabelEncoding'):
-
-                    # Get dic from field_meta
-                    dic = field_meta['inv_params_dict']
-
-                    # Use the dictionary to reverse the label encoding
-                    revert_col = data[output_field_name].clip(min(dic),max(dic))
-                    revert_df[field] = revert_col.round().map(dic)
-                    revert_df[field].replace('IS_NULL', np.nan, inplace=True)
-
-                elif (field_meta['transformer_type']=='Cat1' or field_meta['transformer_type']=='Cat1Fuzzy'):
-
-                    # Get interval dict from field_meta
-                    intervals = field_meta['intervals']
-                    revert_df[field] = self._reverse_categorical_transformer(data[output_field_name], intervals)
-                    revert_df[field].replace('IS_NULL', np.nan, inplace=True)
-
-            # FIX NULL for non-string inputs
-            if (field_meta['original_dtype']!='string'):
-                # identify null cells
-                if (field_meta['null']['fix_null']):
-                    isnull = data[f"{field}.is_null"] > 0.5
-                # set identified null cells to nan
-                if (field_meta['null']['fix_null']):
-                    revert_df.loc[isnull, field] = np.nan
-
-        # cast back to original dtype
+    def _reverse_onehot(self, field, field_meta, data):
+        """Categorical of the 'One-Hot' field: argmax over its fields (a slice of the array if contiguous), gathered from the fitted categories."""
+
+        output_fields = list(field_meta['output_fields'].keys())
+        levels = field_meta.get('levels', [f[len(field)+1:] for f in output_fields if f != f"{field}.is_null"])
+
+        positions = data.columns.get_indexer(output_fields)
+        if (positions < 0).any():
+            raise KeyError(f"Output fields {[f for f, j in zip(output_fields, positions) if j < 0]} of {field} are not in the data.")
+        if len(positions) > 0 and (np.diff(positions) == 1).all():
+            onehot_array = data.iloc[:, positions[0]:positions[-1]+1].to_numpy()
+        else:
+            onehot_array = data.iloc[:, positions].to_numpy()
+
+        codes = np.argmax(onehot_array, axis=1) if len(output_fields) > 0 else np.zeros(len(data), dtype=int)
+        codes = np.where(codes < len(levels), codes, -1) # (the null field is after the categories)
+
+        return pd.Series(pd.Categorical.from_codes(codes, categories=levels), index=data.index)
+
+    def _map_columns(self, fn, *iterables):
+        """Apply fn to each column (field), in a thread pool of n_jobs threads (-1: all cores) if n_jobs > 1. Results are returned in order."""
+
+        n_jobs = getattr(self, 'n_jobs', None)
+        if n_jobs is not None and n_jobs < 0:
+            n_jobs = os.cpu_count()
+
+        iterables = [list(iterable) for iterable in iterables]
+        if n_jobs is not None and n_jobs > 1 and len(iterables[0]) > 1:
+            with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+                return list(executor.map(fn, *iterables))
+
+        return [fn(*args) for args in zip(*iterables)]
+
+    def _reverse_field(self, field, field_meta, data):
+        """Reversed column of the field (None if its original dtype is not reversed)."""
+
+        revert_col = None
+        original_dtype = field_meta['original_dtype']
+        output_field_name = f"{field}.value"
+
+        # IF BOOLEAN
+        if (original_dtype=='boolean'):
+            revert_col = np.round(data[output_field_name]).clip(0, 1).astype('boolean')
+        # IF FLOAT
+        elif (original_dtype=='Float64'):
+            revert_col = data[output_field_name].copy()
+        # IF INT
+        elif (original_dtype=='Int64'):
+            revert_col = np.round(data[output_field_name])
+        # IF DATETIME (truncated to the resolution of the format, as formatting and parsing back)
+        elif (original_dtype=='datetime64[ns]' or original_dtype=='datetime64[s]'):
+            revert_values = data[output_field_name].to_numpy(dtype=float) * field_meta['common_divider']
+            base_unit = 's' if original_dtype=='datetime64[s]' else 'ns'
+            revert_col = pd.Series(ut_.decode_datetime(revert_values, field_meta['datetime_format'], base_unit=base_unit), index=data.index)
+
+        # IF STRING
+        elif (original_dtype=='string'):
+            if (field_meta['transformer_type']=='One-Hot'):
+
+                # Position of the hot field of each row, as codes of the categories (null for the null field)
+                revert_col = self._reverse_onehot(field, field_meta, data)
+
+            elif (field_meta['transformer_type']=='LabelEncoding'):
+
+                # Get dic from field_meta
+                dic = field_meta['inv_params_dict']
+
+                # Use the dictionary to reverse the label encoding
+                revert_col = data[output_field_name].clip(min(dic),max(dic))
+                revert_col = revert_col.round().map(dic)
+                revert_col = revert_col.replace('IS_NULL', np.nan)
+
+            elif (field_meta['transformer_type']=='Cat1' or field_meta['transformer_type']=='Cat1Fuzzy'):
+
+                # Get interval dict from field_meta
+                intervals = field_meta['intervals']
+                revert_col = self._reverse_categorical_transformer(data[output_field_name], intervals, field_meta.get('upper_bounds'))
+                revert_col = revert_col.replace('IS_NULL', np.nan)
+
+        # FIX NULL for non-string inputs
+        if (original_dtype!='string') and revert_col is not None:
+            if (field_meta['null']['fix_null']):
+                # identify null cells, and set them to nan
+                isnull = self._reverse_null_mask(field, field_meta, data)
+                revert_col.loc[isnull] = np.nan
+
+        return revert_col
+
+    def reverse(self, data, chunksize=None):
+        """
+        Reverse the transformation of data (e.g. synthetic samples of the copula) to the original variables. Each row is reversed independently, so data can be reversed in chunks.
+        Args:
+            data (pd.DataFrame): transformed data.
+            chunksize (int): no. of rows reversed at a time, to bound the memory used by the intermediate columns. Default is None (all rows).
+        Returns:
+            revert_df (pd.DataFrame): reversed data.
+        """
+
+        if chunksize is not None and len(data) > chunksize:
+            return pd.concat([self.reverse(data.iloc[start:start+chunksize]) for start in range(0, len(data), chunksize)])
+
+        # reverse each field (in parallel with n_jobs), then assemble the reversed fields in order
+        fields = list(self.transformer_meta_dict.keys())
+        revert_cols = self._map_columns(lambda field: self._reverse_field(field, self.transformer_meta_dict[field], data), fields)
+        revert_dict = {field: revert_col for field, revert_col in zip(fields, revert_cols) if revert_col is not None}
+        revert_df = pd.DataFrame(revert_dict, index=data.index) if len(revert_dict) > 0 else pd.DataFrame()
+
+        # cast back to original dtype (datetimes; the other fields are left in the dtype of their reversed column)
         for field, field_meta in self.transformer_meta_dict.items():
             
             if 'datetime' in field_meta['original_dtype']:
-                datetime_format = self._get_datetime_format_from_metaData(column=field)
-                revert_df[field] = pd.to_datetime(revert_df[field], format=datetime_format)
-            else:
-                revert_df.astype({field: field_meta['original_dtype']})
+                if not pd.api.types.is_datetime64_any_dtype(revert_df[field]):
+                    datetime_format = self._get_datetime_format_from_metaData(column=field)
+                    revert_df[field] = pd.to_datetime(revert_df[field], format=datetime_format)
 
         return revert_df
         # return self.convert_2_dtypes(revert_df)
\ No newline at end of file
@@ -0,0 +1,100 @@
+import unittest
+import sys, os
+import pickle
+import tempfile
+import subprocess
+import time
+import numpy as np
+import pandas as pd
+
+# run this in cmd: python -m bdarpack.tests.test_asyncWriter -v
+
+if __name__ == '__main__':
+    if __package__ is None:
+        dir_path = os.path.dirname(os.path.realpath(__file__))
+        par_dir = os.path.dirname(dir_path)
+        sys.path.insert(0, par_dir)
+        head, sep, tail = dir_path.partition('copula-tabular')
+        sys.path.insert(0, head+sep) # adding par_dir to system path
+
+
+from bdarpack.AsyncWriter import AsyncWriter
+from bdarpack import utils_ as ut_
+
+class TestAsyncWriterMethods(unittest.TestCase):
+
+    def test_async_writer(self):
+
+        writer = AsyncWriter(max_queue=2)
+        df = pd.DataFrame({'a': np.arange(1000), 'b': np.random.random(1000)})
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+
+            # writes a snapshot: later changes to df are not written
+            filenames = [os.path.join(tmp_dir, f"out_{i}.csv") for i in range(5)]
+            for filename in filenames:
+                writer.submit(ut_.save_df_as_csv, df, filename, index=False)
+                df['a'] = df['a'] + 1
+            self.assertTrue(writer.flush())
+            for i, filename in enumerate(filenames):
+                self.assertEqual(pd.read_csv(filename)['a'].iloc[0], i)
+
+            # write errors are raised by flush
+            writer.submit(ut_.save_df_as_csv, df, os.path.join(tmp_dir, 'missing_dir', 'out.csv'))
+            with self.assertRaises(RuntimeError):
+                writer.flush()
+            self.assertTrue(writer.flush())
+            writer.submit(ut_.save_df_as_excel, df, os.path.join(tmp_dir, 'missing_dir', 'out.xlsx'))
+            with self.assertRaises(RuntimeError):
+                writer.flush()
+
+            # can be pickled (e.g. with a TabulaCopula instance), and reused
+            writer = pickle.loads(pickle.dumps(writer))
+            writer.submit(ut_.save_df_as_csv, df, filenames[0], index=False)
+            writer.close()
+            self.assertEqual(pd.read_csv(filenames[0])['a'].iloc[0], 5)
+
+    def test_async_writer_copy_on_write(self):
+
+        # with copy-on-write, the snapshot is a shallow copy: changes made to df after submit are not written
+        with pd.option_context('mode.copy_on_write', True), tempfile.TemporaryDirectory() as tmp_dir:
+            writer = AsyncWriter()
+            df = pd.DataFrame({'a': np.arange(10)})
+            filename = os.path.join(tmp_dir, "out.csv")
+
+            def slow_write(df, filename):
+                time.sleep(0.2)
+                ut_.save_df_as_csv(df, filename, index=False)
+
+            writer.submit(slow_write, df, filename)
+            df.loc[0, 'a'] = 99
+            writer.close()
+            self.assertEqual(pd.read_csv(filename)['a'].iloc[0], 0)
+
+    def test_async_writer_exit(self):
+
+        # pending writes are flushed at exit, without flush() or close()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, "out.csv")
+            script = (
+                "import time, pandas as pd\n"
+                "from bdarpack.AsyncWriter import AsyncWriter\n"
+                "def slow_write(df, filename):\n"
+                "    time.sleep(0.5)\n"
+                "    df.to_csv(filename, index=False)\n"
+                "writer = AsyncWriter()\n"
+                f"writer.submit(slow_write, pd.DataFrame({{'a': [1, 2]}}), {filename!r})\n"
+            )
+            root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+            subprocess.run([sys.executable, "-c", script], cwd=root_dir, check=True)
+            self.assertEqual(list(pd.read_csv(filename)['a']), [1, 2])
+
+
+if __name__ == '__main__':
+    if __package__ is None:
+        test = TestAsyncWriterMethods()
+        test.test_async_writer()
+        test.test_async_writer_copy_on_write()
+        test.test_async_writer_exit()
+    else:
+        unittest.main()
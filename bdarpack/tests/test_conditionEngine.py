@@ -0,0 +1,101 @@
+import unittest
+import sys, os
+import numpy as np
+import pandas as pd
+
+# run this in cmd: python -m bdarpack.tests.test_conditionEngine -v
+
+if __name__ == '__main__':
+    if __package__ is None:
+        dir_path = os.path.dirname(os.path.realpath(__file__))
+        par_dir = os.path.dirname(dir_path)
+        sys.path.insert(0, par_dir)
+        head, sep, tail = dir_path.partition('copula-tabular')
+        sys.path.insert(0, head+sep) # adding par_dir to system path
+
+
+from bdarpack.ConditionEngine import ConditionEngine
+from bdarpack.Transformer import Transformer
+from bdarpack import utils_ as ut_
+
+class TestConditionEngineMethods(unittest.TestCase):
+
+    def setUp(self):
+
+        with ut_.random_seed(0):
+            size = 500
+            self.data_df = pd.DataFrame({
+                'Grp': np.random.choice(['a', 'B', 'c'], size=size),
+                'Sex': np.random.choice(['male', 'female'], size=size),
+                'Lab': np.random.choice(['x', 'y', 'z'], size=size),
+                'Age': np.random.uniform(0, 90, size=size).round(),
+            })
+
+        self.parent_conditions = {
+            'Grp': {'condition': 'set', 'condition_value': {1: ['A'], 2: ['b', 'C']}},
+            'Age': {'condition': 'range', 'condition_value': {1: ['>=18', '<65'], 2: ['<18'], 3: ['>= 65']}},
+        }
+
+    def test_condition_engine(self):
+
+        engine = ConditionEngine(self.parent_conditions)
+        self.assertEqual(engine.set_index_list, ['1-1', '1-2', '1-3', '2-1', '2-2', '2-3'])
+
+        # same rows as the element-wise conditions
+        grp = self.data_df['Grp'].str.upper()
+        age = self.data_df['Age']
+        expected = {
+            '1-1': (grp == 'A') & (age >= 18) & (age < 65),
+            '1-3': (grp == 'A') & (age >= 65),
+            '2-2': grp.isin(['B', 'C']) & (age < 18),
+        }
+        groups = engine.evaluate(self.data_df)
+        for set_index, mask in expected.items():
+            np.testing.assert_array_equal(groups[set_index], np.flatnonzero(mask))
+        self.assertEqual(sum(len(g) for g in groups.values()), len(self.data_df))
+
+        labels = engine.labels(self.data_df)
+        np.testing.assert_array_equal(np.flatnonzero(labels == 1), groups['1-2'])
+
+        # overlapping conditions: rows may belong to several permutations
+        overlap_engine = ConditionEngine({'Age': {'condition': 'range', 'condition_value': {1: ['<50'], 2: ['<80']}}})
+        overlap_groups = overlap_engine.evaluate(self.data_df)
+        np.testing.assert_array_equal(overlap_groups['2'], np.flatnonzero(age < 80))
+        with self.assertRaises(ValueError):
+            overlap_engine.labels(self.data_df)
+
+        with self.assertRaises(ValueError):
+            ConditionEngine.parse_range('__import__("os")')
+
+    def test_condition_engine_transformed(self):
+
+        parent_conditions = {
+            'Grp': {'condition': 'set', 'condition_value': {1: ['a'], 2: ['B', 'c']}},
+            'Sex': {'condition': 'set', 'condition_value': {1: ['male'], 2: ['female']}},
+            'Lab': {'condition': 'set', 'condition_value': {1: ['x', 'y'], 2: ['z']}},
+        }
+        metaData = {
+            'Grp': {'transformer_type': 'One-Hot'},
+            'Sex': {'transformer_type': 'Cat1'},
+            'Lab': {'transformer_type': 'LabelEncoding'},
+        }
+        transformer = Transformer(metaData=metaData)
+        transformed_df = transformer.transform(self.data_df)
+        transformed_df['Sex.value'] = transformed_df['Sex.value'].clip(0, 1) # include the upper bound of the last interval
+
+        # decoded parents of the transformed data give the same groups as the raw data
+        engine = ConditionEngine(parent_conditions)
+        groups = engine.evaluate(self.data_df)
+        groups_transformed = engine.evaluate(transformed_df, transformer_meta_dict=transformer.transformer_meta_dict)
+        for set_index in engine.set_index_list:
+            np.testing.assert_array_equal(groups_transformed[set_index], groups[set_index])
+
+
+if __name__ == '__main__':
+    if __package__ is None:
+        test = TestConditionEngineMethods()
+        test.setUp()
+        test.test_condition_engine()
+        test.test_condition_engine_transformed()
+    else:
+        unittest.main()
@@ -0,0 +1,123 @@
+import unittest
+import sys, os
+import numpy as np
+import pandas as pd
+
+# run this in cmd: python -m bdarpack.tests.test_gaussianCopula -v
+
+if __name__ == '__main__':
+    if __package__ is None:
+        dir_path = os.path.dirname(os.path.realpath(__file__))
+        par_dir = os.path.dirname(dir_path)
+        sys.path.insert(0, par_dir)
+        head, sep, tail = dir_path.partition('copula-tabular')
+        sys.path.insert(0, head+sep) # adding par_dir to system path
+
+
+from bdarpack.GaussianCopula import GaussianCopula
+from bdarpack import utils_ as ut_
+
+class TestGaussianCopulaMethods(unittest.TestCase):
+
+    def setUp(self):
+
+        # two independent groups of correlated variables, plus one independent variable
+        with ut_.random_seed(0):
+            size = 2000
+            a = np.random.normal(size=size)
+            b = 0.8 * a + 0.6 * np.random.normal(size=size)
+            c = np.random.normal(size=size)
+            d = 0.7 * c + 0.7 * np.random.normal(size=size)
+            e = np.random.normal(size=size)
+
+        self.data_df = pd.DataFrame({'a': a, 'b': b, 'c': c, 'd': d, 'e': e})
+        self.marginal_dist_dict = {var_name: ['gaussian'] for var_name in self.data_df.columns}
+
+    def test_block_diagonal(self):
+
+        for block_screen in [None, 'pearson']:
+            gc = GaussianCopula(block_diagonal=True, block_screen=block_screen, n_jobs=2)
+            with ut_.random_seed(1):
+                gc.fit(self.data_df, marginal_dist_dict=self.marginal_dist_dict)
+
+            self.assertEqual(gc.blocks, [['a', 'b'], ['c', 'd'], ['e']])
+            self.assertEqual(gc.correlation.loc['a', 'c'], 0)
+            self.assertEqual(gc.correlation.loc['b', 'e'], 0)
+            self.assertAlmostEqual(gc.correlation.loc['a', 'b'], 0.8, delta=0.05)
+
+            with ut_.random_seed(2):
+                syn_df = gc.sample(size=5000)
+            self.assertEqual(list(syn_df.columns), list(self.data_df.columns))
+            self.assertAlmostEqual(syn_df.corr().loc['c', 'd'], 0.7, delta=0.05)
+            self.assertAlmostEqual(syn_df.corr().loc['a', 'd'], 0, delta=0.05)
+
+            # conditional sampling only touches the blocks of the requested variables
+            with ut_.random_seed(3):
+                syn_df = gc.sample(size=5, conditions={'a': 1.0}, var_list=['b'])
+            self.assertEqual(list(syn_df.columns), ['b'])
+            self.assertEqual(len(syn_df), 5)
+
+    def test_nearest_correlation(self):
+
+        # indefinite "correlation" matrix
+        A = np.array([
+            [1.0, 0.9, -0.9],
+            [0.9, 1.0, 0.9],
+            [-0.9, 0.9, 1.0]
+        ])
+        X, L, info = ut_.makePD(A, return_details=True)
+        np.testing.assert_allclose(np.diag(X), 1)
+        np.testing.assert_allclose(L @ L.T, X, atol=1e-10)
+        self.assertTrue(info['converged'])
+        self.assertGreater(info['iterations'], 0)
+
+        # warm start from a previous projection reaches the same matrix in fewer iterations
+        A2 = A.copy()
+        A2[0, 1] = A2[1, 0] = 0.85
+        X2_cold, L2_cold, info_cold = ut_.makePD(A2, return_details=True)
+        X2_warm, L2_warm, info_warm = ut_.makePD(A2, return_details=True, warm_start=info)
+        np.testing.assert_allclose(X2_warm, X2_cold, atol=1e-6)
+        self.assertLessEqual(info_warm['iterations'], info_cold['iterations'])
+
+        # positive definite matrices are returned as they are
+        X3 = ut_.makePD(X)
+        np.testing.assert_array_equal(X3, X)
+
+        # the copula keeps the Cholesky factor of its correlation matrix
+        gc = GaussianCopula()
+        gc.fit(self.data_df, marginal_dist_dict=self.marginal_dist_dict)
+        np.testing.assert_allclose(gc.cholesky @ gc.cholesky.T, gc.correlation.to_numpy(), atol=1e-10)
+
+    def test_sobol_sampling(self):
+
+        gc = GaussianCopula()
+        gc.fit(self.data_df, marginal_dist_dict=self.marginal_dist_dict)
+
+        # chunked generation continues the Sobol sequence
+        with ut_.random_seed(4):
+            syn_full_df = gc.sample(size=1024, method='sobol')
+        gc.reset_sequence()
+        with ut_.random_seed(4):
+            syn_chunks_df = pd.concat([gc.sample(size=512, method='sobol'), gc.sample(size=512, method='sobol')], ignore_index=True)
+        pd.testing.assert_frame_equal(syn_full_df, syn_chunks_df)
+
+        # low-discrepancy points reproduce the (marginal) means more closely than random draws
+        with ut_.random_seed(5):
+            syn_random_df = gc.sample(size=1024, method='random')
+        mean_df = self.data_df.mean()
+        self.assertLess((syn_full_df.mean() - mean_df).abs().max(), (syn_random_df.mean() - mean_df).abs().max())
+        self.assertAlmostEqual(syn_full_df.corr().loc['a', 'b'], gc.correlation.loc['a', 'b'], delta=0.02)
+
+        with self.assertRaises(ValueError):
+            gc.sample(size=10, method='halton')
+
+
+if __name__ == '__main__':
+    if __package__ is None:
+        test = TestGaussianCopulaMethods()
+        test.setUp()
+        test.test_block_diagonal()
+        test.test_nearest_correlation()
+        test.test_sobol_sampling()
+    else:
+        unittest.main()
@@ -0,0 +1,142 @@
+import unittest
+import sys, os
+import numpy as np
+import pandas as pd
+import tempfile
+
+# run this in cmd: python -m bdarpack.tests.test_samplingPlan -v
+
+if __name__ == '__main__':
+    if __package__ is None:
+        dir_path = os.path.dirname(os.path.realpath(__file__))
+        par_dir = os.path.dirname(dir_path)
+        sys.path.insert(0, par_dir)
+        head, sep, tail = dir_path.partition('copula-tabular')
+        sys.path.insert(0, head+sep) # adding par_dir to system path
+
+
+from bdarpack.Transformer import Transformer
+from bdarpack.GaussianCopula import GaussianCopula
+from bdarpack.SamplingPlan import SamplingPlan
+from bdarpack.SamplerRuntime import SamplerRuntime
+from bdarpack import utils_ as ut_
+
+class TestSamplingPlanMethods(unittest.TestCase):
+
+    def setUp(self):
+
+        dtypes = ['bool', 'float', 'int', 'datetime', 'str', 'str', 'str', 'str']
+        nans = [0.2, 0.2, 0, 0.2, 0.2, 0.2, 0.2, 0]
+        with ut_.random_seed(0):
+            self.rawData_df = ut_.gen_randomData(dtypes=dtypes, nans=nans, size=300)
+        self.rawData_df['4_datetime'] = self.rawData_df['4_datetime'].astype('datetime64[ns]')
+
+        self.metaData = {
+            '5_str': {'transformer_type': 'One-Hot'},
+            '6_str': {'transformer_type': 'Cat1'},
+            '7_str': {'transformer_type': 'LabelEncoding'},
+            '8_str': {'transformer_type': 'Cat1Fuzzy'},
+            '4_datetime': {'datetime_format': '%Y-%m-%d %H:%M'},
+        }
+
+        self.transformer = Transformer(metaData=self.metaData)
+        with ut_.random_seed(1):
+            self.transformed_df = self.transformer.transform(self.rawData_df)
+
+        self.copula = GaussianCopula()
+        marginal_dist_dict = {var_name: ['gaussian', 'emp'] for var_name in self.transformed_df.columns}
+        self.copula.fit(self.transformed_df, marginal_dist_dict=marginal_dist_dict)
+
+    def test_sampling_plan(self):
+
+        plan = SamplingPlan(copula=self.copula, transformer=self.transformer)
+
+        for method in ['random', 'sobol']:
+
+            # same draws, through the DataFrame pipeline and through the compiled plan
+            self.copula.reset_sequence()
+            with ut_.random_seed(2):
+                reversed_df = self.transformer.reverse(self.copula.sample(size=500, method=method))
+            self.copula.reset_sequence()
+            with ut_.random_seed(2):
+                fused_df = plan.sample(size=500, method=method)
+
+            self.assertEqual(list(fused_df.columns), list(reversed_df.columns))
+            for col in reversed_df.columns:
+                pd.testing.assert_series_equal(
+                    fused_df[col], reversed_df[col],
+                    check_dtype=False, check_names=False, check_index_type=False
+                )
+
+        # nulls are restored
+        self.assertTrue(fused_df['2_float'].isna().any())
+        self.assertTrue(fused_df['5_str'].isna().any())
+
+        # 'One-Hot' categories are the fitted levels (not parsed from the field names)
+        decoder = next(decoder for decoder in plan.decoders if decoder['field'] == '5_str')
+        levels = self.transformer.transformer_meta_dict['5_str']['levels']
+        self.assertEqual(list(decoder['categories'][:len(levels)]), list(levels))
+        self.assertTrue(pd.isna(decoder['categories'][len(levels):]).all())
+
+        # Cat1 values outside [0,1] (and on the last upper bound) are decoded to the end categories
+        X = np.zeros((3, len(plan.var_names)))
+        j = plan.var_names.index('6_str.value')
+        X[:, j] = [-0.5, 1.0, 1.5]
+        decoded = plan.decode(X)['6_str']
+        categories = [np.nan if cat == 'IS_NULL' else cat for cat in self.transformer.transformer_meta_dict['6_str']['intervals']]
+        for value, expected in zip(decoded, [categories[0], categories[-1], categories[-1]]):
+            if pd.isna(expected):
+                self.assertTrue(pd.isna(value))
+            else:
+                self.assertEqual(value, expected)
+
+    def test_sampler_runtime(self):
+
+        plan = SamplingPlan(copula=self.copula, transformer=self.transformer)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            plan.export(tmp_dir)
+            sampler = SamplerRuntime(tmp_dir)
+
+            # tabulated marginals reproduce the plan for the same normal draws
+            norm_samples_np = np.random.default_rng(3).standard_normal((2000, len(plan.var_names)))
+            plan_df = plan.decode_normal(norm_samples_np)
+            runtime_df = sampler.decode_normal(norm_samples_np, as_frame=True)
+
+            self.assertEqual(list(runtime_df.columns), list(plan_df.columns))
+            for col in ['2_float', '3_int']:
+                valid = plan_df[col].notna().to_numpy() # (the tables replace nan values of the ppf at the extremes by the nearest value)
+                np.testing.assert_allclose(runtime_df[col].to_numpy(dtype=float)[valid], plan_df[col].to_numpy(dtype=float)[valid], rtol=1e-3, atol=1e-3)
+            for col in ['1_bool', '5_str', '6_str', '7_str', '8_str', '4_datetime']:
+                same = (runtime_df[col] == plan_df[col]).fillna(False) | (runtime_df[col].isna() & plan_df[col].isna())
+                self.assertGreater(same.mean(), 0.99)
+
+            # 'One-Hot' categories of the exported tables are the fitted levels
+            decoder = next(decoder for decoder in sampler.decoders if decoder['field'] == '5_str')
+            levels = self.transformer.transformer_meta_dict['5_str']['levels']
+            self.assertEqual(list(decoder['categories'][:len(levels)]), list(levels))
+
+            # same datetimes as the plan, truncated to the resolution of the format, or formatted and parsed back (time only)
+            with ut_.random_seed(5):
+                X = plan.copula.sample(size=500)[plan.var_names].to_numpy()
+            plan_decoder = next(decoder for decoder in plan.decoders if decoder['field'] == '4_datetime')
+            runtime_decoder = next(decoder for decoder in sampler.decoders if decoder['field'] == '4_datetime')
+            for datetime_format in ['%Y-%m-%d %H:%M', '%H:%M']:
+                plan_decoder['datetime_format'] = runtime_decoder['datetime_format'] = datetime_format
+                np.testing.assert_array_equal(sampler.decode(X)['4_datetime'], np.asarray(plan.decode(X)['4_datetime'], dtype='datetime64[ns]'))
+
+            # seeded samples are reproducible
+            output_1 = sampler.sample(size=100, seed=4)
+            output_2 = sampler.sample(size=100, seed=4)
+            np.testing.assert_array_equal(output_1['2_float'], output_2['2_float'])
+            self.assertEqual(len(output_1['5_str']), 100)
+
+
+if __name__ == '__main__':
+    if __package__ is None:
+        test = TestSamplingPlanMethods()
+        test.setUp()
+        test.test_sampling_plan()
+        test.test_sampler_runtime()
+    else:
+        unittest.main()
@@ -0,0 +1,341 @@
+import unittest
+import sys, os
+import types
+import glob
+import tempfile
+from unittest import mock
+import numpy as np
+import pandas as pd
+
+# run this in cmd: python -m bdarpack.tests.test_tabulaCopula -v
+
+if __name__ == '__main__':
+    if __package__ is None:
+        dir_path = os.path.dirname(os.path.realpath(__file__))
+        par_dir = os.path.dirname(dir_path)
+        sys.path.insert(0, par_dir)
+        head, sep, tail = dir_path.partition('copula-tabular')
+        sys.path.insert(0, head+sep) # adding par_dir to system path
+
+
+from bdarpack.TabulaCopula import TabulaCopula, load_TC, _ConditionalCopulaThunk
+from bdarpack.GaussianCopula import GaussianCopula
+from bdarpack import utils_ as ut_
+
+class TestTabulaCopulaMethods(unittest.TestCase):
+
+    def setUp(self):
+
+        # tiny training data and data dictionary, in a temporary directory
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        prefix_path = self.tmp_dir.name + "/"
+        os.makedirs(os.path.join(prefix_path, "trainData"))
+
+        rng = np.random.default_rng(0)
+        n = 300
+        grp = rng.choice(['A', 'B'], n)
+        age = rng.uniform(1, 90, n).round(1)
+        weight = 20 + 0.6 * age + rng.normal(0, 5, n) + (grp == 'B') * 10
+        data_df = pd.DataFrame({
+            'Grp': grp,
+            'Sex': rng.choice(['male', 'female'], n),
+            'Age': age,
+            'Weight': weight.round(2),
+        })
+        data_df.to_csv(os.path.join(prefix_path, "trainData", "tiny.csv"), index=False)
+
+        dict_df = ut_.build_basic_data_dictionary(varList=list(data_df.columns))
+        ut_.update_dataframe_rows(dict_df, refCol="NAME", listRows=['Grp', 'Sex'], col="TYPE", val="string")
+        dict_df.to_excel(os.path.join(prefix_path, "trainData", "tiny_dict.xlsx"), index=False, sheet_name='Sheet1')
+
+        self.definitions = types.SimpleNamespace(
+            PREFIX_PATH=prefix_path,
+            TRAIN_PATH="trainData",
+            SYN_PATH="synData",
+            PRIV_PATH="privacyMetrics",
+            TRAINXLSX="tiny.csv",
+            TRAINXLSX_SHEETNAME="Sheet1",
+            TRAINDICTXLSX="tiny_dict.xlsx",
+            TRAINDICTXLSX_SHEETNAME="Sheet1",
+            OUTPUT_GENERAL_PREFIX="TEST",
+            OUTPUT_TYPE_DATA='csv',
+        )
+
+        self.metaData = {
+            'Grp': {'transformer_type': 'One-Hot'},
+            'Sex': {'transformer_type': 'Cat1'},
+        }
+        self.conditionalSettings_dict = {
+            "set_1": {
+                "bool": True,
+                "parent_conditions": {
+                    "Grp": {"condition": "set", "condition_value": {1: ["A"], 2: ["B"]}}
+                },
+                "conditions_var": ["Age"],
+                "children": ['Weight']
+            }
+        }
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_syn_generate_cache(self):
+
+        cache_dir = os.path.join(self.tmp_dir.name, "cache")
+
+        def cached_stages():
+            return sorted(os.path.basename(filename).split('-')[0] for filename in glob.glob(os.path.join(cache_dir, "*.pkl")))
+
+        # without seed, only the deterministic transform stage is cached
+        tc = TabulaCopula(definitions=self.definitions, metaData_transformer=self.metaData, debug=False)
+        tc.syn_generate(sample_size=50, cache=cache_dir)
+        self.assertEqual(cached_stages(), ['transform'])
+
+        # noise of 'Cat1Fuzzy' fields: the transform stage is not cached without seed
+        fuzzy_metaData = dict(self.metaData, Sex={'transformer_type': 'Cat1Fuzzy'})
+        tc = TabulaCopula(definitions=self.definitions, metaData_transformer=fuzzy_metaData, debug=False)
+        tc.syn_generate(sample_size=50, cache=cache_dir)
+        self.assertEqual(cached_stages(), ['transform'])
+
+        # with seed, all stages are cached, and loaded by the next run (same output)
+        tc = TabulaCopula(definitions=self.definitions, metaData_transformer=self.metaData, conditionalSettings_dict=self.conditionalSettings_dict, debug=False)
+        tc.syn_generate(sample_size=50, cond_bool=True, cache=cache_dir, seed=1)
+        self.assertEqual(cached_stages(), ['fit', 'sample', 'transform', 'transform'])
+
+        cached_tc = TabulaCopula(definitions=self.definitions, metaData_transformer=self.metaData, conditionalSettings_dict=self.conditionalSettings_dict, debug=False)
+        cached_tc.syn_generate(sample_size=50, cond_bool=True, cache=cache_dir, seed=1)
+        self.assertEqual(len(cached_stages()), 4)
+        pd.testing.assert_frame_equal(cached_tc.reversed_conditional_df, tc.reversed_conditional_df)
+
+        # changed inputs are not loaded from the cache: new sample size, parallel fit, compact dtypes
+        cached_tc.syn_generate(sample_size=60, cond_bool=True, cache=cache_dir, seed=1)
+        self.assertEqual(cached_stages(), ['fit', 'sample', 'sample', 'transform', 'transform'])
+        cached_tc.syn_generate(sample_size=60, cond_bool=True, cache=cache_dir, seed=1, n_jobs=2)
+        self.assertEqual(cached_stages().count('fit'), 2)
+
+        compact_tc = TabulaCopula(definitions=self.definitions, metaData_transformer=self.metaData, compact_dtypes=True, debug=False)
+        compact_tc.syn_generate(sample_size=50, cache=cache_dir)
+        self.assertEqual(cached_stages().count('transform'), 3)
+
+    def test_model_round_trip(self):
+
+        # 'Age' >= 80 has fewer than min_rows rows (global copula), the other permutations are fitted lazily
+        conditionalSettings_dict = dict(self.conditionalSettings_dict)
+        conditionalSettings_dict["set_1"] = dict(conditionalSettings_dict["set_1"], parent_conditions={
+            "Grp": {"condition": "set", "condition_value": {1: ["A"], 2: ["B"]}},
+            "Age": {"condition": "range", "condition_value": {1: ["<80"], 2: [">=80"]}}
+        })
+        tc = TabulaCopula(definitions=self.definitions, metaData_transformer=self.metaData, conditionalSettings_dict=conditionalSettings_dict,
+            min_rows=20, intermediate_outputs='none', async_write=True, debug=False)
+        tc.transform()
+        tc.transform_conditional()
+        marginal_dist_dict = {var_name: ['gaussian'] for var_name in tc.transformed_df.columns}
+        tc.fit_gaussian_copula(marginal_dist_dict=marginal_dist_dict)
+        tc.fit_gaussian_copula_conditional(marginal_dist_dict=marginal_dist_dict, lazy=True)
+
+        sparse_set_index_list = tc.sparse_set_index_dict["set_1"]
+        self.assertEqual(len(sparse_set_index_list), 2)
+        cond_copula_dict = tc.storage['cond_copula']["set_1"]
+        self.assertEqual(len(cond_copula_dict), 4)
+        for merged_set_index, cp in cond_copula_dict.items():
+            if merged_set_index in sparse_set_index_list:
+                self.assertIs(cp, tc.storage['copula'])
+            else:
+                self.assertIsInstance(cp, _ConditionalCopulaThunk)
+
+        # saving the model fits the pending thunks: a fitted copula for every permutation
+        self.assertTrue(tc.save(mode='model'))
+        for cp in tc.storage['cond_copula']["set_1"].values():
+            self.assertIsInstance(cp, GaussianCopula)
+            self.assertTrue(cp.fitted)
+
+        # (load_TC reads the output filenames relative to the directory of the script)
+        with mock.patch.object(sys, 'argv', [os.path.join(self.tmp_dir.name, "script.py")]):
+            model = load_TC(self.definitions, mode='model')
+        self.assertIsNone(model.train_df)
+
+        # the loaded model samples the same as the saved instance
+        for obj in (tc, model):
+            with ut_.random_seed(1):
+                obj.sample_gaussian_copula(sample_size=100)
+                obj.sample_gaussian_copula_conditional()
+                obj.reverse_transform()
+        pd.testing.assert_frame_equal(model.reversed_df, tc.reversed_df)
+        pd.testing.assert_frame_equal(model.reversed_conditional_df, tc.reversed_conditional_df)
+
+    def test_syn_generate_memory_lean(self):
+
+        # frames spilled by memory_lean (and outputs not written) give the same synthetic data
+        tc = TabulaCopula(definitions=self.definitions, metaData_transformer=self.metaData, debug=False)
+        with mock.patch.object(ut_, 'file_checksum', side_effect=AssertionError("checksum computed without cache")):
+            tc.syn_generate(sample_size=50, seed=1)
+
+        lean_tc = TabulaCopula(definitions=self.definitions, metaData_transformer=self.metaData, output_general_prefix="LEAN",
+            intermediate_outputs='final', memory_lean=True, debug=False)
+        lean_tc.syn_generate(sample_size=50, seed=1)
+
+        self.assertIsNone(lean_tc.train_df)
+        self.assertIsNone(lean_tc.syn_samples_df)
+        self.assertFalse(os.path.exists(lean_tc.output_filenames['transformed']))
+        pd.testing.assert_frame_equal(lean_tc.reversed_df, tc.reversed_df)
+
+        # the outputs kept in memory are released with the spilled frames, and reloaded to be written
+        self.assertEqual(lean_tc.pending_outputs[lean_tc.output_filenames['transformed']], 'transformed_df')
+        self.assertIn(lean_tc.output_filenames['transformed'], lean_tc.materialize_outputs())
+        self.assertEqual(len(pd.read_csv(lean_tc.output_filenames['transformed'])), len(tc.transformed_df))
+
+
+    def test_min_rows_fallback(self):
+
+        # all permutations have fewer than min_rows rows, and no conditions_var: the children are drawn from the global copula given the parent fields
+        conditionalSettings_dict = {
+            "set_1": {
+                "bool": True,
+                "parent_conditions": {
+                    "Grp": {"condition": "set", "condition_value": {1: ["A"], 2: ["B"]}}
+                },
+                "children": ['Weight']
+            }
+        }
+        tc = TabulaCopula(definitions=self.definitions, metaData_transformer=self.metaData, conditionalSettings_dict=conditionalSettings_dict,
+            min_rows=1000, intermediate_outputs='none', debug=False)
+        tc.transform()
+        tc.transform_conditional()
+        marginal_dist_dict = {var_name: ['gaussian'] for var_name in tc.transformed_df.columns}
+        tc.fit_gaussian_copula(marginal_dist_dict=marginal_dist_dict)
+        tc.fit_gaussian_copula_conditional(marginal_dist_dict=marginal_dist_dict)
+        self.assertEqual(tc.sparse_set_index_dict["set_1"], ['1', '2'])
+
+        with ut_.random_seed(1):
+            tc.sample_gaussian_copula(sample_size=400)
+            tc.sample_gaussian_copula_conditional()
+            tc.reverse_transform()
+
+        # 'Weight' is about 10 higher in group 'B' (training data)
+        reversed_df = tc.reversed_conditional_df
+        weight_means = reversed_df.groupby(reversed_df['Grp'].astype(str))['Weight'].mean()
+        self.assertGreater(weight_means['B'] - weight_means['A'], 5)
+
+
+    def test_read_compact_dtypes(self):
+
+        # only the filtered variables (and the variables of the conditional sets) are read
+        tc = TabulaCopula(definitions=self.definitions, metaData_transformer=self.metaData, conditionalSettings_dict=self.conditionalSettings_dict,
+            var_list_filter=['Age', 'Weight'], debug=False)
+        self.assertEqual(list(tc.train_df.columns), ['Grp', 'Age', 'Weight'])
+
+        # numerical variables read as float32, same transformed data (up to float32 precision)
+        compact_tc = TabulaCopula(definitions=self.definitions, metaData_transformer=self.metaData, compact_dtypes='float32', debug=False)
+        self.assertEqual(str(compact_tc.train_df['Weight'].dtype), 'float32')
+        self.assertEqual(str(compact_tc.train_df['Age'].dtype), 'float32')
+        tc = TabulaCopula(definitions=self.definitions, metaData_transformer=self.metaData, debug=False)
+        pd.testing.assert_frame_equal(compact_tc.transform(), tc.transform(), check_exact=False, rtol=1e-6)
+
+        # types of the data dictionary are normalised ("String "), also when the dtypes are not applied while reading (xlsx)
+        train_path = os.path.join(self.tmp_dir.name, "trainData")
+        pd.read_csv(os.path.join(train_path, "tiny.csv")).to_excel(os.path.join(train_path, "tiny.xlsx"), index=False, sheet_name='Sheet1')
+        dict_df = pd.read_excel(os.path.join(train_path, "tiny_dict.xlsx"))
+        dict_df.loc[dict_df['NAME'] == 'Sex', ['TYPE', 'CODINGS']] = ["String ", "male; female"]
+        dict_df.to_excel(os.path.join(train_path, "tiny_dict.xlsx"), index=False, sheet_name='Sheet1')
+        self.definitions.TRAINXLSX = "tiny.xlsx"
+        compact_tc = TabulaCopula(definitions=self.definitions, metaData_transformer=self.metaData, compact_dtypes=True, debug=False)
+        self.assertEqual(str(compact_tc.train_df['Sex'].dtype), 'category')
+
+
+    def test_lazy_prefetch_seed(self):
+
+        # the thunks fitted in background threads (block screen on a subsample) draw from their own generators:
+        # same copulas and samples with or without prefetch, and the global random state is not used by the fits
+        copula_options = {'block_diagonal': True, 'block_screen': 'pearson', 'block_screen_size': 20}
+        reversed_dfs = []
+        for prefetch in [False, 2, 2]:
+            tc = TabulaCopula(definitions=self.definitions, metaData_transformer=self.metaData, conditionalSettings_dict=self.conditionalSettings_dict,
+                copula_options=copula_options, intermediate_outputs='none', debug=False)
+            tc.transform()
+            tc.transform_conditional()
+            marginal_dist_dict = {var_name: ['gaussian'] for var_name in tc.transformed_df.columns}
+            with ut_.random_seed(1):
+                tc.fit_gaussian_copula(marginal_dist_dict=marginal_dist_dict)
+                tc.fit_gaussian_copula_conditional(marginal_dist_dict=marginal_dist_dict, lazy=True, prefetch=prefetch)
+                tc.sample_gaussian_copula(sample_size=100)
+                tc.sample_gaussian_copula_conditional()
+            tc.resolve_conditional_copulas()
+            tc.reverse_transform()
+            reversed_dfs.append(tc.reversed_conditional_df)
+
+        pd.testing.assert_frame_equal(reversed_dfs[1], reversed_dfs[0])
+        pd.testing.assert_frame_equal(reversed_dfs[2], reversed_dfs[0])
+
+    @unittest.skipUnless(ut_.HAVE_PYARROW, "pyarrow is not installed")
+    def test_file_types_round_trip(self):
+
+        data_df = pd.read_csv(os.path.join(self.tmp_dir.name, "trainData", "tiny.csv"))
+        data_df['Sex'] = data_df['Sex'].astype('category')
+        parquet_filename = os.path.join(self.tmp_dir.name, "tiny.parquet")
+        feather_filename = os.path.join(self.tmp_dir.name, "tiny.feather")
+
+        # parquet keeps the index and the dtypes of the saved columns
+        indexed_df = data_df.set_index(pd.Index(range(100, 100 + len(data_df)), name='id'))
+        ut_.save_df_as_parquet(indexed_df, parquet_filename)
+        pd.testing.assert_frame_equal(ut_.read_df_from_file(parquet_filename), indexed_df)
+
+        # feather does not store the index: saved as a column with index=True
+        ut_.save_df_as_feather(data_df, feather_filename, index=False)
+        pd.testing.assert_frame_equal(ut_.read_df_from_file(feather_filename), data_df)
+        ut_.save_df_as_feather(indexed_df, feather_filename)
+        self.assertEqual(list(ut_.read_df_from_file(feather_filename)['id']), list(indexed_df.index))
+
+        # column projection, in the requested order
+        for filename in [parquet_filename, feather_filename]:
+            self.assertEqual(list(ut_.read_df_from_file(filename, columns=['Weight', 'Age']).columns), ['Weight', 'Age'])
+
+    @unittest.skipUnless(ut_.HAVE_PYARROW, "pyarrow is not installed")
+    def test_syn_generate_parquet(self):
+
+        # parquet training data and outputs, same synthetic data as csv
+        train_path = os.path.join(self.tmp_dir.name, "trainData")
+        ut_.save_df_as_parquet(pd.read_csv(os.path.join(train_path, "tiny.csv")), os.path.join(train_path, "tiny.parquet"), index=False)
+        tc = TabulaCopula(definitions=self.definitions, metaData_transformer=self.metaData, debug=False)
+        tc.syn_generate(sample_size=50, seed=1)
+
+        self.definitions.TRAINXLSX = "tiny.parquet"
+        self.definitions.OUTPUT_TYPE_DATA = 'parquet'
+        parquet_tc = TabulaCopula(definitions=self.definitions, metaData_transformer=self.metaData, output_general_prefix="PARQUET", debug=False)
+        parquet_tc.syn_generate(sample_size=50, seed=1)
+        pd.testing.assert_frame_equal(parquet_tc.reversed_df, tc.reversed_df)
+
+        reversed_filename = parquet_tc.output_filenames['reversed_samples']
+        self.assertEqual(ut_.get_extension(reversed_filename), 'parquet')
+        pd.testing.assert_frame_equal(ut_.read_df_from_file(reversed_filename), parquet_tc.reversed_df, check_dtype=False)
+
+
+if __name__ == '__main__':
+    if __package__ is None:
+        test = TestTabulaCopulaMethods()
+        test.setUp()
+        test.test_syn_generate_cache()
+        test.tearDown()
+        test.setUp()
+        test.test_model_round_trip()
+        test.tearDown()
+        test.setUp()
+        test.test_syn_generate_memory_lean()
+        test.tearDown()
+        test.setUp()
+        test.test_min_rows_fallback()
+        test.tearDown()
+        test.setUp()
+        test.test_read_compact_dtypes()
+        test.tearDown()
+        test.setUp()
+        test.test_lazy_prefetch_seed()
+        test.tearDown()
+        if ut_.HAVE_PYARROW:
+            test.setUp()
+            test.test_file_types_round_trip()
+            test.tearDown()
+            test.setUp()
+            test.test_syn_generate_parquet()
+            test.tearDown()
+    else:
+        unittest.main()
@@ -1,5 +1,7 @@
 import unittest
 import pickle
+import warnings
+import pandas as pd
 import sys, os
 
 # run this in cmd: python -m mz.tests.test_transformer -v
@@ -14,6 +16,7 @@ if __name__ == '__main__':
 
 
 from bdarpack.Transformer import Transformer
+from bdarpack.GaussianCopula import GaussianCopula
 from bdarpack import utils_ as ut_
 
 class TestTransformerMethods(unittest.TestCase):
@@ -116,12 +119,234 @@ class TestTransformerMethods(unittest.TestCase):
                 for index, value in gdtruth_col.items():
                     self.assertEqual(value, tr_col[index])
 
+    def test_transformer_partial_fit(self):
+
+        metadata = {
+            '2_float': {
+                'null': 'mean'
+            },
+            '3_int': {
+                'null': 'mode'
+            },
+            '4_datetime': {
+                'null': 'mean',
+                'datetime_format': f"%Y-%m-%d %H:%M:%S"
+            },
+            '5_str': {
+                'transformer_type': 'Cat1'
+            },
+            '7_str': {
+                'transformer_type': 'One-Hot'
+            }
+        }
+        var_list = ['1_bool', '2_float', '3_int', '4_datetime', '5_str', '7_str']
+
+        transformer = Transformer(metaData=metadata, var_list=list(var_list), debug=False)
+        numeric_df = transformer.fit_transform(self.rawData_1_df)
+
+        # fitting chunk by chunk gives the same transformer as fitting the full data
+        chunks = [self.rawData_1_df.iloc[start:start+5] for start in range(0, len(self.rawData_1_df), 5)]
+        chunk_transformer = Transformer(metaData=metadata, var_list=list(var_list), debug=False)
+        for chunk in chunks:
+            chunk_transformer.partial_fit(chunk)
+
+        for var in var_list:
+            self.assertEqual(chunk_transformer.transformer_meta_dict[var]['output_fields'], transformer.transformer_meta_dict[var]['output_fields'])
+        self.assertEqual(chunk_transformer.transformer_meta_dict['5_str']['intervals'], transformer.transformer_meta_dict['5_str']['intervals'])
+        self.assertEqual(chunk_transformer.transformer_meta_dict['4_datetime']['common_divider'], transformer.transformer_meta_dict['4_datetime']['common_divider'])
+
+        # transforming a chunk (a slice of the data) does not write into it
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', pd.errors.SettingWithCopyWarning)
+            chunk_numeric_df = pd.concat([chunk_transformer.transform(chunk) for chunk in chunks])
+        pd.testing.assert_frame_equal(chunks[0], self.rawData_1_df.iloc[0:5]) # (nulls not filled in the data)
+        pd.testing.assert_frame_equal(chunk_numeric_df, numeric_df, check_exact=False)
+
+        # reversing in chunks
+        pd.testing.assert_frame_equal(transformer.reverse(numeric_df, chunksize=4), transformer.reverse(numeric_df))
+
+        # 'median' cannot be fitted chunk by chunk
+        median_transformer = Transformer(metaData={'2_float': {'null': 'median'}}, var_list=['2_float'], debug=False)
+        median_transformer.partial_fit(chunks[0])
+        with self.assertRaises(ValueError):
+            median_transformer.partial_fit(chunks[1])
+
+    def test_transformer_onehot_policy(self):
+
+        metadata = {
+            '5_str': {
+                'transformer_type': 'One-Hot'
+            },
+            '7_str': {
+                'transformer_type': 'One-Hot',
+                'onehot_max_levels': 2
+            }
+        }
+        var_list = ['2_float', '5_str', '7_str']
+
+        # '7_str' has more than 2 categories: transformed with the fallback
+        transformer = Transformer(metaData=metadata, var_list=list(var_list), onehot_dtype='uint8', debug=False)
+        numeric_df = transformer.fit_transform(self.rawData_1_df)
+        self.assertEqual(transformer.transformer_meta_dict['7_str']['transformer_type'], 'Cat1')
+        self.assertEqual(transformer.transformer_meta_dict['5_str']['transformer_type'], 'One-Hot')
+
+        # compact 'One-Hot' fields, same reverse as the float fields
+        onehot_fields = transformer.transformer_meta_dict['5_str']['levels']
+        for level in onehot_fields:
+            self.assertEqual(str(numeric_df[f"5_str.{level}"].dtype), 'uint8')
+        float_transformer = Transformer(metaData=metadata, var_list=list(var_list), debug=False)
+        float_numeric_df = float_transformer.fit_transform(self.rawData_1_df)
+        self.assertEqual(list(numeric_df.columns), list(float_numeric_df.columns))
+        pd.testing.assert_frame_equal(transformer.reverse(numeric_df), float_transformer.reverse(float_numeric_df))
+
+        report_df = transformer.report_width()
+        self.assertEqual(report_df.loc['TOTAL', 'n_fields'], len(numeric_df.columns))
+
+    def test_transformer_null_policy(self):
+
+        data_df = self.rawData_1_df[['2_float', '3_int']].copy()
+        data_df['9_float'] = data_df['2_float'] * 2 # missing together with '2_float'
+        var_list = ['2_float', '3_int', '9_float']
+
+        transformer = Transformer(var_list=list(var_list), debug=False)
+        numeric_df = transformer.fit_transform(data_df)
+
+        # '9_float' shares the null indicator field of '2_float'
+        merge_transformer = Transformer(var_list=list(var_list), null_merge=True, debug=False)
+        merge_numeric_df = merge_transformer.fit_transform(data_df)
+        self.assertEqual(len(merge_numeric_df.columns), len(numeric_df.columns) - 1)
+        self.assertEqual(merge_transformer.transformer_meta_dict['9_float']['null']['null_field'], '2_float.is_null')
+
+        # no null indicator field with sentinels
+        sentinel_transformer = Transformer(var_list=list(var_list), null_sentinel=True, debug=False)
+        sentinel_numeric_df = sentinel_transformer.fit_transform(data_df)
+        self.assertFalse(any(col.endswith('.is_null') for col in sentinel_numeric_df.columns))
+
+        # nulls are restored
+        for tr, tr_numeric_df in [(merge_transformer, merge_numeric_df), (sentinel_transformer, sentinel_numeric_df)]:
+            reversed_df = tr.reverse(tr_numeric_df)
+            for col in var_list:
+                self.assertEqual(list(reversed_df[col].isnull()), list(data_df[col].isnull()))
+
+    def test_transformer_onehot_reverse(self):
+
+        data_df = pd.DataFrame({'grp': pd.Series(['v1.0', 'v2.1', None, 'v1.0', 'v10.2'], dtype='string')})
+        transformer = Transformer(metaData={'grp': {'transformer_type': 'One-Hot'}}, debug=False)
+        numeric_df = transformer.fit_transform(data_df)
+
+        # categories with dots, reversed to a categorical column
+        reversed_df = transformer.reverse(numeric_df)
+        self.assertIsInstance(reversed_df['grp'].dtype, pd.CategoricalDtype)
+        self.assertEqual(list(reversed_df['grp'].astype(object).fillna('NULL')), ['v1.0', 'v2.1', 'NULL', 'v1.0', 'v10.2'])
+
+        # fields in any order
+        reordered_df = transformer.reverse(numeric_df[numeric_df.columns[::-1]])
+        pd.testing.assert_series_equal(reordered_df['grp'], reversed_df['grp'])
+
+    def test_transformer_n_jobs(self):
+
+        metadata = {
+            '4_datetime': {
+                'null': 'mean',
+                'datetime_format': f"%Y-%m-%d %H:%M:%S"
+            },
+            '5_str': {
+                'transformer_type': 'Cat1'
+            },
+            '7_str': {
+                'transformer_type': 'One-Hot'
+            },
+            '8_str': {
+                'transformer_type': 'LabelEncoding'
+            }
+        }
+        var_list = ['1_bool', '2_float', '3_int', '4_datetime', '5_str', '7_str', '8_str']
+
+        # fields transformed and reversed in parallel, assembled in the same order
+        transformer = Transformer(metaData=metadata, var_list=list(var_list), debug=False)
+        numeric_df = transformer.fit_transform(self.rawData_1_df)
+        parallel_transformer = Transformer(metaData=metadata, var_list=list(var_list), n_jobs=4, debug=False)
+        data_df = self.rawData_1_df.iloc[:len(self.rawData_1_df)] # (slice of the data, not written into by the threads)
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', pd.errors.SettingWithCopyWarning)
+            parallel_numeric_df = parallel_transformer.fit_transform(data_df)
+        pd.testing.assert_frame_equal(data_df, self.rawData_1_df)
+
+        pd.testing.assert_frame_equal(parallel_numeric_df, numeric_df)
+        pd.testing.assert_frame_equal(parallel_transformer.reverse(numeric_df), transformer.reverse(numeric_df))
+
+    def test_transformer_compact_dtypes(self):
+
+        metadata = {
+            '5_str': {
+                'transformer_type': 'Cat1'
+            },
+            '7_str': {
+                'transformer_type': 'One-Hot'
+            }
+        }
+        var_list = ['2_float', '3_int', '5_str', '7_str']
+
+        data_df = self.rawData_1_df[var_list].copy()
+        data_df['3_int'] = data_df['3_int'].astype('Int64')
+
+        # data read with compact dtypes (ref. ut_.get_compact_dtypes, ut_.downcast_numeric)
+        compact_df = ut_.downcast_numeric(data_df, columns=['2_float', '3_int'], float_dtype='Float32')
+        compact_df = compact_df.astype({'5_str': 'category', '7_str': 'category'})
+        self.assertEqual(str(compact_df['3_int'].dtype), 'Int8')
+        self.assertEqual(str(data_df['3_int'].dtype), 'Int64') # (input not modified)
+
+        transformer = Transformer(metaData=metadata, var_list=list(var_list), debug=False)
+        numeric_df = transformer.fit_transform(data_df.astype({'2_float': 'Float32'}))
+        compact_transformer = Transformer(metaData=metadata, var_list=list(var_list), debug=False)
+        compact_numeric_df = compact_transformer.fit_transform(compact_df)
+
+        # same fields and values, the compact dtypes are widened
+        pd.testing.assert_frame_equal(compact_numeric_df, numeric_df)
+        self.assertEqual(compact_transformer.transformer_meta_dict['3_int']['original_dtype'], 'Int64')
+        self.assertEqual(compact_transformer.transformer_meta_dict['5_str']['original_dtype'], 'string')
+
+    def test_transformer_onehot_copula(self):
+
+        metadata = {
+            '5_str': {
+                'transformer_type': 'One-Hot'
+            }
+        }
+        var_list = ['2_float', '5_str']
+        data_df = self.rawData_1_df[var_list]
+
+        # compact 'One-Hot' fields are fitted and sampled as the float fields (the kernel density estimate does not take sparse columns)
+        syn_dfs = {}
+        for onehot_dtype in [None, 'uint8', 'sparse']:
+            transformer = Transformer(metaData=metadata, var_list=list(var_list), onehot_dtype=onehot_dtype, debug=False)
+            numeric_df = transformer.fit_transform(data_df)
+            marginal_dist_dict = {field: ['gaussian'] for field in numeric_df.columns}
+            marginal_dist_dict['5_str.A'] = ['gaussian_kde']
+            gc = GaussianCopula()
+            with ut_.random_seed(0), warnings.catch_warnings():
+                warnings.simplefilter('ignore', DeprecationWarning) # (scipy quad in the kernel density cdf)
+                gc.fit(numeric_df, marginal_dist_dict=marginal_dist_dict)
+                syn_numeric_df = gc.sample(size=50)
+            syn_dfs[onehot_dtype] = transformer.reverse(syn_numeric_df)
+
+        self.assertTrue(set(syn_dfs[None]['5_str'].dropna()).issubset(set(data_df['5_str'].dropna())))
+        pd.testing.assert_frame_equal(syn_dfs['uint8'], syn_dfs[None])
+        pd.testing.assert_frame_equal(syn_dfs['sparse'], syn_dfs[None])
+
 
 if __name__ == '__main__':
     if __package__ is None:
         test = TestTransformerMethods()
         test.setUp()
         test.test_transformer()
+        test.test_transformer_partial_fit()
+        test.test_transformer_onehot_policy()
+        test.test_transformer_null_policy()
+        test.test_transformer_onehot_reverse()
+        test.test_transformer_n_jobs()
+        test.test_transformer_compact_dtypes()
+        test.test_transformer_onehot_copula()
 
         test.tearDown()
     else:
@@ -4,10 +4,18 @@ from scipy import stats
 import os
 import platform
 import contextlib
+import hashlib
+import pickle
 import copy
 import math
 import re
 
+try:
+    import pyarrow.feather as pa_feather
+    HAVE_PYARROW = True
+except ImportError:
+    HAVE_PYARROW = False
+
 
 EPSILON = np.finfo(np.float32).eps
 OS_TYPE = platform.system()
@@ -383,6 +391,79 @@ def clean_filename_str(filename):
 
     return filename
 
+def file_checksum(filename, chunk_size=2**20):
+    """sha256 checksum of the content of a file (read in chunks)."""
+
+    h = hashlib.sha256()
+    with open(filename, 'rb') as fl:
+        for chunk in iter(lambda: fl.read(chunk_size), b''):
+            h.update(chunk)
+
+    return h.hexdigest()
+
+def hash_inputs(*inputs):
+    """sha256 hash of the repr of the inputs (e.g. dictionaries of settings, file checksums), used as the key of cached results."""
+
+    return hashlib.sha256(repr(inputs).encode('utf-8')).hexdigest()
+
+# GENERAL FUNCTIONS FOR PICKLES
+class _NpyPickler(pickle.Pickler):
+    """Pickler saving the large numeric arrays of an object as separate .npy files (referenced by filename in the pickle)."""
+
+    def __init__(self, fl, array_dir, min_size):
+        super().__init__(fl, protocol=pickle.HIGHEST_PROTOCOL)
+        self.array_dir = array_dir
+        self.min_size = min_size
+        self.saved_arrays = {} # filename and array (kept alive while pickling), for each id of saved array
+
+    def persistent_id(self, obj):
+        if not isinstance(obj, np.ndarray) or obj.dtype.hasobject or obj.size < self.min_size:
+            return None
+
+        if id(obj) not in self.saved_arrays:
+            array_filename = f"{len(self.saved_arrays)}.npy"
+            np.save(os.path.join(self.array_dir, array_filename), obj)
+            self.saved_arrays[id(obj)] = (array_filename, obj)
+
+        return self.saved_arrays[id(obj)][0]
+
+class _NpyUnpickler(pickle.Unpickler):
+    """Unpickler loading the arrays saved by _NpyPickler (memory-mapped if mmap_mode is given)."""
+
+    def __init__(self, fl, array_dir, mmap_mode):
+        super().__init__(fl)
+        self.array_dir = array_dir
+        self.mmap_mode = mmap_mode
+
+    def persistent_load(self, pid):
+        return np.load(os.path.join(self.array_dir, pid), mmap_mode=self.mmap_mode)
+
+def save_pickle_npy(obj, filename, min_size=1024):
+    """
+    Save obj to a pickle file, with the numeric arrays of at least min_size elements saved as .npy files (in the folder <filename without extension>_arrays), e.g. to be memory-mapped by load_pickle_npy.
+    Returns:
+        n_arrays (int): no. of arrays saved as .npy files.
+    """
+
+    array_dir = os.path.splitext(filename)[0] + "_arrays"
+    os.makedirs(array_dir, exist_ok=True)
+    for fl_name in os.listdir(array_dir): # (arrays of a previous save)
+        if fl_name.endswith('.npy'):
+            os.remove(os.path.join(array_dir, fl_name))
+
+    with open(filename, 'wb') as fl:
+        pickler = _NpyPickler(fl, array_dir, min_size)
+        pickler.dump(obj)
+
+    return len(pickler.saved_arrays)
+
+def load_pickle_npy(filename, mmap_mode='r'):
+    """Load an object saved by save_pickle_npy. The .npy arrays are memory-mapped (read-only, pages loaded on first access) if mmap_mode is 'r' (default), or read into memory if mmap_mode is None."""
+
+    array_dir = os.path.splitext(filename)[0] + "_arrays"
+    with open(filename, 'rb') as fl:
+        return _NpyUnpickler(fl, array_dir, mmap_mode).load()
+
 
 # GENERAL FUNCTIONS FOR EXCELS
 def get_worksheet_names(file_name):
@@ -447,11 +528,118 @@ def save_df_as_csv(df, filename, index=True):
     df.to_csv(filename, index=index, header=True)
 
 def save_df_as_excel(df, excel_file_name, sheet_name='Sheet1', index=True):
-    try:
-        with pd.ExcelWriter(path=excel_file_name, engine='auto', mode='w') as writer:
-            df.to_excel(writer, sheet_name=sheet_name, index=index)
-    except Exception as e:
-        print(f"Error writing to Excel File: {e}")
+    # write errors are raised (e.g. collected by AsyncWriter and raised by flush)
+    with pd.ExcelWriter(path=excel_file_name, engine='auto', mode='w') as writer:
+        df.to_excel(writer, sheet_name=sheet_name, index=index)
+
+def save_df_as_parquet(df, filename, index=True):
+    _check_pyarrow('parquet')
+    df.to_parquet(filename, engine='pyarrow', index=index)
+
+def save_df_as_feather(df, filename, index=True):
+    # feather files do not store the index: saved as column(s) if index is True
+    _check_pyarrow('feather')
+    df = df.reset_index(drop=not index)
+    df.columns = [str(col) for col in df.columns]
+    df.to_feather(filename)
+
+def read_df_from_file(filename, columns=None, sheetname=None, csv_options=None):
+    """
+    Reads a dataframe from file based on the file extension (csv, xlsx, parquet, feather).
+    Inputs:
+        filename (str): name of the file.
+        columns (list): columns to read (column projection). Default is None (all columns).
+        sheetname (str): name of the sheet, only applicable for xlsx. Default is None (first sheet).
+        csv_options (dict): keyword arguments of pd.read_csv, e.g. {'na_values': None, 'keep_default_na': False}. Default is None.
+    Returns:
+        df (pd.DataFrame)
+    Note:
+        parquet and feather files keep the dtypes of the saved columns, and are memory-mapped when read (through pyarrow).
+    """
+
+    file_ext = get_extension(filename)
+
+    if (file_ext=='csv'):
+        csv_options = {} if csv_options is None else csv_options
+        df = pd.read_csv(filename, usecols=columns, **csv_options)
+    elif (file_ext=='xlsx'):
+        df = pd.read_excel(filename, sheet_name=0 if sheetname is None else sheetname, usecols=columns)
+    elif (file_ext=='parquet'):
+        _check_pyarrow('parquet')
+        df = pd.read_parquet(filename, engine='pyarrow', columns=columns, memory_map=True)
+    elif (file_ext=='feather'):
+        _check_pyarrow('feather')
+        df = pa_feather.read_table(filename, columns=columns, memory_map=True).to_pandas(split_blocks=True)
+    else:
+        raise ValueError(f"Not able to read data from file for extension type: {file_ext}")
+
+    if columns is not None:
+        df = df[[col for col in columns if col in df.columns]]
+
+    return df
+
+def _check_pyarrow(file_ext):
+    if not HAVE_PYARROW:
+        raise ImportError(f"pyarrow is required for the {file_ext} file type. Please install pyarrow (pip install pyarrow).")
+
+def get_compact_dtypes(dict_df, varname_col="NAME", vartype_col="TYPE", codings_col="CODINGS", columns=None, coded_string_dtype='category'):
+    """
+    dtypes of the 'string' variables of a data dictionary, to read the data with (e.g. pd.read_csv(dtype=...)) instead of python string objects.
+    Variables with codings (categories delimited by ';', e.g. "male; female") are read as coded_string_dtype, the other 'string' variables as Arrow strings ('string[pyarrow]', only if pyarrow is installed: python-backed strings take as much memory as objects).
+    Numerical variables are not set, as their range is only known from the data (ref. downcast_numeric).
+    Inputs:
+        dict_df (pd.DataFrame): data dictionary.
+        varname_col, vartype_col, codings_col (str): columns of the data dictionary with the names, types and codings of the variables.
+        columns (list): variables of the data (the other variables of the dictionary are left out). Default is None (all variables).
+        coded_string_dtype (str): dtype of the variables with codings, e.g. 'category', or None (as the other 'string' variables) if the values are updated (e.g. CleanData). Default is 'category'.
+    Returns:
+        dtype_dict (dict): dtype of each 'string' variable (variables left as python objects are not included).
+    """
+
+    string_dtype = 'string[pyarrow]' if HAVE_PYARROW else None
+
+    dtype_dict = {}
+    for index, row in dict_df.iterrows():
+        var_name = row[varname_col]
+        if columns is not None and var_name not in columns:
+            continue
+        if str(row[vartype_col]).strip().lower() != 'string':
+            continue
+        codings = row[codings_col] if codings_col in dict_df.columns else np.nan
+        var_dtype = coded_string_dtype if (';' in str(codings) and coded_string_dtype is not None) else string_dtype
+        if var_dtype is not None:
+            dtype_dict[var_name] = var_dtype
+
+    return dtype_dict
+
+def downcast_numeric(df, columns=None, float_dtype=None):
+    """
+    Downcast the integer columns of df to the smallest nullable integer dtype holding their values ('Int8', 'Int16', 'Int32' or 'Int64'), and the float columns to float_dtype if given (e.g. 'float32', with less precision).
+    Columns of other dtypes (e.g. numerical variables read as strings) are left as they are.
+    Inputs:
+        df (pd.DataFrame): data, not modified.
+        columns (list): columns to downcast. Default is None (all columns).
+        float_dtype (str): dtype of the float columns. Default is None (left as they are).
+    Returns:
+        df (pd.DataFrame): new frame with the downcast columns.
+    """
+
+    columns = list(df.columns) if columns is None else [col for col in columns if col in df.columns]
+    downcast_dtypes = {}
+    for col in columns:
+        col_dtype = df[col].dtype
+        if pd.api.types.is_integer_dtype(col_dtype):
+            col_min, col_max = df[col].min(), df[col].max()
+            for int_dtype in ['Int8', 'Int16', 'Int32', 'Int64']:
+                int_info = np.iinfo(int_dtype.lower())
+                if pd.isna(col_min) or (int_info.min <= col_min and col_max <= int_info.max):
+                    if str(col_dtype) != int_dtype:
+                        downcast_dtypes[col] = int_dtype
+                    break
+        elif float_dtype is not None and pd.api.types.is_float_dtype(col_dtype):
+            downcast_dtypes[col] = float_dtype
+
+    return df.astype(downcast_dtypes) if downcast_dtypes else df.copy(deep=False)
 
 def save_df_to_file(df, filename, sheetname='Sheet1', index=True):
 
@@ -465,6 +653,10 @@ def save_df_to_file(df, filename, sheetname='Sheet1', index=True):
             sheet_name=sheetname, 
             index=index
         )
+    elif (file_ext=='parquet'):
+        save_df_as_parquet(df, filename, index=index)
+    elif (file_ext=='feather'):
+        save_df_as_feather(df, filename, index=index)
     else:
         raise ValueError(f"Not able to save data to file for extension type: {file_ext}")
 
@@ -1059,6 +1251,69 @@ def extract_year_month_day(data, format=None):
 
     return df
 
+def datetime_format_resolution(format):
+    """
+    Find the finest time unit represented by a datetime format, i.e. the resolution kept when a datetime is formatted with strftime(format) and parsed back.
+
+    Parameters:
+        format (str): datetime format, e.g. "%Y-%m-%d %H:%M:%S".
+
+    Returns:
+        unit (str): numpy datetime64 unit ('Y', 'M', 'D', 'h', 'm', 's', 'us'), or None if the format cannot be reduced to a unit (e.g. no year, or with timezones).
+    """
+
+    if format is None:
+        return None
+
+    directives = set(re.findall(r'%([A-Za-z])', format.replace('%%', '')))
+
+    if len(directives & {'z', 'Z'}) > 0 or len(directives & {'Y', 'y', 'G', 'c', 'x', 'D', 'F'}) == 0:
+        return None
+
+    units = [
+        ('us', {'f'}),
+        ('s', {'S', 's', 'c', 'T', 'X'}),
+        ('m', {'M', 'R'}),
+        ('h', {'H', 'I'}),
+        ('D', {'d', 'e', 'j', 'a', 'A', 'w', 'u', 'x', 'D', 'F'}),
+        ('M', {'m', 'b', 'B', 'h'}),
+        ('Y', {'Y', 'y', 'G'}),
+    ]
+    for unit, unit_directives in units:
+        if len(directives & unit_directives) > 0:
+            return unit
+
+    return None
+
+
+def decode_datetime(t, datetime_format, base_unit='ns'):
+    """
+    Convert times (no. of base_unit since epoch, e.g. reversed datetime fields) to datetimes, as if formatted with strftime(datetime_format) and parsed back.
+    If the resolution of the format is known (ref. datetime_format_resolution), the datetimes are truncated to it. Otherwise, only the unique datetimes are formatted and parsed.
+
+    Parameters:
+        t (np.array): times (float or int). NaN and out of range values give NaT.
+        datetime_format (str): datetime format, e.g. "%Y-%m-%d".
+        base_unit (str): unit of t, 'ns' or 's'. Default is 'ns'.
+
+    Returns:
+        values (np.array): datetime64[ns] values.
+    """
+
+    t = np.asarray(t, dtype=float)
+    limit = np.iinfo(np.int64).max
+    isnull = ~(np.abs(t) < limit)
+    values = np.where(isnull, 0, t).astype(np.int64).astype(f"datetime64[{base_unit}]")
+    values[isnull] = np.datetime64('NaT')
+
+    datetime_unit = datetime_format_resolution(datetime_format)
+    if datetime_unit is not None:
+        # truncating to the resolution of the format is the same as formatting and parsing back
+        return values.astype(f"datetime64[{datetime_unit}]").astype('datetime64[ns]')
+
+    uniques, inverse = np.unique(values, return_inverse=True)
+    uniques_str = pd.Series(pd.to_datetime(uniques, errors='coerce')).dt.strftime(datetime_format)
+    return pd.to_datetime(uniques_str, format=datetime_format).to_numpy()[inverse]
 
 # ASCII-compatible
 def convert_to_ascii(data):
@@ -1084,21 +1339,51 @@ def convert_to_ascii(data):
     return data
 
 
+# MEMORY
+def memory_usage(reset_peak=False):
+    """Resident set size (RSS) and peak RSS of the current process, in bytes.
+    On Linux, read from /proc/self/status, and the peak can be reset (e.g. to measure the peak of a stage). Elsewhere, the peak since the start of the process is given by the resource module (RSS is then None).
+    Args:
+        reset_peak (bool): Whether to reset the peak RSS after reading it (Linux only). Default is False.
+    Returns:
+        rss, peak_rss (int): None if not available.
+    """
+
+    rss, peak_rss = None, None
+    try:
+        with open('/proc/self/status', 'r') as fl:
+            for line in fl:
+                if line.startswith('VmRSS:'):
+                    rss = int(line.split()[1]) * 1024
+                elif line.startswith('VmHWM:'):
+                    peak_rss = int(line.split()[1]) * 1024
+    except OSError:
+        try:
+            import resource
+            peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            peak_rss = peak_rss if OS_TYPE == 'Darwin' else peak_rss * 1024 # (bytes on macOS, kilobytes on Linux)
+        except ImportError:
+            pass
+
+    if reset_peak:
+        try:
+            with open('/proc/self/clear_refs', 'w') as fl:
+                fl.write('5')
+        except OSError:
+            pass
+
+    return rss, peak_rss
+
+
 # GENERAL ALGORITHMS
 def gcd(x):
-    """Find the Greatest Common Divisor of a dataframe column"""
-    x = x.dropna().reset_index(drop=True)
+    """Find the Greatest Common Divisor of a dataframe column (integer values, reduced with np.gcd). Returns 1 if the column is empty (or all zeros)."""
+    x = pd.Series(x).dropna()
     if (len(x)==0): #to fix condition where column is empty
         return 1
     else:
-        a = x[0] #initialize a with the first element of the list
-        for i in range(1, len(x)): 
-            b = x[i] #initialize b with the next element of the list
-            while b != 0: 
-                c = b 
-                b = a % b 
-                a = c 
-        return a 
+        divisor = np.gcd.reduce(x.to_numpy().astype(np.int64))
+        return divisor if divisor != 0 else 1
 
 def remove_items(listA, listB):
   """Removes the items in list A from list B."""
@@ -1120,18 +1405,127 @@ def is_pos_def(A):
         # NOT SYMMETRIC
         return False
     
-def makePD(corr):
-    """Convert a matrix to positive definite"""
-    if (is_pos_def(corr)):
-        return corr
-    else:
-        eigValue, eigVector = np.linalg.eigh(corr)
-        cnvEigV = np.diag(np.clip(eigValue, EPSILON, 100000))
-        new_corr = eigVector @ cnvEigV @ eigVector.transpose()
-        Norm = np.tile(np.diag(new_corr),(np.diag(new_corr).size,1))
-        new_corr = np.divide(new_corr,np.sqrt(Norm*Norm.transpose()))
+def makePD(corr, return_details=False, tol=1e-8, max_iterations=100, warm_start=None, min_eigenvalue=EPSILON):
+    """Convert a matrix to the nearest positive definite correlation matrix (ref. nearest_correlation_matrix).
+
+    Inputs:
+        corr (np.array): symmetric matrix with unit diagonal
+        return_details (bool): if True, also return the Cholesky factor and the info dictionary. Default is False.
+        tol, max_iterations, warm_start, min_eigenvalue: ref. nearest_correlation_matrix
+
+    Output:
+        new_corr (np.array), or (new_corr, L, info) if return_details
+    """
+
+    new_corr, L, info = nearest_correlation_matrix(corr,
+        tol=tol,
+        max_iterations=max_iterations,
+        warm_start=warm_start,
+        min_eigenvalue=min_eigenvalue
+    )
+
+    if return_details:
+        return new_corr, L, info
+
+    return new_corr
+
+def nearest_correlation_matrix(A, tol=1e-8, max_iterations=100, warm_start=None, min_eigenvalue=EPSILON):
+    """
+    Compute the nearest (positive definite) correlation matrix using Higham's alternating projections with Dykstra's correction (Higham, 2002). If A is already positive definite, it is returned as it is.
+
+    Parameters:
+        A (np.array): symmetric matrix with unit diagonal.
+        tol (float): stopping tolerance on the relative change between iterations. Default is 1e-8.
+        max_iterations (int): maximum number of iterations. Default is 100.
+        warm_start (dict): info dictionary returned by a previous call (e.g. for a similar matrix). Its Dykstra correction is used as the starting point if the shape matches. Default is None.
+        min_eigenvalue (float): smallest eigenvalue allowed in the projection. Raised (x10) until the result has a Cholesky factor. Default is EPSILON.
+
+    Returns:
+        X (np.array): nearest correlation matrix (positive definite, unit diagonal).
+        L (np.array): lower-triangular Cholesky factor of X.
+        info (dict): 'iterations', 'time' (seconds), 'converged' (bool) and 'correction' (Dykstra correction, for warm starts).
+    """
+    import time
+
+    start_time = time.perf_counter()
+
+    A = (np.asarray(A, dtype=float) + np.asarray(A, dtype=float).T) / 2
+
+    # Already positive definite: keep matrix and its Cholesky factor
+    try:
+        L = np.linalg.cholesky(A)
+        info = {'iterations': 0, 'time': time.perf_counter() - start_time, 'converged': True, 'correction': None}
+        return A, L, info
+    except np.linalg.LinAlgError:
+        pass
+
+    def proj_psd(R, min_eig):
+        eigValue, eigVector = np.linalg.eigh(R)
+        X = (eigVector * np.clip(eigValue, min_eig, None)) @ eigVector.T
+        return (X + X.T) / 2
+
+    # Dykstra state: off-diagonals of (Y - dS) always equal those of A, so a previous correction gives a consistent warm start
+    dS = np.zeros_like(A)
+    Y = A.copy()
+    if warm_start is not None and warm_start.get('correction') is not None:
+        if warm_start['correction'].shape == A.shape:
+            dS = warm_start['correction'].copy()
+            Y = A + dS
+            np.fill_diagonal(Y, 1)
+    converged = False
+    iterations = 0
+    for iterations in range(1, max_iterations+1):
+        R = Y - dS
+        X = proj_psd(R, min_eigenvalue)
+        dS = X - R
+        Y_new = X.copy()
+        np.fill_diagonal(Y_new, 1)
+
+        change = np.linalg.norm(Y_new - Y, 'fro') / np.linalg.norm(Y, 'fro')
+        Y = Y_new
+        if change < tol:
+            converged = True
+            break
+
+    # Ensure result is positive definite (rescaling a PD matrix by its diagonal keeps it PD)
+    X = Y
+    min_eig = min_eigenvalue
+    while True:
+        try:
+            L = np.linalg.cholesky(X)
+            break
+        except np.linalg.LinAlgError:
+            X = proj_psd(X, min_eig)
+            d = np.sqrt(np.diag(X))
+            X = X / np.outer(d, d)
+            X = (X + X.T) / 2
+            np.fill_diagonal(X, 1)
+            min_eig = min_eig * 10
+
+    info = {'iterations': iterations, 'time': time.perf_counter() - start_time, 'converged': converged, 'correction': dS}
+
+    return X, L, info
+    
+def find_correlation_blocks(corr, threshold=0.1):
+    """
+    Cluster variables into blocks using a correlation matrix. Two variables are linked if their absolute correlation is at least `threshold`; the blocks are the connected components of the resulting graph.
+
+    Parameters:
+        corr (np.array): square correlation matrix.
+        threshold (float): absolute correlation threshold for linking two variables. Default is 0.1.
+
+    Returns:
+        blocks (list): list of blocks, each a sorted list of column indices. Blocks are ordered by their first index.
+    """
+    from scipy.sparse.csgraph import connected_components
+
+    adjacency = np.abs(np.nan_to_num(corr, nan=0.0)) >= threshold
+    n_blocks, labels = connected_components(adjacency, directed=False)
+
+    blocks = [list(np.flatnonzero(labels == label)) for label in range(n_blocks)]
+    blocks.sort(key=lambda block: block[0])
 
-        return new_corr
+    return blocks
     
 def sort_subset(A, B):
     """
@@ -18,7 +18,7 @@ def exec_cleanData(cd, exec_steps: dict):
             }
 
     Raises:
-        RuntimeError: If any operation fails or an unknown operation is encountered.
+        RuntimeError: If any operation fails, an unknown operation is encountered, or the background writes fail.
     """
     for step_num, step in exec_steps.items():
         op = step.get("op")
@@ -37,6 +37,9 @@ def exec_cleanData(cd, exec_steps: dict):
         except Exception as e:
             raise RuntimeError(f"❌ Error during [Step {step_num}] {op}: {e}") from e
 
+    # Wait for the background writes of the cleaning steps (ref. CleanData async_write), write errors are raised
+    cd.flush()
+
 
 def run_clean_pipeline(definitions_path: str):
     """
@@ -85,6 +88,7 @@ def run_clean_pipeline(definitions_path: str):
             final_report_filename = definitions.FINAL_REPORT_FILENAME
 
         cd.gen_data_report(cd.clean_df, dict=cd.clean_dict_df, report_filename=final_report_filename)
+        cd.flush()
         report_df_head = cd.report_df.head(5)
         report_preview = report_df_head.where(pd.notnull(report_df_head), None).to_dict()
 
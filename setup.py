@@ -35,6 +35,9 @@ setup(
         'xlrd',
         'Unidecode'
     ],
+    extras_require={
+        'arrow': ['pyarrow'], # parquet/feather data files
+    },
     long_description=open('README.md').read(),
     long_description_content_type='text/markdown',
     python_requires='>=3',